@@ -1,56 +1,140 @@
+import atexit
 import os
 import json
 import hashlib
-from dotenv import load_dotenv
-from openai import OpenAI
+import threading
 
-# Load API key and initialize OpenAI client
-load_dotenv()
-client = OpenAI()
+from src.cache import ResponseCache
+from src.telemetry import get_telemetry
+
+# Nothing below touches the network, the environment or the disk at import
+# time: the .env file, the OpenAI client and the cache are created on first use.
+
+# Paths and cache setup (limits are optional; unset means unbounded)
+DEFAULT_CACHE_FILE = ".cache/ai.sqlite"
+
+_client = None
+_cache = None
+_env_loaded = False
+_init_lock = threading.Lock()
+_offline = False
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a prompt has no cached completion."""
+
+
+def _load_env():
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def _env_number(name, scale=1):
+    raw = os.getenv(name)
+    return float(raw) * scale if raw else None
+
+
+def _cache_limits():
+    max_entries = _env_number("ARCADE_CACHE_MAX_ENTRIES")
+    max_mb = _env_number("ARCADE_CACHE_MAX_MB", 1024 * 1024)
+    return {
+        "max_entries": int(max_entries) if max_entries else None,
+        "max_bytes": int(max_mb) if max_mb else None,
+        "ttl": _env_number("ARCADE_CACHE_TTL_DAYS", 86400),
+    }
+
+
+def get_cache():
+    """Return the process-wide response cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _load_env()
+                path = os.getenv("ARCADE_CACHE_PATH", DEFAULT_CACHE_FILE)
+                _cache = ResponseCache(path, **_cache_limits())
+                atexit.register(_cache.flush_counters)
+    return _cache
+
+
+def get_client():
+    """Return the shared OpenAI client, importing openai on first use."""
+    global _client
+    if is_offline():
+        raise CacheMiss("offline mode: refusing to create a network client")
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                _load_env()
+                from openai import OpenAI
+
+                from src.transport import client_kwargs, sync_http_client
+
+                # ARCADE_LLM_TRANSPORT=record/replay swaps the HTTP layer (see src.transport)
+                http_client = sync_http_client()
+                extra = {"http_client": http_client} if http_client is not None else {}
+                _client = OpenAI(**extra, **client_kwargs())
+    return _client
+
+
+def set_offline(enabled=True):
+    """Serve only from cache; a miss raises CacheMiss instead of calling the API."""
+    global _offline
+    _offline = bool(enabled)
+
+
+def is_offline():
+    return _offline or os.getenv("ARCADE_OFFLINE", "").lower() in ("1", "true", "yes")
 
-# Paths and cache setup
-CACHE_FILE = ".cache/ai.jsonl"
-os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
 
 # Helper function to hash prompts
-def _hash_prompt(system, user):
-    """Hash the system and user messages for caching."""
-    payload = {"system": system, "user": user}
+def _hash_prompt(system, user, model, params):
+    """Hash the messages, model and sampling params for caching."""
+    payload = {"system": system, "user": user, "model": model, "params": params}
     return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
 
-# Load cache from file
-def _load_cache():
-    cache = {}
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, "r") as f:
-            for line in f:
-                try:
-                    row = json.loads(line)
-                    cache[row["k"]] = row["v"]
-                except Exception:
-                    continue
-    return cache
-
-_cache = _load_cache()
-
-def chat_cached(system, user, model="gpt-4o-mini"):
+
+def record_usage(response, kind):
+    """Count prompt/completion tokens reported by the API for one call."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        tel = get_telemetry()
+        tel.count("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0, kind=kind)
+        tel.count("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0, kind=kind)
+
+
+def chat_cached(system, user, model="gpt-4o-mini", temperature=0.4, kind="chat", cache_key=None):
     """
     Get a chat completion from OpenAI, caching results to disk.
+    ``kind`` (analyst, image, style, ...) only labels telemetry; it is not part of the key.
+    ``cache_key`` replaces the user prompt in the key, for prompts built from
+    volatile input (e.g. a flow fingerprint instead of the raw flow text).
     """
-    key = _hash_prompt(system, user)
-    if key in _cache:
-        return _cache[key]
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ],
-        temperature=0.4
-    )
+    cache = get_cache()
+    tel = get_telemetry()
+    key = _hash_prompt(system, cache_key or user, model, {"temperature": temperature})
+    hit = cache.get(key)
+    if hit is not None:
+        tel.count("llm_cache", kind=kind, result="hit")
+        return hit
+    tel.count("llm_cache", kind=kind, result="miss")
+    if is_offline():
+        raise CacheMiss(f"offline mode: no cached completion for prompt {key[:12]}")
+
+    with tel.timer("llm", kind=kind):
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user}
+            ],
+            temperature=temperature
+        )
+    record_usage(response, kind)
     output = response.choices[0].message.content.strip()
-    with open(CACHE_FILE, "a") as f:
-        f.write(json.dumps({"k": key, "v": output}) + "\n")
-    _cache[key] = output
-    return output
\ No newline at end of file
+    cache.put(key, output, model=model)
+    return output
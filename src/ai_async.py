@@ -0,0 +1,342 @@
+# Async LLM client: pooled connections, in-flight limit, rate limiting, single-flight dedup
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from src.ai import CacheMiss, _hash_prompt, _load_env, get_cache, is_offline, record_usage
+from src.compact import estimate_tokens
+from src.telemetry import get_telemetry
+
+__all__ = ["TokenBucket", "RateLimiter", "AsyncLLM", "get_async_llm", "achat_cached", "astream_cached"]
+
+
+class TokenBucket:
+    """Refills ``rate_per_min`` units per minute up to ``capacity``; ``acquire``
+    waits until enough units are available. ``None`` rate means unlimited."""
+
+    def __init__(self, rate_per_min: Optional[float], capacity: Optional[float] = None) -> None:
+        self.rate = rate_per_min / 60.0 if rate_per_min else None
+        self.capacity = capacity or rate_per_min or 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * (self.rate or 0.0))
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        if self.rate is None:
+            return
+        # A single request larger than the bucket would never fit; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min budgets, checked before each upstream call."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, tokens: int) -> None:
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+def _env_float(name: str) -> Optional[float]:
+    raw = os.getenv(name)
+    return float(raw) if raw else None
+
+
+def _params(temperature: float, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Sampling params hashed into the cache key (see ``src.ai._hash_prompt``)."""
+    params: Dict[str, Any] = {"temperature": temperature}
+    if response_format:
+        params["response_format"] = response_format
+    return params
+
+
+class AsyncLLM:
+    """Shared async chat client.
+
+    * one ``AsyncOpenAI`` with a pooled HTTP client (keep-alive across calls)
+    * at most ``max_in_flight`` upstream requests at a time
+    * ``rpm`` / ``tpm`` token buckets (prompt tokens estimated, plus ``completion_reserve``)
+    * identical in-flight prompts share a single upstream call (single-flight)
+    * results go through the same response cache as ``chat_cached``
+
+    asyncio primitives are bound to the running loop; they are (re)created the
+    first time the client is used from a new loop, so the same instance works
+    from ``asyncio.run`` in the CLI and from long-lived drivers.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        completion_reserve: int = 512,
+        client: Any = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.rpm, self.tpm = rpm, tpm
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.completion_reserve = completion_reserve
+        self._client = client
+        self._owns_client = client is None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._limiter: Optional[RateLimiter] = None
+        self._inflight: Dict[str, "asyncio.Task[str]"] = {}
+        self._closing: Set["asyncio.Task[None]"] = set()
+        self.upstream_calls = 0
+        self.deduplicated = 0
+
+    @classmethod
+    def from_env(cls) -> "AsyncLLM":
+        _load_env()
+        return cls(
+            max_in_flight=int(_env_float("ARCADE_LLM_MAX_IN_FLIGHT") or 16),
+            rpm=_env_float("ARCADE_LLM_RPM"),
+            tpm=_env_float("ARCADE_LLM_TPM"),
+            timeout=_env_float("ARCADE_LLM_TIMEOUT") or 60.0,
+        )
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_in_flight)
+            self._limiter = RateLimiter(self.rpm, self.tpm)
+            self._inflight = {}
+            if self._owns_client and self._client is not None:
+                # pooled connections belong to the previous loop; close them and start a fresh pool
+                task = asyncio.ensure_future(self._close_stale(self._client))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+                self._client = None
+
+    @staticmethod
+    async def _close_stale(client: Any) -> None:
+        try:
+            await client.close()
+        except Exception:
+            pass  # its loop is gone; the sockets are released either way
+
+    def _get_client(self) -> Any:
+        if is_offline():
+            raise CacheMiss("offline mode: refusing to create a network client")
+        if self._client is None:
+            _load_env()
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            from src.transport import async_http_client, client_kwargs
+
+            limits = httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight,
+            )
+            http_client = async_http_client(limits, self.timeout) or DefaultAsyncHttpxClient(
+                limits=limits, timeout=self.timeout
+            )
+            self._client = AsyncOpenAI(
+                http_client=http_client, max_retries=self.max_retries, timeout=self.timeout, **client_kwargs()
+            )
+        return self._client
+
+    async def _upstream(
+        self,
+        key: str,
+        system: str,
+        user: str,
+        model: str,
+        temperature: float,
+        kind: str,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        assert self._sem is not None and self._limiter is not None
+        tel = get_telemetry()
+        with tel.timer("llm_wait", kind=kind):
+            await self._limiter.acquire(estimate_tokens(system) + estimate_tokens(user) + self.completion_reserve)
+            await self._sem.acquire()
+        # Only sent when set, so plain calls look exactly as before to the API and recordings
+        extra = {"response_format": response_format} if response_format else {}
+        try:
+            self.upstream_calls += 1
+            with tel.timer("llm", kind=kind):
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    temperature=temperature,
+                    **extra,
+                )
+        finally:
+            self._sem.release()
+        record_usage(response, kind)
+        output = (response.choices[0].message.content or "").strip()
+        if output:
+            # SQLite writes may wait on other processes; keep them off the event loop
+            await asyncio.to_thread(get_cache().put, key, output, model)
+        return output
+
+    async def chat(
+        self,
+        system: str,
+        user: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.4,
+        kind: str = "chat",
+        cache_key: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Async counterpart of ``src.ai.chat_cached`` (same cache, same keys).
+
+        ``response_format`` (e.g. a JSON schema) is passed to the API and is
+        part of the cache key.
+        """
+        self._bind_loop()
+        tel = get_telemetry()
+        key = _hash_prompt(system, cache_key or user, model, _params(temperature, response_format))
+        # A hit may also write (LRU touch) and wait on the busy timeout, like put
+        hit = await asyncio.to_thread(get_cache().get, key)
+        tel.count("llm_cache", kind=kind, result="hit" if hit is not None else "miss")
+        if hit is not None:
+            return hit
+        if is_offline():
+            raise CacheMiss(f"offline mode: no cached completion for prompt {key[:12]}")
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._upstream(key, system, user, model, temperature, kind, response_format)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.deduplicated += 1
+        # shield: one caller being cancelled must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        system: str,
+        user: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.4,
+        kind: str = "chat",
+        cache_key: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Like ``chat`` but yields the completion piece by piece as it arrives.
+
+        A cache hit is yielded as a single piece. A stream that runs to the end
+        is stored in the cache under the same key as ``chat``; one abandoned
+        half way is not. Streams are not shared between identical callers.
+        """
+        self._bind_loop()
+        assert self._sem is not None and self._limiter is not None
+        tel = get_telemetry()
+        key = _hash_prompt(system, cache_key or user, model, {"temperature": temperature})
+        hit = await asyncio.to_thread(get_cache().get, key)
+        tel.count("llm_cache", kind=kind, result="hit" if hit is not None else "miss")
+        if hit is not None:
+            yield hit
+            return
+        if is_offline():
+            raise CacheMiss(f"offline mode: no cached completion for prompt {key[:12]}")
+
+        with tel.timer("llm_wait", kind=kind):
+            await self._limiter.acquire(estimate_tokens(system) + estimate_tokens(user) + self.completion_reserve)
+            await self._sem.acquire()
+        parts: List[str] = []
+        try:
+            self.upstream_calls += 1
+            with tel.timer("llm", kind=kind):
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in response:
+                    if getattr(chunk, "usage", None) is not None:
+                        record_usage(chunk, kind)
+                    for choice in chunk.choices or []:
+                        piece = choice.delta.content
+                        if piece:
+                            parts.append(piece)
+                            yield piece
+        finally:
+            self._sem.release()
+        output = "".join(parts).strip()
+        if output:  # an empty stream is not an answer; ask again next time
+            await asyncio.to_thread(get_cache().put, key, output, model)
+
+    async def aclose(self) -> None:
+        if self._client is not None and hasattr(self._client, "close"):
+            await self._client.close()
+        self._client = None
+
+
+_default: Optional[AsyncLLM] = None
+
+
+def get_async_llm() -> AsyncLLM:
+    """Process-wide async client configured from ``ARCADE_LLM_*`` env vars."""
+    global _default
+    if _default is None:
+        _default = AsyncLLM.from_env()
+    return _default
+
+
+async def achat_cached(
+    system: str,
+    user: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.4,
+    kind: str = "chat",
+    cache_key: Optional[str] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    return await get_async_llm().chat(
+        system,
+        user,
+        model=model,
+        temperature=temperature,
+        kind=kind,
+        cache_key=cache_key,
+        response_format=response_format,
+    )
+
+
+def astream_cached(
+    system: str,
+    user: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.4,
+    kind: str = "chat",
+    cache_key: Optional[str] = None,
+) -> AsyncIterator[str]:
+    return get_async_llm().stream(system, user, model=model, temperature=temperature, kind=kind, cache_key=cache_key)
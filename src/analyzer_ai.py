@@ -1,8 +1,10 @@
 import argparse
+import hashlib
 import json
 import re
+import time
 from pathlib import Path
-from typing import Tuple, Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Tuple, Dict, Any, List, Optional, Sequence, Set, Callable, Awaitable
 from urllib.parse import urlparse
 
 from src.prompts import (
@@ -12,18 +14,85 @@ from src.prompts import (
     USER_IMAGE,
     SYSTEM_STYLE,
     USER_STYLE,
+    USER_COMBINED,
 )
-from src.ai import chat_cached
-from src.image_card import compose
+from src.ai import chat_cached, set_offline
+from src.card.encode import FORMATS, EncodeOptions, extension_for
+from src.image_card import BACKGROUNDS, LAYOUTS
+from src.brands import get_brand_registry
+from src.canonical import flow_fingerprint
+from src.chunked import DEFAULT_CHUNK_STEPS, analyze_chunked
+from src.combined import CombinedAnswer, analyze_combined, report_text
+from src.compact import compact_flow
+from src.flow_stream import flow_index, read_flow_indexed
+from src.local_analyzer import analyze_local, brief_local
+from src.telemetry import get_telemetry
+from src.timeline import TimingMetrics, format_timing, timing_metrics
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from src.pipeline import Stage
+
+# asyncio (~60 ms) and the modules built on it (src.ai_async, src.pipeline) are
+# imported where they are used, so `import src.analyzer_ai` and --help stay fast
+
+# "llm": every answer from the model; "local": rule-based, no API calls (see
+# src.local_analyzer); "auto": the model, falling back to local rules per stage
+# when a call fails or takes longer than ``fallback_after`` seconds.
+ANALYZERS = ("llm", "local", "auto")
+DEFAULT_FALLBACK_AFTER = 20.0
+# "single": the whole (compacted) flow in one analyst prompt; "chunked": one
+# cached call per few steps plus a reduce call (see src.chunked); "combined":
+# report, brief and style from one JSON-schema response (see src.combined)
+ANALYST_MODES = ("single", "chunked", "combined")
+
+# Streamed analyst answers still running after a fallback timeout (see build_stages)
+_background: Set["asyncio.Task[Any]"] = set()
+
+
+async def _maybe_await(value: Any) -> Any:
+    """``value``, awaited first if it is awaitable (local fallbacks may be sync or async)."""
+    return await value if hasattr(value, "__await__") else value
+
+
+async def achat_cached(*args: Any, **kwargs: Any) -> str:
+    """``src.ai_async.achat_cached``, imported on first use (tests and benchmarks patch this name)."""
+    from src.ai_async import achat_cached as chat
+
+    return await chat(*args, **kwargs)
+
+
+def astream_cached(*args: Any, **kwargs: Any) -> Any:
+    """``src.ai_async.astream_cached``, imported on first use."""
+    from src.ai_async import astream_cached as stream
+
+    return stream(*args, **kwargs)
+
+
+def _finish_background(task: "asyncio.Task[Any]") -> None:
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()  # retrieved: an abandoned stream's failure is already handled
+
 
 # ---- Simple section parsers -------------------------------------------------
 SECTION_SUMMARY = re.compile(r"SUMMARY:\s*(.+?)(?:\n\s*\n|\nSTEPS:|\Z)", re.I | re.S)
 SECTION_TITLE   = re.compile(r"TITLE:\s*(.+)", re.I)
+# While streaming: a section only counts once the text after it has started
+_TITLE_DONE   = re.compile(r"TITLE:\s*.+\n", re.I)
+_SUMMARY_DONE = re.compile(r"SUMMARY:\s*.+?(?:\n\s*\n|\nSTEPS:|\nTAGS:)", re.I | re.S)
+# The TIMING section is appended to report.md after the analyst text (see src.timeline)
+_TIMING_SECTION = re.compile(r"\n*^TIMING:.*\Z", re.M | re.S)
 
 
 def read_flow(path: Path) -> Dict[str, Any]:
-    """Read and return the Arcade flow JSON as a dict."""
-    return json.loads(path.read_text())
+    """Read and return the Arcade flow JSON as a dict.
+
+    The file is streamed (see ``src.flow_stream``); the returned dict carries an
+    ``.index`` with page meta, colors, theme and alignment from the same pass.
+    """
+    return read_flow_indexed(path)
 
 
 def extract_title_and_summary(text: str, fallback_title: str) -> Tuple[str, str]:
@@ -40,6 +109,28 @@ def extract_title_and_summary(text: str, fallback_title: str) -> Tuple[str, str]
     return title, summary
 
 
+class SectionWatcher:
+    """Incremental parser for a streamed analyst report.
+
+    ``feed`` each piece as it arrives; it returns True once, on the piece that
+    completes both TITLE and SUMMARY. From then on ``text`` holds enough for
+    ``extract_title_and_summary``, so the brief can start while STEPS and
+    TAGS are still being generated.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.headline_ready = False
+
+    def feed(self, piece: str) -> bool:
+        self.text += piece
+        # Sections end at a newline or the next "NAME:"; skip the regexes otherwise
+        if self.headline_ready or ("\n" not in piece and ":" not in piece):
+            return False
+        self.headline_ready = bool(_TITLE_DONE.search(self.text) and _SUMMARY_DONE.search(self.text))
+        return self.headline_ready
+
+
 def strip_code_fences(s: str) -> str:
     """Remove ``` or ```json fences if present, return clean JSON text."""
     s = (s or "").strip()
@@ -73,37 +164,13 @@ def parse_brief(raw: str, title: str) -> Dict[str, Any]:
 # ---- Brand style inference --------------------------------------------------
 
 def _collect_page_meta(flow: Dict[str, Any]) -> Tuple[List[str], List[str]]:
-    urls: List[str] = []
-    titles: List[str] = []
-    for step in flow.get("steps", []) or []:
-        pc = step.get("pageContext") or {}
-        u = pc.get("url"); t = pc.get("title")
-        if isinstance(u, str) and u:
-            urls.append(u)
-        if isinstance(t, str) and t:
-            titles.append(t)
-    return urls, titles
+    idx = flow_index(flow)
+    return list(idx.urls), list(idx.titles)
 
 
 def _collect_seen_colors(flow: Dict[str, Any]) -> List[str]:
-    colors: List[str] = []
-    for step in flow.get("steps", []) or []:
-        for hs in step.get("hotspots", []) or []:
-            for k in ("bgColor", "textColor"):
-                v = hs.get(k)
-                if isinstance(v, str):
-                    colors.append(v)
-        for p in step.get("paths", []) or []:
-            for k in ("buttonColor", "buttonTextColor"):
-                v = p.get(k)
-                if isinstance(v, str):
-                    colors.append(v)
-    # Deduplicate while preserving order
-    out: List[str] = []
-    for c in colors:
-        if c not in out:
-            out.append(c)
-    return out
+    # Deduplicated, order preserved (see FlowIndex)
+    return list(flow_index(flow).seen_colors)
 
 
 def _hex_to_rgb(h: Optional[str]) -> Optional[Tuple[int, int, int]]:
@@ -162,8 +229,8 @@ def _primary_domain(urls: List[str]) -> str:
     return max(counts.items(), key=lambda kv: kv[1])[0]
 
 
-def infer_style_with_llm(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Use LLM to infer colors/fonts. Return style dict for compose() or None on failure."""
+def _style_hints(flow: Dict[str, Any]) -> Dict[str, str]:
+    """USER_STYLE fields: page metadata, brand hints, flow font and seen colors."""
     urls, titles = _collect_page_meta(flow)
     seen_colors = _collect_seen_colors(flow)
     flow_font = flow.get("font") if isinstance(flow.get("font"), str) else ""
@@ -179,7 +246,7 @@ def infer_style_with_llm(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
     primary_domain = _primary_domain(urls)
 
-    user = USER_STYLE.format(
+    return dict(
         flow_name=flow.get("name", ""),
         urls=", ".join(urls) if urls else "",
         titles=", ".join(titles) if titles else "",
@@ -188,7 +255,15 @@ def infer_style_with_llm(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         seen_colors=", ".join(seen_colors) if seen_colors else "",
         primary_domain=primary_domain,
     )
-    raw = chat_cached(SYSTEM_STYLE, user)
+
+
+def _style_prompt(flow: Dict[str, Any]) -> str:
+    """Build the USER_STYLE prompt from page metadata, brand hints and seen colors."""
+    return USER_STYLE.format(**_style_hints(flow))
+
+
+def parse_style(raw: str) -> Optional[Dict[str, Any]]:
+    """Parse the style JSON into a compose() style dict, or None if unusable."""
     try:
         obj = json.loads(strip_code_fences(raw))
         primary = _hex_to_rgb(obj.get("primary_color")) or _hex_to_rgb(obj.get("accent_color"))
@@ -209,35 +284,655 @@ def infer_style_with_llm(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     return None
 
 
-# ---- CLI entrypoint ---------------------------------------------------------
+def brand_key(flow: Dict[str, Any]) -> Tuple[str, str]:
+    """(primary domain, flow font): what a style answer mostly depends on."""
+    urls, _ = _collect_page_meta(flow)
+    font = flow.get("font") if isinstance(flow.get("font"), str) else ""
+    return _primary_domain(urls), font
 
-def main() -> None:
-    ap = argparse.ArgumentParser(description="Analyze Arcade flow and produce report + image")
-    ap.add_argument("--flow", default="flow.json", help="Path to Arcade flow.json")
-    args = ap.parse_args()
 
-    flow_path = Path(args.flow)
-    outdir = Path("out"); outdir.mkdir(exist_ok=True)
+def known_style(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """compose() style for the flow's brand from the registry (see ``src.brands``), if known."""
+    domain, font = brand_key(flow)
+    palette = get_brand_registry().lookup(domain, font) if domain else None
+    get_telemetry().count("brand_registry", result="hit" if palette else "miss")
+    return parse_style(json.dumps(palette)) if palette else None
 
-    # 1) Ask the analyst to produce structured text (SUMMARY/STEPS/TITLE/TAGS)
-    flow = read_flow(flow_path)
-    user_prompt = USER_ANALYST.format(flow_json=json.dumps(flow, indent=2))
-    analyst_text = chat_cached(SYSTEM_ANALYST, user_prompt)
 
-    # 2) Extract title + short plain summary for the card overlay
-    title, plain = extract_title_and_summary(analyst_text, flow.get("name"))
+def _remember_style(flow: Dict[str, Any], raw: str) -> None:
+    domain, font = brand_key(flow)
+    if not domain:
+        return
+    try:
+        answer = json.loads(strip_code_fences(raw))
+    except ValueError:
+        return
+    get_brand_registry().record(domain, font, answer)
+
+
+def infer_style_with_llm(flow: Dict[str, Any], brands: bool = True) -> Optional[Dict[str, Any]]:
+    """Use LLM to infer colors/fonts. Return style dict for compose() or None on failure.
+
+    With ``brands`` a brand already in the registry costs a lookup instead of a
+    call, and new answers are added to it.
+    """
+    known = known_style(flow) if brands else None
+    if known is not None:
+        return known
+    raw = chat_cached(SYSTEM_STYLE, _style_prompt(flow), kind="style")
+    style = parse_style(raw)
+    if brands and style is not None:
+        _remember_style(flow, raw)
+    return style
+
+
+async def infer_style_async(
+    flow: Dict[str, Any], cache_key: Optional[str] = None, brands: bool = True
+) -> Optional[Dict[str, Any]]:
+    """Async variant of infer_style_with_llm (shared pooled client)."""
+    import asyncio
+
+    known = await asyncio.to_thread(known_style, flow) if brands else None
+    if known is not None:
+        return known
+    raw = await achat_cached(SYSTEM_STYLE, _style_prompt(flow), kind="style", cache_key=cache_key)
+    style = parse_style(raw)
+    if brands and style is not None:
+        await asyncio.to_thread(_remember_style, flow, raw)
+    return style
+
+
+# ---- Pipeline ---------------------------------------------------------------
+
+def _analyst_prompt(flow: Dict[str, Any], compact: bool, token_budget: Optional[int]) -> Tuple[str, int, bool]:
+    """Return (USER_ANALYST prompt, estimated prompt tokens saved by compaction, over the token budget)."""
+    if compact:
+        packed = compact_flow(flow, token_budget)
+        return USER_ANALYST.format(flow_json=packed.text), packed.saved_tokens, packed.over_budget
+    return USER_ANALYST.format(flow_json=json.dumps(flow, indent=2)), 0, False
+
+
+def _combined_prompt(flow: Dict[str, Any], compact: bool, token_budget: Optional[int]) -> Tuple[str, int, bool]:
+    """Return (USER_COMBINED prompt, estimated prompt tokens saved by compaction, over the token budget)."""
+    hints = _style_hints(flow)
+    if compact:
+        packed = compact_flow(flow, token_budget)
+        return USER_COMBINED.format(flow_json=packed.text, **hints), packed.saved_tokens, packed.over_budget
+    return USER_COMBINED.format(flow_json=json.dumps(flow, indent=2), **hints), 0, False
+
+
+def _flow_cache_key(fingerprint: str, template: str, **params: Any) -> str:
+    """Cache key for a prompt rendered from a flow: the flow's content fingerprint
+    (see ``src.canonical``) plus everything else that shapes the prompt, so
+    re-recordings of the same demo reuse the cached answer."""
+    digest = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+    extra = "".join(f"|{k}={v}" for k, v in sorted(params.items()))
+    return f"flow:{fingerprint}|template:{digest}{extra}"
+
+
+def _read_json(path: Path) -> Any:
+    return json.loads(path.read_text())
 
-    # 3) Ask for the image brief and parse robustly
-    raw_brief = chat_cached(SYSTEM_IMAGE, USER_IMAGE.format(title=title, plain_summary=plain))
-    brief = parse_brief(raw_brief, title)
 
-    # 4) Infer brand style (colors/fonts) using LLM + flow hints
-    style = infer_style_with_llm(flow)
+def _write_json(path: Path, value: Any) -> None:
+    path.write_text(json.dumps(value))
+
+
+def _load_timing(path: Path) -> Optional[TimingMetrics]:
+    data = _read_json(path)
+    return TimingMetrics.from_dict(data) if data else None
+
+
+def _save_timing(path: Path, value: Optional[TimingMetrics]) -> None:
+    _write_json(path, value.to_dict() if value is not None else None)
+
+
+def build_stages(
+    flow_path: Path,
+    outdir: Path,
+    compact: bool = True,
+    token_budget: Optional[int] = None,
+    variants: Sequence[str] = (),
+    encoding: Optional[EncodeOptions] = None,
+    analyzer: str = "llm",
+    fallback_after: Optional[float] = DEFAULT_FALLBACK_AFTER,
+    fallbacks: Optional[List[str]] = None,
+    analyst_mode: str = "single",
+    chunk_steps: int = DEFAULT_CHUNK_STEPS,
+    stream: bool = False,
+    brands: bool = True,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[str] = None,
+) -> List["Stage"]:
+    """Express the per-flow pipeline as a DAG of stages.
+
+        flow ─┬─ prompt ───────┬─ analyst ── headline ── brief ─┐
+              ├─ fingerprint ──┴─ style ────────────────────────┼─ card
+              ├─ thumbnails ────────────────────────────────────┘
+              └─ timing ─── (+ analyst) ── report
+
+    ``style`` only needs the flow, so its LLM call overlaps the analyst call.
+    Both are cached under the flow's content fingerprint rather than the raw
+    prompt text, which would change with every re-recording.
+    With ``analyzer`` "auto", stages that fell back to local rules are
+    appended to ``fallbacks`` as ``"<stage> (<reason>)"``. With ``analyst_mode``
+    "chunked" the analyst stage runs map-reduce over ``chunk_steps``-sized chunks;
+    with "combined" one ``combined`` stage makes a single structured call and
+    analyst, brief and style each take their piece of its answer.
+
+    With ``stream`` the single-prompt analyst answer is streamed into
+    ``report.md`` and the brief no longer waits for the analyst stage: an
+    ``early_headline`` stage starts it as soon as TITLE and SUMMARY have
+    arrived (see ``SectionWatcher``), so the brief call overlaps the rest of
+    the report. If "auto" then falls back to local rules, the card is
+    rendered from a local brief for the local headline, so card and report agree. With ``brands`` the
+    style comes from the brand registry (``src.brands``) when the flow's
+    primary domain is known there, in every analyzer mode.
+
+    ``timing`` turns ``capturedEvents`` into dwell/typing/scroll/idle metrics
+    (see ``src.timeline``) and ``report`` writes them into report.md as a
+    TIMING section after the analyst text.
+
+    With ``layout`` "collage" the ``thumbnails`` stage decodes the chosen
+    screenshots (from ``screenshots`` or the asset cache) while the LLM calls
+    run, so the card render only pastes cached thumbnails.
+    """
+    if analyzer not in ANALYZERS:
+        raise ValueError(f"unknown analyzer {analyzer!r}; choose from {', '.join(ANALYZERS)}")
+    if analyst_mode not in ANALYST_MODES:
+        raise ValueError(f"unknown analyst mode {analyst_mode!r}; choose from {', '.join(ANALYST_MODES)}")
+    import asyncio
+
+    from src.pipeline import EarlyValue, Stage
+
+    chunked = analyst_mode == "chunked"
+    combined = analyst_mode == "combined" and analyzer != "local"
+    streaming = stream and analyst_mode == "single" and analyzer != "local"
+    report_path = outdir / "report.md"
+    # Analyst text with at least TITLE and SUMMARY, published before the stage ends
+    early = EarlyValue()
+    # Non-empty when the streamed headline was published and the report then fell back
+    stale_headline: List[bool] = []
+    fallbacks = fallbacks if fallbacks is not None else []
+
+    async def answer(stage: str, ask: Callable[[], Awaitable[Any]], local: Callable[[], Any]) -> Any:
+        if analyzer == "local":
+            return await _maybe_await(local())
+        if analyzer == "llm":
+            return await ask()
+        try:
+            # Calls outlive the timeout and still land in the cache: achat_cached shields its
+            # shared task, and the streamed analyst runs in a task of its own (see ask_streamed)
+            return await asyncio.wait_for(ask(), fallback_after)
+        except asyncio.TimeoutError:
+            fallbacks.append(f"{stage} (no answer after {fallback_after:g}s)")
+        except Exception as e:
+            fallbacks.append(f"{stage} ({type(e).__name__})")
+        get_telemetry().count("local_fallback", stage=stage)
+        return await _maybe_await(local())
+
+    def prompt(flow: Dict[str, Any]) -> Tuple[str, int, bool]:
+        if combined:
+            return _combined_prompt(flow, compact, token_budget)
+        return ("", 0, False) if analyzer == "local" or chunked else _analyst_prompt(flow, compact, token_budget)
+
+    async def combined_answer(prompt: Tuple[str, int, bool], fingerprint: str) -> Optional[CombinedAnswer]:
+        key = _flow_cache_key(fingerprint, USER_COMBINED, compact=compact, budget=token_budget)
+        # None (auto mode, call failed): every piece below falls back to local rules
+        return await answer("combined", lambda: analyze_combined(achat_cached, prompt[0], key), lambda: None)
+
+    def piece(result: Optional[CombinedAnswer], name: str, stage: str) -> Optional[Dict[str, Any]]:
+        value = result.piece(name) if result is not None else None
+        if value is None and result is not None:
+            fallbacks.append(f"{stage} (combined response: {result.errors[name]})")
+        return value
+
+    def combined_report(combined: Optional[CombinedAnswer], flow: Dict[str, Any]) -> str:
+        report = piece(combined, "report", "analyst")
+        return report_text(report) if report is not None else analyze_local(flow)
+
+    def combined_brief(
+        combined: Optional[CombinedAnswer], headline: Tuple[str, str], flow: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        brief = piece(combined, "brief", "brief")
+        return brief if brief is not None else brief_local(flow, headline[0])
+
+    def combined_style(combined: Optional[CombinedAnswer], flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # A known brand wins over this flow's answer so all its cards match
+        known = known_style(flow) if brands else None
+        if known is not None:
+            return known
+        style = piece(combined, "style", "style")
+        if style is None:
+            return None
+        if brands:
+            _remember_style(flow, json.dumps(style))
+        return parse_style(json.dumps(style))
+
+    def fingerprint(flow: Dict[str, Any]) -> str:
+        return "" if analyzer == "local" else flow_fingerprint(flow)
+
+    async def analyst(prompt: Tuple[str, int, bool], fingerprint: str, flow: Dict[str, Any]) -> str:
+        if chunked:
+            # Each chunk is keyed by its own content; no whole-flow key needed
+            return await answer(
+                "analyst", lambda: analyze_chunked(flow, achat_cached, chunk_steps), lambda: analyze_local(flow)
+            )
+        key = _flow_cache_key(fingerprint, USER_ANALYST, compact=compact, budget=token_budget)
+
+        # Set when "auto" stops waiting for the stream and uses local rules instead
+        abandoned = asyncio.Event()
+
+        async def consume_stream() -> str:
+            watcher = SectionWatcher()
+            t0 = time.perf_counter()
+            try:
+                with report_path.open("w") as fp:
+                    async for piece in astream_cached(SYSTEM_ANALYST, prompt[0], kind="analyst", cache_key=key):
+                        if abandoned.is_set():
+                            continue  # read to the end so the whole answer is cached
+                        fp.write(piece)
+                        fp.flush()
+                        if watcher.feed(piece):
+                            get_telemetry().observe("analyst_headline", time.perf_counter() - t0)
+                            early.set(watcher.text)
+            except BaseException:
+                # A partial report must not look finished to --resume (once abandoned,
+                # report.md belongs to the local fallback)
+                if not abandoned.is_set():
+                    report_path.unlink(missing_ok=True)
+                raise
+            return watcher.text.strip()
+
+        async def ask_streamed() -> str:
+            # Unlike AsyncLLM.chat, streams are not shared or shielded: run this one in its
+            # own task so a fallback timeout does not cancel it half way
+            task = asyncio.ensure_future(consume_stream())
+            _background.add(task)
+            task.add_done_callback(_finish_background)
+            return await asyncio.shield(task)
+
+        def local_report() -> str:
+            abandoned.set()
+            if early.is_set():
+                # The brief already started from the streamed TITLE/SUMMARY; the card stage redoes it
+                stale_headline.append(True)
+            return analyze_local(flow)
+
+        if streaming:
+            text = await answer("analyst", ask_streamed, local_report)
+            early.set(text)
+            return text
+        return await answer(
+            "analyst",
+            lambda: achat_cached(SYSTEM_ANALYST, prompt[0], kind="analyst", cache_key=key),
+            lambda: analyze_local(flow),
+        )
+
+    def headline(analyst: str, flow: Dict[str, Any]) -> Tuple[str, str]:
+        return extract_title_and_summary(analyst, flow.get("name"))
+
+    async def early_headline(flow: Dict[str, Any]) -> Tuple[str, str]:
+        return extract_title_and_summary(await early.get(), flow.get("name"))
+
+    async def streamed_brief(early_headline: Tuple[str, str], flow: Dict[str, Any]) -> Dict[str, Any]:
+        return await brief(early_headline, flow)
+
+    def load_report(path: Path) -> str:
+        text = _TIMING_SECTION.sub("", path.read_text())
+        early.set(text)
+        return text
+
+    def timing(flow: Dict[str, Any]) -> Optional[TimingMetrics]:
+        try:
+            return timing_metrics(flow)
+        except ImportError:  # numpy is optional
+            return None
+
+    def report(analyst: str, timing: Optional[TimingMetrics], flow: Dict[str, Any]) -> str:
+        text = analyst.rstrip()
+        if timing is not None:
+            text += "\n\n" + format_timing(timing, flow)
+        report_path.write_text(text + "\n")
+        return text
+
+    async def brief(headline: Tuple[str, str], flow: Dict[str, Any]) -> Dict[str, Any]:
+        title, plain = headline
+
+        async def ask() -> Dict[str, Any]:
+            raw = await achat_cached(SYSTEM_IMAGE, USER_IMAGE.format(title=title, plain_summary=plain), kind="image")
+            return parse_brief(raw, title)
+
+        return await answer("brief", ask, lambda: brief_local(flow, title))
+
+    async def style(flow: Dict[str, Any], fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = _flow_cache_key(fingerprint, USER_STYLE)
+
+        async def local() -> Optional[Dict[str, Any]]:
+            # A registered brand palette, else the composer derives one from the flow's colors.
+            # Off the loop: the first lookup opens (or creates) the registry database
+            return await asyncio.to_thread(known_style, flow) if brands else None
+
+        return await answer("style", lambda: infer_style_async(flow, key, brands), local)
+
+    ext = extension_for(encoding or EncodeOptions())
+    card_path = outdir / f"social.{ext or 'png'}"
+
+    card_options = {"encoding": encoding, "background": background, "layout": layout, "screenshots": screenshots}
+
+    def thumbnails(flow: Dict[str, Any]) -> int:
+        if layout != "collage":
+            return 0
+        from src.card.canvas import CANVAS, VARIANTS
+        from src.card.collage import prewarm_thumbnails  # deferred: pulls in Pillow
+
+        return prewarm_thumbnails(flow, [CANVAS] + [VARIANTS[v] for v in variants], screenshots)
+
+    def card(
+        brief: Dict[str, Any],
+        style: Optional[Dict[str, Any]],
+        flow: Dict[str, Any],
+        thumbnails: int,
+        headline: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        from src.image_card import compose, resolve_style  # deferred: pulls in Pillow
+
+        if stale_headline and headline is not None:
+            # The brief was written for the LLM's headline; the report is local, so match it
+            brief = brief_local(flow, headline[0])
+            _write_json(outdir / "brief.json", brief)
+            fallbacks.append("brief (analyst fell back after the headline was streamed)")
+
+        from src.card.canvas import CANVAS, VARIANTS
+
+        # One resolved style (blurhash palette included) for the card and every variant
+        resolved = resolve_style(style, flow, background)
+        results = [compose(brief, card_path, flow=flow, style=resolved, **card_options)]
+        specs = [VARIANTS[v] for v in variants if VARIANTS[v] != CANVAS]  # the card itself is the og canvas
+        if specs:
+            from src.image_card import compose_variants
+
+            extra = compose_variants(brief, outdir, flow=flow, style=resolved, specs=specs, **card_options)
+            results.extend(extra.values())
+        return [
+            {"path": r.path, "format": r.format, "quality": r.quality, "bytes": r.bytes, "encode_ms": round(r.seconds * 1000, 2)}
+            for r in results
+        ]
+
+    if combined:
+        # One call answers all three; the stages below only pick their piece
+        steps = [
+            Stage("combined", combined_answer, ("prompt", "fingerprint")),
+            Stage("analyst", combined_report, ("combined", "flow"), report_path, load_report, Path.write_text),
+            Stage(
+                "brief", combined_brief, ("combined", "headline", "flow"), outdir / "brief.json", _read_json, _write_json
+            ),
+            Stage("style", combined_style, ("combined", "flow"), outdir / "style.json", _read_json, _write_json),
+        ]
+    else:
+        steps = [
+            Stage("analyst", analyst, ("prompt", "fingerprint", "flow"), report_path, load_report, Path.write_text),
+            Stage("early_headline", early_headline, ("flow",)) if streaming else None,
+            Stage("brief", streamed_brief, ("early_headline", "flow"), outdir / "brief.json", _read_json, _write_json)
+            if streaming
+            else Stage("brief", brief, ("headline", "flow"), outdir / "brief.json", _read_json, _write_json),
+            Stage("style", style, ("flow", "fingerprint"), outdir / "style.json", _read_json, _write_json),
+        ]
+    # While streaming, the card also waits for the final headline in case the report fell back
+    card_inputs = ("brief", "style", "flow", "thumbnails") + (("headline",) if streaming else ())
+    return [
+        Stage("flow", lambda: read_flow(flow_path)),
+        Stage("prompt", prompt, ("flow",)),
+        Stage("fingerprint", fingerprint, ("flow",)),
+        *(s for s in steps if s is not None),
+        Stage("headline", headline, ("analyst", "flow")),
+        Stage("timing", timing, ("flow",), outdir / "timing.json", _load_timing, _save_timing),
+        Stage("report", report, ("analyst", "timing", "flow")),
+        Stage("thumbnails", thumbnails, ("flow",)),
+        # "auto" picks the format at encode time, so there is no fixed artifact to resume from
+        Stage("card", card, card_inputs, card_path if ext else None, lambda p: [{"path": str(p)}]),
+    ]
+
+
+async def analyze_flow_async(
+    flow_path: Path,
+    outdir: Path,
+    compact: bool = True,
+    token_budget: Optional[int] = None,
+    resume: bool = False,
+    variants: Sequence[str] = (),
+    encoding: Optional[EncodeOptions] = None,
+    analyzer: str = "llm",
+    fallback_after: Optional[float] = DEFAULT_FALLBACK_AFTER,
+    analyst_mode: str = "single",
+    chunk_steps: int = DEFAULT_CHUNK_STEPS,
+    stream: bool = False,
+    brands: bool = True,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Run read_flow → analyst → brief → style → compose for one flow.
+
+    Writes ``report.md``, ``brief.json``, ``style.json`` and ``social.png`` into
+    ``outdir`` and returns a small summary dict (title, output paths, prompt
+    tokens saved, per-stage seconds) for callers such as the batch driver.
+    With ``compact`` the analyst sees the compacted flow (see ``src.compact``)
+    instead of the raw pretty-printed JSON; with ``resume`` stages whose output
+    file already exists are not run again. ``variants`` names extra canvas sizes
+    (see ``card.canvas.VARIANTS``) written as ``social-<name>.<ext>``, and
+    ``encoding`` selects the image format/size budget (default optimized PNG).
+    ``analyzer`` picks LLM, local rules or LLM with local fallback (see ``ANALYZERS``),
+    and ``analyst_mode`` one prompt, chunked map-reduce or one combined
+    structured call (see ``ANALYST_MODES``).
+    ``stream`` writes the report as it arrives and starts the brief early;
+    ``brands`` reuses and records brand palettes across flows, and
+    ``background`` picks the card backdrop (see ``image_card.BACKGROUNDS``).
+    ``layout`` "collage" shows hotspot screenshots read from ``screenshots``
+    or the asset cache (see ``image_card.LAYOUTS``).
+    """
+    outdir.mkdir(parents=True, exist_ok=True)
+    fallbacks: List[str] = []
+    stages = build_stages(
+        flow_path,
+        outdir,
+        compact,
+        token_budget,
+        variants,
+        encoding,
+        analyzer,
+        fallback_after,
+        fallbacks,
+        analyst_mode,
+        chunk_steps,
+        stream,
+        brands,
+        background,
+        layout,
+        screenshots,
+    )
+    from src.pipeline import run_stages
+
+    run = await run_stages(stages, resume=resume)
+    title, _ = run.values["headline"]
+    return {
+        "flow": str(flow_path),
+        "title": title,
+        "fingerprint": run.values["fingerprint"],
+        "report": str(outdir / "report.md"),
+        "timing": run.values["timing"].to_dict() if run.values["timing"] is not None else None,
+        "image": run.values["card"][0]["path"],
+        "images": run.values["card"],
+        "tokens_saved": run.values["prompt"][1],
+        "over_token_budget": run.values["prompt"][2],
+        "timings": {k: round(v, 4) for k, v in run.timings.items()},
+        "skipped": run.skipped,
+        "fallbacks": fallbacks,
+        "elapsed": round(run.elapsed, 4),
+    }
+
+
+def analyze_flow(flow_path: Path, outdir: Path, **options: Any) -> Dict[str, Any]:
+    """Synchronous wrapper around analyze_flow_async."""
+    import asyncio
+
+    return asyncio.run(analyze_flow_async(flow_path, outdir, **options))
 
-    # 5) Write outputs
-    (outdir / "report.md").write_text(analyst_text)
-    compose(brief, outdir / "social.png", flow=flow, style=style)
+
+# ---- CLI entrypoint ---------------------------------------------------------
+
+def _report_telemetry(trace: Optional[str], metrics: Optional[str]) -> None:
+    telemetry = get_telemetry()
+    if not telemetry.enabled:
+        return
+    telemetry.write(Path(trace) if trace else None, Path(metrics) if metrics else None)
+    s = telemetry.summary()
+    ratio = f"{s['cache_hit_ratio']:.0%}" if s["cache_hit_ratio"] is not None else "n/a"
+    print(
+        f"Telemetry: {s['prompt_tokens']} prompt + {s['completion_tokens']} completion tokens, "
+        f"cache hit ratio {ratio}" + "".join(f", wrote {p}" for p in (trace, metrics) if p)
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Analyze Arcade flow and produce report + image")
+    ap.add_argument("--flow", default="flow.json", help="Path to Arcade flow.json")
+    ap.add_argument(
+        "--batch",
+        default=None,
+        help="Directory, glob or manifest file of flow JSONs; writes one output dir per flow",
+    )
+    ap.add_argument("--out", default="out", help="Output directory (batch mode: parent of per-flow dirs)")
+    ap.add_argument("--workers", type=int, default=8, help="Max flows processed concurrently in batch mode")
+    ap.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Batch mode: analyze every flow even if another has the same content fingerprint",
+    )
+    ap.add_argument("--raw-flow", action="store_true", help="Send the full flow JSON to the analyst (no compaction)")
+    ap.add_argument("--token-budget", type=int, default=None, help="Max estimated tokens for the compacted flow")
+    ap.add_argument("--offline", action="store_true", help="Serve LLM answers from cache only; never call the API")
+    ap.add_argument("--resume", action="store_true", help="Skip stages whose output files already exist")
+    ap.add_argument(
+        "--variants",
+        default="",
+        help="Comma-separated extra card sizes to render: og, square, portrait, thumb",
+    )
+    ap.add_argument(
+        "--analyzer",
+        default="llm",
+        choices=ANALYZERS,
+        help="llm, local (rule-based, no API calls) or auto (LLM with local fallback)",
+    )
+    ap.add_argument(
+        "--fallback-after",
+        type=float,
+        default=DEFAULT_FALLBACK_AFTER,
+        help="With --analyzer auto: seconds to wait for each LLM answer before using local rules",
+    )
+    ap.add_argument(
+        "--analyst-mode",
+        default="single",
+        choices=ANALYST_MODES,
+        help="single (whole flow in one prompt), chunked (per-step calls cached individually + reduce) "
+        "or combined (report, brief and style from one structured response)",
+    )
+    ap.add_argument(
+        "--chunk-steps",
+        type=int,
+        default=DEFAULT_CHUNK_STEPS,
+        help="With --analyst-mode chunked: average steps per call",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the analyst answer into report.md and start the card brief once TITLE/SUMMARY arrive",
+    )
+    ap.add_argument(
+        "--no-brand-registry",
+        action="store_true",
+        help="Ask for the palette of every flow instead of reusing known brands (see python -m src.brands)",
+    )
+    ap.add_argument(
+        "--background",
+        default="solid",
+        choices=BACKGROUNDS,
+        help="Card backdrop: solid colour, or blurhash (the first screenshot's colours, blurred)",
+    )
+    ap.add_argument(
+        "--layout",
+        default="text",
+        choices=LAYOUTS,
+        help="Card layout: text (title and bullets) or collage (title over 2-4 hotspot screenshots)",
+    )
+    ap.add_argument(
+        "--screenshots",
+        default=None,
+        help="With --layout collage: directory of step screenshots (<host>/<path> or flat); "
+        "default: the asset cache (python -m src.assets fetch)",
+    )
+    ap.add_argument("--trace", default=None, help="Write a JSON trace of stage/LLM timings, tokens and cache hits")
+    ap.add_argument("--metrics", default=None, help="Write the same metrics in Prometheus text format")
+    ap.add_argument("--format", default="png", choices=FORMATS, help="Card image format (auto: best under --max-kb)")
+    ap.add_argument("--quality", type=int, default=85, help="WebP/JPEG quality")
+    ap.add_argument("--max-kb", type=float, default=None, help="Fit each card under this many KB")
+    args = ap.parse_args()
+    if args.offline:
+        set_offline(True)
+    telemetry = get_telemetry()
+    if args.trace or args.metrics:
+        telemetry.enabled = True
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    from src.card.canvas import VARIANTS
+
+    unknown = [v for v in variants if v not in VARIANTS]
+    if unknown:
+        ap.error(f"unknown variant(s): {', '.join(unknown)}; choose from {', '.join(VARIANTS)}")
+    options = {
+        "compact": not args.raw_flow,
+        "token_budget": args.token_budget,
+        "resume": args.resume,
+        "variants": variants,
+        "encoding": EncodeOptions(format=args.format, quality=args.quality, max_kb=args.max_kb),
+        "analyzer": args.analyzer,
+        "fallback_after": args.fallback_after,
+        "analyst_mode": args.analyst_mode,
+        "chunk_steps": args.chunk_steps,
+        "stream": args.stream,
+        "brands": not args.no_brand_registry,
+        "background": args.background,
+        "layout": args.layout,
+        "screenshots": args.screenshots,
+    }
+
+    if args.batch:
+        from src.batch import discover_flows, run_batch, print_summary
+
+        result = run_batch(
+            discover_flows(args.batch), Path(args.out), workers=args.workers, dedupe=not args.no_dedupe, **options
+        )
+        print_summary(result)
+        _report_telemetry(args.trace, args.metrics)
+        if result.failures:
+            raise SystemExit(1)
+        return
+
+    info = analyze_flow(Path(args.flow), Path(args.out), **options)
+    if info["tokens_saved"]:
+        print(f"Flow compaction saved ~{info['tokens_saved']} prompt tokens")
+    if info["over_token_budget"]:
+        print(f"Warning: the compacted flow is still over --token-budget {args.token_budget}")
+    for im in info["images"]:
+        if "bytes" in im:
+            over = " (over --max-kb)" if args.max_kb and im["bytes"] > args.max_kb * 1024 else ""
+            print(f"{im['path']}: {im['format']} {im['bytes'] / 1024:.1f} KB, encoded in {im['encode_ms']:.1f} ms{over}")
+    if info["fallbacks"]:
+        print(f"Local analyzer used for: {', '.join(info['fallbacks'])}")
+    stages = ", ".join(f"{k} {v:.2f}s" for k, v in info["timings"].items())
+    print(f"Finished in {info['elapsed']:.2f}s ({stages})")
+    _report_telemetry(args.trace, args.metrics)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
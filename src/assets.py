@@ -0,0 +1,583 @@
+# Asset fetcher: step screenshots and video thumbnails through a pooled client
+# into a content-addressed disk cache, with eviction, revalidation and a local mirror
+from __future__ import annotations
+
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote, urlsplit
+
+from src.canonical import canonical_url
+from src.telemetry import get_telemetry
+
+__all__ = [
+    "Asset",
+    "AssetError",
+    "AssetStore",
+    "flow_asset_urls",
+    "mirror_path",
+    "get_asset_store",
+    "serve_mirror",
+]
+
+DEFAULT_ASSETS_DIR = ".cache/assets"
+DEFAULT_MAX_MB = 512.0
+# Cached assets are served without asking the origin for this long, then revalidated
+DEFAULT_MAX_AGE = 86400.0
+DEFAULT_MAX_PARALLEL = 8
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url           TEXT PRIMARY KEY,
+    sha256        TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    content_type  TEXT,
+    checked       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_sha ON urls(sha256);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256   TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs(accessed);
+"""
+
+# As in src.cache: reads only bump the LRU timestamp when it is older than this
+_TOUCH_INTERVAL = 60.0
+
+
+class AssetError(RuntimeError):
+    """An asset could not be fetched (HTTP error, network failure or offline without a copy)."""
+
+
+@dataclass
+class Asset:
+    url: str
+    path: Path
+    sha256: str
+    size: int
+    content_type: Optional[str]
+    # "cache", "revalidated" (304), "fetched", "mirror" or "stale" (origin unreachable)
+    source: str
+
+    def read(self) -> bytes:
+        return self.path.read_bytes()
+
+
+def flow_asset_urls(flow: Optional[Dict[str, Any]]) -> List[str]:
+    """Screenshot and video-thumbnail URLs of the flow's steps, deduplicated, in step order.
+
+    IMAGE steps contribute ``url`` and ``originalImageUrl`` (usually the same
+    file); VIDEO steps only their ``videoThumbnailUrl``, not the stream itself.
+    """
+    if not isinstance(flow, dict):
+        return []
+    urls: List[str] = []
+    for step in flow.get("steps", []) or []:
+        keys: Tuple[str, ...] = ()
+        if step.get("type") == "IMAGE":
+            keys = ("url", "originalImageUrl")
+        elif step.get("type") == "VIDEO":
+            keys = ("videoThumbnailUrl",)
+        urls.extend(step[k] for k in keys if isinstance(step.get(k), str) and step[k].startswith("http"))
+    return list(dict.fromkeys(urls))
+
+
+def mirror_path(url: str, root: Union[str, Path]) -> Path:
+    """Where ``url`` lives in a mirror directory: ``root/<host>/<path>[@<query>]``.
+
+    Raises ValueError for URLs that would land outside ``root`` (no host,
+    ``.``/``..`` segments), since flow URLs are untrusted input.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    segments = [s for s in parts.path.split("/") if s]
+    if not host or host in (".", "..") or "/" in host or "\\" in host or any(s in (".", "..") for s in segments):
+        raise ValueError(f"not a mirrorable URL: {url!r}")
+    rel = "/".join(segments) or "index"
+    if parts.query:
+        rel += "@" + quote(parts.query, safe="=&")
+    base = Path(root).resolve()
+    path = (base / host / rel).resolve()
+    if not path.is_relative_to(base):
+        raise ValueError(f"not a mirrorable URL: {url!r}")
+    return Path(root) / host / rel
+
+
+def _http_date(ts: float) -> str:
+    return email.utils.formatdate(ts, usegmt=True)
+
+
+class AssetStore:
+    """Content-addressed asset cache in front of a pooled HTTP client.
+
+    * files live once per content hash under ``root/blobs``; the SQLite index
+      maps canonical URLs (signature/tracking parameters dropped, see
+      ``src.canonical``) to hashes, so re-signed URLs and the same screenshot
+      under two URLs share one file
+    * ``max_bytes`` bounds the blobs, evicting least recently used
+    * entries older than ``max_age`` seconds are revalidated with
+      ``If-None-Match`` / ``If-Modified-Since``; a 304 costs no body, and an
+      unreachable origin serves the stale copy
+    * at most ``max_parallel`` downloads at a time over one keep-alive pool;
+      concurrent requests for the same URL share one download
+    * ``mirror``: a directory laid out as ``mirror_path`` that is read instead
+      of the network; ``origin``: a base URL that replaces scheme and host
+      (``https://cdn/x.png`` -> ``ORIGIN/cdn/x.png``), e.g. ``serve_mirror``
+
+    asyncio primitives and the HTTP pool are bound to the running loop, as in
+    ``src.ai_async.AsyncLLM``. ``client`` injects an ``httpx.AsyncClient``-like
+    object (``get(url, headers=...)``) for tests.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path] = DEFAULT_ASSETS_DIR,
+        max_bytes: Optional[int] = int(DEFAULT_MAX_MB * 1024 * 1024),
+        max_age: Optional[float] = DEFAULT_MAX_AGE,
+        max_parallel: int = DEFAULT_MAX_PARALLEL,
+        mirror: Optional[Union[str, Path]] = None,
+        origin: Optional[str] = None,
+        timeout: float = 30.0,
+        client: Any = None,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_parallel = max_parallel
+        self.mirror = Path(mirror) if mirror else None
+        self.origin = origin.rstrip("/") if origin else None
+        self.timeout = timeout
+        self._client = client
+        self._owns_client = client is None
+        self._local = threading.local()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, "asyncio.Task[Asset]"] = {}
+        self.downloads = 0
+        self.downloaded_bytes = 0
+
+    @classmethod
+    def from_env(cls) -> "AssetStore":
+        max_mb = float(os.getenv("ARCADE_ASSETS_MAX_MB") or DEFAULT_MAX_MB)
+        max_age = float(os.getenv("ARCADE_ASSETS_MAX_AGE") or DEFAULT_MAX_AGE)
+        return cls(
+            os.getenv("ARCADE_ASSETS_DIR", DEFAULT_ASSETS_DIR),
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None,
+            max_age=max_age if max_age > 0 else None,
+            max_parallel=int(os.getenv("ARCADE_ASSETS_MAX_PARALLEL") or DEFAULT_MAX_PARALLEL),
+            mirror=os.getenv("ARCADE_ASSETS_MIRROR") or None,
+            origin=os.getenv("ARCADE_ASSETS_ORIGIN") or None,
+        )
+
+    # ---- index ---------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / "index.sqlite"), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / "blobs" / sha256[:2] / sha256
+
+    def _row(self, key: str) -> Optional[Tuple[Any, ...]]:
+        return self._conn().execute(
+            "SELECT u.sha256, u.etag, u.last_modified, u.content_type, u.checked, b.size, b.accessed "
+            "FROM urls u JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?",
+            (key,),
+        ).fetchone()
+
+    def lookup(self, url: str) -> Optional[Asset]:
+        """The cached copy of ``url`` regardless of age, without any network access."""
+        row = self._row(canonical_url(url))
+        if row is None:
+            return None
+        sha, _etag, _lm, ctype, _checked, size, accessed = row
+        path = self.blob_path(sha)
+        if not path.exists():
+            # Blob removed behind our back: forget it so the next fetch downloads again
+            self._forget(sha)
+            return None
+        now = time.time()
+        if accessed < now - _TOUCH_INTERVAL:
+            self._conn().execute("UPDATE blobs SET accessed = ? WHERE sha256 = ?", (now, sha))
+        return Asset(url, path, sha, size, ctype, "cache")
+
+    def _forget(self, sha: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha,))
+        conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+
+    def _store(self, url: str, data: bytes, headers: Dict[str, str], source: str) -> Asset:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{sha}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs(sha256, size, accessed) VALUES (?, ?, ?)", (sha, len(data), now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls(url, sha256, etag, last_modified, content_type, checked) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (canonical_url(url), sha, headers.get("etag"), headers.get("last-modified"), headers.get("content-type"), now),
+            )
+            doomed = self._evict(conn, keep=sha)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for old in doomed:
+            self.blob_path(old).unlink(missing_ok=True)
+        return Asset(url, path, sha, len(data), headers.get("content-type"), source)
+
+    def _evict(self, conn: sqlite3.Connection, keep: Optional[str] = None) -> List[str]:
+        """Drop least recently used blobs until within ``max_bytes``; returns their hashes."""
+        if self.max_bytes is None:
+            return []
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        doomed: List[str] = []
+        for sha, size in conn.execute("SELECT sha256, size FROM blobs ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            if sha == keep:
+                continue
+            doomed.append(sha)
+            total -= size
+        conn.executemany("DELETE FROM urls WHERE sha256 = ?", [(s,) for s in doomed])
+        conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(s,) for s in doomed])
+        return doomed
+
+    def _mark_checked(self, key: str) -> None:
+        self._conn().execute("UPDATE urls SET checked = ? WHERE url = ?", (time.time(), key))
+
+    def prune(self) -> int:
+        """Apply the size limit and drop blobs no URL refers to; returns files removed."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM urls)")
+            doomed = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        known = {row[0] for row in conn.execute("SELECT sha256 FROM blobs")}
+        removed = 0
+        for path in (self.root / "blobs").glob("*/*"):
+            if path.name not in known or path.name in doomed:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        urls = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        blobs, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"root": str(self.root), "urls": urls, "files": blobs, "bytes": total, "max_bytes": self.max_bytes}
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- network -------------------------------------------------------------
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_parallel)
+            self._inflight = {}
+            if self._owns_client:
+                # pooled connections belong to the previous loop; start a fresh pool
+                self._client = None
+
+    def _get_client(self) -> Any:
+        if self._client is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise AssetError(f"downloading assets needs httpx ({e})") from e
+
+            limits = httpx.Limits(max_connections=self.max_parallel, max_keepalive_connections=self.max_parallel)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+        return self._client
+
+    def _remote_url(self, url: str) -> str:
+        if self.origin is None:
+            return url
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self.origin}/{parts.netloc}{parts.path}{query}"
+
+    async def _download(self, url: str, row: Optional[Tuple[Any, ...]]) -> Asset:
+        from src.ai import is_offline
+
+        key = canonical_url(url)
+        if self.mirror is not None:
+            try:
+                local = mirror_path(url, self.mirror)
+            except ValueError as e:
+                raise AssetError(str(e)) from None
+            if local.is_file():
+                data = await asyncio.to_thread(local.read_bytes)
+                headers = {"last-modified": _http_date(local.stat().st_mtime)}
+                return await asyncio.to_thread(self._store, url, data, headers, "mirror")
+        cached = await asyncio.to_thread(self.lookup, url) if row is not None else None
+        if is_offline():
+            if cached is not None:
+                return cached
+            raise AssetError(f"offline mode: {url} is not cached")
+        headers: Dict[str, str] = {}
+        if cached is not None:
+            etag, last_modified = row[1], row[2]  # type: ignore[index]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        assert self._sem is not None
+        tel = get_telemetry()
+        async with self._sem:
+            try:
+                with tel.timer("asset_fetch", revalidate=cached is not None):
+                    response = await self._get_client().get(self._remote_url(url), headers=headers)
+            except Exception as e:
+                if cached is not None:
+                    cached.source = "stale"
+                    return cached
+                if isinstance(e, AssetError):
+                    raise
+                raise AssetError(f"{url}: {type(e).__name__}: {e}") from e
+        if response.status_code == 304 and cached is not None:
+            await asyncio.to_thread(self._mark_checked, key)
+            cached.source = "revalidated"
+            return cached
+        if response.status_code != 200:
+            if cached is not None and response.status_code >= 500:
+                cached.source = "stale"
+                return cached
+            raise AssetError(f"{url}: HTTP {response.status_code}")
+        data = response.content
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        resp_headers = {k.lower(): v for k, v in response.headers.items()}
+        return await asyncio.to_thread(self._store, url, data, resp_headers, "fetched")
+
+    async def fetch(self, url: str) -> Asset:
+        """The asset at ``url``: from the cache while fresh, else revalidated or downloaded."""
+        self._bind_loop()
+        key = canonical_url(url)
+        row = await asyncio.to_thread(self._row, key)
+        if row is not None and (self.max_age is None or row[4] >= time.time() - self.max_age):
+            cached = await asyncio.to_thread(self.lookup, url)
+            if cached is not None:
+                get_telemetry().count("asset", source="cache")
+                return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, row))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        asset = await task
+        get_telemetry().count("asset", source=asset.source)
+        return asset
+
+    async def fetch_many(self, urls: Iterable[str]) -> Dict[str, Union[Asset, AssetError]]:
+        """Fetch every URL (``max_parallel`` at a time); failures are returned, not raised."""
+
+        async def one(url: str) -> Tuple[str, Union[Asset, AssetError]]:
+            try:
+                return url, await self.fetch(url)
+            except AssetError as e:
+                return url, e
+            except Exception as e:
+                # Index or disk failures for one URL must not abort the rest of the batch
+                return url, AssetError(f"{url}: {type(e).__name__}: {e}")
+
+        return dict(await asyncio.gather(*(one(u) for u in dict.fromkeys(urls))))
+
+    async def aclose(self) -> None:
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_store: Optional[AssetStore] = None
+_init_lock = threading.Lock()
+
+
+def get_asset_store() -> AssetStore:
+    """Process-wide store configured from ``ARCADE_ASSETS_*`` (see ``AssetStore.from_env``)."""
+    global _store
+    if _store is None:
+        with _init_lock:
+            if _store is None:
+                _store = AssetStore.from_env()
+    return _store
+
+
+# ---- Local stand-in origin ---------------------------------------------------
+
+async def serve_mirror(
+    mirror: Union[str, Path], host: str = "127.0.0.1", port: int = 8766, ready: Optional[asyncio.Event] = None
+) -> None:
+    """Serve a mirror directory over HTTP as ``GET /<host>/<path>[?query]``.
+
+    Responses carry ``ETag`` (content hash) and ``Last-Modified`` and honour
+    conditional requests with 304, so ``ARCADE_ASSETS_ORIGIN=http://HOST:PORT``
+    exercises the whole download/revalidation path without the real CDN.
+    """
+    from src.transport import _read_request
+
+    root = Path(mirror)
+
+    def reply(status: str, headers: Dict[str, str], body: bytes = b"") -> bytes:
+        head = [f"HTTP/1.1 {status}", f"Content-Length: {len(body)}"] + [f"{k}: {v}" for k, v in headers.items()]
+        return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                req = await _read_request(reader)
+                if req is None:
+                    break
+                method, target, headers, _body = req
+                path, _, query = target.lstrip("/").partition("?")
+                netloc, _, rest = path.partition("/")
+                url = f"http://{netloc}/{rest}" + (f"?{query}" if query else "")
+                try:
+                    local: Optional[Path] = mirror_path(url, root)
+                except ValueError:
+                    local = None
+                if method != "GET" or local is None or not local.is_file():
+                    writer.write(reply("404 Not Found", {}))
+                else:
+                    data = await asyncio.to_thread(local.read_bytes)
+                    etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+                    meta = {"ETag": etag, "Last-Modified": _http_date(local.stat().st_mtime)}
+                    if headers.get("if-none-match") == etag:
+                        writer.write(reply("304 Not Modified", meta))
+                    else:
+                        writer.write(reply("200 OK", {**meta, "Content-Type": "application/octet-stream"}, data))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+# ---- CLI: python -m src.assets {fetch,mirror,stats,prune,serve} ------------------
+
+def _urls(sources: List[str]) -> List[str]:
+    from src.analyzer_ai import read_flow
+    from src.batch import discover_flows
+
+    urls: List[str] = []
+    for source in sources:
+        if source.startswith(("http://", "https://")):
+            urls.append(source)
+            continue
+        for fp in discover_flows(source):
+            urls.extend(flow_asset_urls(read_flow(fp)))
+    return list(dict.fromkeys(urls))
+
+
+async def _fetch_all(store: AssetStore, urls: List[str]) -> Dict[str, Union[Asset, AssetError]]:
+    try:
+        return await store.fetch_many(urls)
+    finally:
+        await store.aclose()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fetch and maintain cached flow assets (screenshots, thumbnails)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("fetch", help="Download every asset of the given flows into the cache")
+    sp.add_argument("sources", nargs="+", help="Flow files, dirs, globs or manifests; or asset URLs")
+    sp = sub.add_parser("mirror", help="Copy the given flows' assets into a mirror directory")
+    sp.add_argument("sources", nargs="+")
+    sp.add_argument("--to", required=True, help="Mirror directory (<host>/<path> layout)")
+    sub.add_parser("stats", help="Show cache size")
+    sub.add_parser("prune", help="Apply the size limit and remove unreferenced files")
+    sp = sub.add_parser("serve", help="Serve a mirror directory as a stand-in origin")
+    sp.add_argument("--mirror", required=True)
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        print(f"Serving {args.mirror} on http://{args.host}:{args.port} (set ARCADE_ASSETS_ORIGIN to this)")
+        try:
+            asyncio.run(serve_mirror(args.mirror, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+    store = get_asset_store()
+    if args.cmd in ("fetch", "mirror"):
+        urls = _urls(args.sources)
+        started = time.perf_counter()
+        results = asyncio.run(_fetch_all(store, urls))
+        failed = {u: r for u, r in results.items() if isinstance(r, AssetError)}
+        for url, err in failed.items():
+            print(f"  failed {url}: {err}")
+        if args.cmd == "mirror":
+            for url, asset in results.items():
+                if isinstance(asset, Asset):
+                    try:
+                        target = mirror_path(url, args.to)
+                    except ValueError as e:
+                        print(f"  skipped {e}")
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    target.write_bytes(asset.read())
+        sources: Dict[str, int] = {}
+        for r in results.values():
+            if isinstance(r, Asset):
+                sources[r.source] = sources.get(r.source, 0) + 1
+        print(
+            f"{len(results) - len(failed)}/{len(results)} assets in {time.perf_counter() - started:.2f}s "
+            f"({json.dumps(sources)}, {store.downloaded_bytes / 1024:.0f} KB downloaded)"
+        )
+        if failed:
+            raise SystemExit(1)
+        return
+    if args.cmd == "prune":
+        print(f"Removed {store.prune()} files")
+    print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
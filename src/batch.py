@@ -0,0 +1,182 @@
+# Batch driver: run the analyzer pipeline over many flows with bounded concurrency
+from __future__ import annotations
+
+import asyncio
+import glob
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+__all__ = ["BatchResult", "discover_flows", "output_dirs", "run_batch", "run_batch_async", "print_summary"]
+
+_GLOB_CHARS = ("*", "?", "[")
+
+
+@dataclass
+class BatchResult:
+    ok: List[Dict[str, Any]] = field(default_factory=list)
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.ok) + len(self.failures)
+
+    @property
+    def flows_per_sec(self) -> float:
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def duplicates(self) -> int:
+        return sum(1 for r in self.ok if r.get("duplicate_of"))
+
+
+def _read_manifest(path: Path) -> List[Path]:
+    """One flow path per line; blank lines and ``#`` comments are ignored.
+    Relative paths resolve against the manifest's directory."""
+    out: List[Path] = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        p = Path(line)
+        out.append(p if p.is_absolute() else path.parent / p)
+    return out
+
+
+def discover_flows(source: str) -> List[Path]:
+    """Resolve a directory, glob pattern, single ``.json`` or manifest into flow paths."""
+    if any(ch in source for ch in _GLOB_CHARS):
+        return sorted(Path(p) for p in glob.glob(source, recursive=True) if p.endswith(".json"))
+    path = Path(source)
+    if path.is_dir():
+        return sorted(path.glob("*.json"))
+    if path.suffix.lower() == ".json":
+        return [path]
+    if path.is_file():
+        return _read_manifest(path)
+    raise FileNotFoundError(f"No flows found for {source!r}")
+
+
+def output_dirs(flows: List[Path], root: Path) -> List[Path]:
+    """Map each flow to ``root/<stem>``, suffixing duplicates so stems never collide."""
+    seen: Dict[str, int] = {}
+    dirs: List[Path] = []
+    for fp in flows:
+        stem = fp.stem
+        n = seen.get(stem, 0)
+        seen[stem] = n + 1
+        dirs.append(root / (stem if n == 0 else f"{stem}-{n}"))
+    return dirs
+
+
+def _fingerprint(fp: Path) -> Optional[str]:
+    from src.canonical import fingerprint_file
+
+    try:
+        return fingerprint_file(fp)
+    except Exception:  # unreadable flows are reported by the pipeline itself
+        return None
+
+
+def _copy_outputs(leader: Dict[str, Any], fp: Path, od: Path) -> Dict[str, Any]:
+    """Reuse a leader's outputs for a flow with the same fingerprint."""
+    src_dir = Path(leader["report"]).parent
+    shutil.copytree(src_dir, od, dirs_exist_ok=True)
+
+    def moved(path: str) -> str:
+        return str(od / Path(path).relative_to(src_dir))
+
+    images = [{**img, "path": moved(img["path"])} for img in leader.get("images", [])]
+    return {
+        **leader,
+        "flow": str(fp),
+        "report": moved(leader["report"]),
+        "image": moved(leader["image"]),
+        "images": images,
+        "tokens_saved": 0,
+        "elapsed": 0.0,
+        "duplicate_of": leader["flow"],
+    }
+
+
+async def run_batch_async(
+    flows: List[Path], out_root: Path, workers: int = 8, dedupe: bool = True, **options: Any
+) -> BatchResult:
+    """Analyze every flow, at most ``workers`` at a time, on one event loop.
+
+    Each flow's pipeline is mostly waiting on LLM round trips, so concurrency
+    gives near-linear speedup until the API limits configured on the shared
+    async client (``src.ai_async``) kick in. With ``dedupe``, flows with the
+    same content fingerprint (``src.canonical``) are analyzed once and the
+    rest get a copy of the outputs, marked ``duplicate_of`` in their result.
+    ``options`` are passed through to ``analyze_flow_async``.
+    """
+    from src.analyzer_ai import analyze_flow_async
+
+    result = BatchResult()
+    sem = asyncio.Semaphore(max(1, workers))
+    start = time.perf_counter()
+
+    leaders: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+    prints: List[Optional[str]] = [None] * len(flows)
+    if dedupe and len(flows) > 1:
+        prints = list(await asyncio.gather(*(asyncio.to_thread(_fingerprint, fp) for fp in flows)))
+
+    async def one(fp: Path, od: Path, fingerprint: Optional[str]) -> None:
+        leader = leaders.get(fingerprint) if fingerprint else None
+        if leader is not None:
+            info = await leader
+            if info is None:
+                result.failures.append((str(fp), "duplicate of a flow that failed"))
+                return
+            try:
+                result.ok.append(await asyncio.to_thread(_copy_outputs, info, fp, od))
+            except Exception as e:
+                result.failures.append((str(fp), f"{type(e).__name__}: {e}"))
+            return
+        done: "asyncio.Future[Optional[Dict[str, Any]]]" = asyncio.get_running_loop().create_future()
+        if fingerprint:
+            leaders[fingerprint] = done
+        info = None
+        async with sem:
+            try:
+                info = await analyze_flow_async(fp, od, **options)
+                result.ok.append(info)
+            except Exception as e:  # one bad flow must not sink the batch
+                result.failures.append((str(fp), f"{type(e).__name__}: {e}"))
+            finally:
+                done.set_result(info)
+
+    await asyncio.gather(*(one(fp, od, p) for fp, od, p in zip(flows, output_dirs(flows, out_root), prints)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_batch(flows: List[Path], out_root: Path, workers: int = 8, **options: Any) -> BatchResult:
+    return asyncio.run(run_batch_async(flows, out_root, workers=workers, **options))
+
+
+def print_summary(result: BatchResult) -> None:
+    saved = sum(int(r.get("tokens_saved") or 0) for r in result.ok)
+    print(
+        f"Processed {result.total} flows in {result.elapsed:.2f}s "
+        f"({result.flows_per_sec:.2f} flows/sec), {len(result.failures)} failed, "
+        f"~{saved} prompt tokens saved by compaction"
+    )
+    from src.ai import get_cache
+
+    cache = get_cache()
+    print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    if result.duplicates:
+        print(f"Skipped {result.duplicates} duplicate flows (same content fingerprint)")
+    fell_back = sum(1 for r in result.ok if r.get("fallbacks"))
+    if fell_back:
+        print(f"Local analyzer fallback used in {fell_back} flows")
+    over = sum(1 for r in result.ok if r.get("over_token_budget"))
+    if over:
+        print(f"{over} flows were still over --token-budget after compaction")
+    for fp, err in result.failures:
+        print(f"  FAILED {fp}: {err}")
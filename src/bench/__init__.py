@@ -0,0 +1 @@
+# Benchmarks for the analyzer and card renderer (run with python -m src.bench.<name>)
@@ -0,0 +1,128 @@
+# Load test: run the batch pipeline against replayed LLM responses and report
+# throughput and tail latency (no API calls, reproducible with --seed)
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.bench.synthetic import write_flow
+
+__all__ = ["run"]
+
+
+def _quantiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q: float) -> float:
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+    return {
+        "p50": round(pick(0.5), 4),
+        "p90": round(pick(0.9), 4),
+        "p99": round(pick(0.99), 4),
+        "max": round(values[-1], 4),
+        "mean": round(statistics.fmean(values), 4),
+    }
+
+
+def run(flows: List[Path], out_root: Path, workers: int) -> Dict[str, Any]:
+    """Run the batch and collect flows/sec, per-flow and per-call latency quantiles."""
+    from src.batch import run_batch_async
+    from src.telemetry import get_telemetry
+    from src.transport import replay_stats
+
+    telemetry = get_telemetry()
+    telemetry.enabled = True
+    telemetry.reset()
+    result = asyncio.run(run_batch_async(flows, out_root, workers=workers))
+    llm = [s for (name, _labels), samples in telemetry.timers.items() if name == "llm" for s in samples]
+    report: Dict[str, Any] = {
+        "flows": result.total,
+        "failed": len(result.failures),
+        "elapsed": round(result.elapsed, 3),
+        "flows_per_sec": round(result.flows_per_sec, 3),
+        "flow_seconds": _quantiles([r["elapsed"] for r in result.ok]),
+        "llm_seconds": _quantiles(llm),
+        "summary": telemetry.summary(),
+        "failures": result.failures[:20],
+    }
+    stats = replay_stats()
+    if stats is not None:
+        report["replay"] = stats
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load-test the analyzer pipeline with replayed LLM responses")
+    ap.add_argument("--recording", default=None, help="Recorded responses (ARCADE_LLM_TRANSPORT=record output)")
+    ap.add_argument("--server", default=None, help="Use a running `python -m src.transport serve` at this base URL")
+    ap.add_argument("--flows", default=None, help="Directory/glob/manifest of flows (default: synthetic flows)")
+    ap.add_argument("--synthetic", type=int, default=50, help="Number of distinct synthetic flows")
+    ap.add_argument("--steps", type=int, default=40, help="Steps/events per synthetic flow")
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--latency", default="lognormal:1.0,0.5", help="Replay latency model (see src.transport)")
+    ap.add_argument("--error-429", type=float, default=0.0)
+    ap.add_argument("--error-timeout", type=float, default=0.0)
+    ap.add_argument("--timeout", type=float, default=None, help="Client timeout in seconds (ARCADE_LLM_TIMEOUT)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="out/load.json")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="arcade-load-"))
+    # A fresh cache per run: every call must go through the transport. The
+    # brand registry too, so replayed palettes never reach the real one.
+    os.environ["ARCADE_CACHE_PATH"] = str(tmp / "ai.sqlite")
+    os.environ["ARCADE_BRANDS_PATH"] = str(tmp / "brands.sqlite")
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    if args.timeout:
+        os.environ["ARCADE_LLM_TIMEOUT"] = str(args.timeout)
+    if args.server:
+        os.environ["ARCADE_LLM_TRANSPORT"] = "openai"
+        os.environ["OPENAI_BASE_URL"] = args.server
+    else:
+        os.environ["ARCADE_LLM_TRANSPORT"] = "replay"
+        os.environ["ARCADE_LLM_LATENCY"] = args.latency
+        os.environ["ARCADE_LLM_ERROR_429"] = str(args.error_429)
+        os.environ["ARCADE_LLM_ERROR_TIMEOUT"] = str(args.error_timeout)
+        os.environ["ARCADE_LLM_SEED"] = str(args.seed)
+        if args.recording:
+            os.environ["ARCADE_LLM_RECORDING"] = args.recording
+
+    if args.flows:
+        from src.batch import discover_flows
+
+        flows = discover_flows(args.flows)
+    else:
+        (tmp / "flows").mkdir()
+        flows = [
+            write_flow(tmp / "flows" / f"synthetic-{i}.json", args.steps, args.steps, seed=args.seed + i)
+            for i in range(args.synthetic)
+        ]
+
+    report = run(flows, tmp / "out", args.workers)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(
+        f"{report['flows']} flows ({report['failed']} failed) in {report['elapsed']:.2f}s, "
+        f"{report['flows_per_sec']:.2f} flows/sec"
+    )
+    for name in ("flow_seconds", "llm_seconds"):
+        q = report[name]
+        if q:
+            print(f"  {name}: p50 {q['p50']:.3f}  p90 {q['p90']:.3f}  p99 {q['p99']:.3f}  max {q['max']:.3f}")
+    if "replay" in report:
+        print(f"  replay: {report['replay']}")
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Benchmark suite: time each hot path on synthetic flows, compare against a baseline
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.bench.synthetic import make_flow, write_flow
+
+__all__ = ["DEFAULT_SIZES", "stub_llm", "run", "compare"]
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+# Below this a case is dominated by timer noise; never report it as a regression
+NOISE_FLOOR_MS = 0.5
+
+_ANALYST = (
+    "TITLE: Shop and check out\n"
+    "SUMMARY: The user searches for an item, picks options and adds it to the cart. "
+    "They finish by reviewing the cart.\n\n"
+    "STEPS:\n" + "".join(f"{i}. Click the button on page {i}\n" for i in range(1, 41)) + "\n"
+    "TAGS: shopping, cart, checkout"
+)
+_BRIEF = (
+    '{"overlay":"Shop and check out in seconds","elements":["Search for the item",'
+    '"Pick the product","Choose a color","Add to cart","Review your cart"]}'
+)
+_STYLE = (
+    '{"primary_color":"#cc0000","background_color":"#cc0000","text_color":"#ffffff",'
+    '"accent_color":"#990000","font_family":"Inter"}'
+)
+
+
+@contextlib.contextmanager
+def stub_llm(latency: float = 0.0) -> Iterator[None]:
+    """Answer analyzer LLM calls with canned text (after ``latency`` seconds).
+
+    The brand registry is swapped for a throwaway one meanwhile, so the canned
+    palette is never recorded for (or served to) real flows.
+    """
+    import src.analyzer_ai as analyzer
+    import src.brands as brands
+
+    async def fake(
+        system: str,
+        user: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.4,
+        kind: str = "chat",
+        cache_key: Optional[str] = None,
+    ) -> str:
+        if latency:
+            await asyncio.sleep(latency)
+        if system == analyzer.SYSTEM_STYLE:
+            return _STYLE
+        if system == analyzer.SYSTEM_IMAGE:
+            return _BRIEF
+        return _ANALYST
+
+    saved = analyzer.achat_cached, brands._registry
+    with tempfile.TemporaryDirectory(prefix="arcade-stub-") as td:
+        analyzer.achat_cached = fake
+        brands._registry = brands.BrandRegistry(os.path.join(td, "brands.sqlite"))
+        try:
+            yield
+        finally:
+            brands._registry.close()
+            analyzer.achat_cached, brands._registry = saved
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # warm-up: imports, font index, first-call caches
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000.0)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+
+def _flow_cases(size: int, tmp: Path) -> Dict[str, Callable[[], Any]]:
+    from src.analyzer_ai import _collect_seen_colors, read_flow
+    from src.card.style import derive_style_from_flow
+    from src.local_analyzer import analyze_local
+    from src.timeline import timing_metrics
+
+    path = write_flow(tmp / f"flow-{size}.json", size, size)
+    plain = make_flow(size, size)  # no precomputed index: the helpers walk the steps
+    return {
+        "read_flow": lambda: read_flow(path),
+        "collect_seen_colors": lambda: _collect_seen_colors(plain),
+        "derive_style_from_flow": lambda: derive_style_from_flow(plain),
+        "analyze_local": lambda: analyze_local(plain),
+        "timing_metrics": lambda: timing_metrics(plain),
+    }
+
+
+def _fixed_cases(tmp: Path) -> Dict[str, Callable[[], Any]]:
+    from PIL import Image, ImageDraw  # type: ignore
+
+    from src.analyzer_ai import extract_title_and_summary, parse_brief
+    from src.bench.text_fit import FIVE_BULLETS, LONG_HEADLINE
+    from src.card.bullets import layout_bullets
+    from src.card.canvas import CANVAS
+    from src.card.text import clear_measure_cache, fit_text
+    from src.image_card import compose
+
+    d = ImageDraw.Draw(Image.new("RGB", (CANVAS.width, CANVAS.height)))
+    width = CANVAS.width - CANVAS.pad_x * 2
+    flow = make_flow(100, 100)
+    brief = json.loads(_BRIEF)
+    return {
+        "extract_title_and_summary": lambda: extract_title_and_summary(_ANALYST, "fallback"),
+        "parse_brief": lambda: parse_brief(_BRIEF, "fallback"),
+        # Cold: the measurement memo is cleared first, as for a new brief
+        "fit_text": lambda: (clear_measure_cache(), fit_text(d, LONG_HEADLINE, width, 2, 80, 40, "Inter")),
+        "layout_bullets": lambda: (clear_measure_cache(), layout_bullets(d, FIVE_BULLETS, "Inter", width, 300)),
+        "compose": lambda: compose(brief, tmp / "social.png", flow=flow),
+    }
+
+
+def _end_to_end(size: int, tmp: Path, analyzer: str) -> Callable[[], Any]:
+    from src.analyzer_ai import analyze_flow_async
+
+    path = write_flow(tmp / f"e2e-{size}.json", size, size)
+    # No brand registry: after the first repeat it would answer the style call
+    # from a lookup and the "llm" case would stop timing that path
+    return lambda: asyncio.run(
+        analyze_flow_async(path, tmp / f"out-{analyzer}-{size}", analyzer=analyzer, brands=False)
+    )
+
+
+def run(sizes: List[int], repeat: int = 5, e2e_repeat: int = 3) -> Dict[str, Any]:
+    """Time every case; keys are ``case`` or ``case@size`` for size-scaled cases."""
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as td, stub_llm():
+        tmp = Path(td)
+        for name, fn in _fixed_cases(tmp).items():
+            results[name] = _time(fn, repeat)
+        for size in sizes:
+            for name, fn in _flow_cases(size, tmp).items():
+                results[f"{name}@{size}"] = _time(fn, repeat)
+            for analyzer in ("llm", "local"):
+                results[f"end_to_end_{analyzer}@{size}"] = _time(_end_to_end(size, tmp, analyzer), e2e_repeat)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25) -> List[str]:
+    """Cases whose median is more than ``tolerance`` slower than the baseline."""
+    regressions: List[str] = []
+    for name, base in baseline.get("results", {}).items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        before, after = base["median_ms"], cur["median_ms"]
+        if after > before * (1 + tolerance) and after - before > NOISE_FLOOR_MS:
+            regressions.append(f"{name}: {before:.3f} ms -> {after:.3f} ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark the analyzer and card renderer on synthetic flows")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated step/event counts")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", default="out/bench.json", help="Where to write the results JSON")
+    ap.add_argument("--baseline", default=None, help="Results JSON to compare against; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--update-baseline", action="store_true", help="Also write the results to --baseline")
+    args = ap.parse_args()
+
+    result = run([int(s) for s in args.sizes.split(",") if s.strip()], args.repeat)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    width = max(len(k) for k in result["results"])
+    for name, r in result["results"].items():
+        print(f"{name:<{width}}  {r['median_ms']:>10.3f} ms")
+    print(f"Wrote {out}")
+
+    if not args.baseline:
+        return
+    base_path = Path(args.baseline)
+    if args.update_baseline or not base_path.exists():
+        base_path.parent.mkdir(parents=True, exist_ok=True)
+        base_path.write_text(json.dumps(result, indent=2))
+        print(f"Baseline written to {base_path}")
+        return
+    regressions = compare(result, json.loads(base_path.read_text()), args.tolerance)
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions vs {base_path} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
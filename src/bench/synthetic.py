@@ -0,0 +1,159 @@
+# Synthetic Arcade flows shaped like flow.json / flow_chase.json, at any size
+from __future__ import annotations
+
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+__all__ = ["make_flow", "write_flow"]
+
+_SITES = (
+    ("target.com", "Target", ["#cc0000", "#ffffff", "#2142e7", "#fdfdff"]),
+    ("chase.com", "Chase", ["#117aca", "#ffffff", "#0b4f8a", "#f5f7fa"]),
+    ("fidelity.com", "Fidelity", ["#368727", "#ffffff", "#1c4d12", "#eeeeee"]),
+)
+_PAGES = ("Home", "Search results", "Product detail", "Options", "Cart", "Checkout", "Account")
+_ACTIONS = (
+    ("Tap the search bar to start looking for your next favorite product.", "search", "other"),
+    ("Click the product image to learn more about its features.", "Product image", "image"),
+    ("Choose your preferred color to personalize your selection.", "Blue", "image"),
+    ("Click *Add to cart* to secure this item before it sells out!", "Add to cart", "button"),
+    ("Select Decline coverage if you prefer not to add a protection plan.", "Decline coverage", "button"),
+    ("Visit your cart to review your selected items and proceed to checkout.", "1", "link"),
+)
+_BLURHASH = "UWQSrGog_Nxs^0aNE2ouM|jra0WFRpadr;kE"
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _chapter(rng: random.Random, title: str, subtitle: str) -> Dict[str, Any]:
+    return {
+        "type": "CHAPTER",
+        "id": _uuid(rng),
+        "title": title,
+        "subtitle": subtitle,
+        "theme": "light",
+        "textAlign": "left",
+        "paths": [{"id": _uuid(rng), "pathType": "step", "buttonColor": "#2142e7", "buttonTextColor": "#ffffff"}],
+        "hotspots": [],
+    }
+
+
+def _image_step(rng: random.Random, i: int, domain: str, brand: str, colors: List[str]) -> Dict[str, Any]:
+    label, text, etype = _ACTIONS[i % len(_ACTIONS)]
+    page = _PAGES[i % len(_PAGES)]
+    sid = _uuid(rng)
+    return {
+        "id": sid,
+        "type": "IMAGE",
+        "url": f"https://cdn.arcade.software/extension-uploads/synthetic/image/{sid}.png",
+        "originalImageUrl": f"https://cdn.arcade.software/extension-uploads/synthetic/image/{sid}.png",
+        "blurhash": _BLURHASH,
+        "hasHTML": True,
+        "size": {"width": 1709, "height": 834},
+        "pageContext": {
+            "url": f"https://www.{domain}/{page.lower().replace(' ', '-')}?ref={i}&sid={sid[:8]}#lnk=sametab",
+            "title": f"{page} : {brand}",
+            "description": f"Shop {brand} online for everything you need. Step {i}.",
+            "width": 1709,
+            "height": 834,
+            "language": "en-US",
+        },
+        "hotspots": [{
+            "id": _uuid(rng),
+            "width": 40,
+            "height": 40,
+            "label": label,
+            "style": "pulsating",
+            "defaultOpen": True,
+            "textColor": colors[3],
+            "bgColor": rng.choice(colors[:3]),
+            "x": rng.random(),
+            "y": rng.random(),
+        }],
+        "clickContext": {
+            "cssSelector": f"div[id=\"step-{i}\"] > div:nth-of-type({i % 9 + 1}) > button",
+            "text": text,
+            "elementType": etype,
+            "sections": ["Footer"],
+            "originalRect": {"x": rng.randint(0, 1600), "y": rng.randint(0, 800), "width": 120, "height": 44},
+        },
+        "assetId": sid,
+    }
+
+
+def _video_step(rng: random.Random, i: int) -> Dict[str, Any]:
+    return {
+        "id": _uuid(rng),
+        "type": "VIDEO",
+        "url": "https://stream.mux.com/synthetic.m3u8",
+        "startTimeFrac": 0.1,
+        "endTimeFrac": 0.4,
+        "playbackRate": 1,
+        "duration": 27.4,
+        "muted": True,
+        "videoThumbnailUrl": f"https://image.mux.com/synthetic/thumbnail.png?time={i}",
+        "size": {"width": 1709, "height": 834},
+        "hotspots": [],
+        "paths": [],
+    }
+
+
+def make_flow(steps: int, events: int, seed: int = 0) -> Dict[str, Any]:
+    """Deterministic flow with ``steps`` steps (chapters, images, every 4th a
+    video) and ``events`` captured events (clicks joined to image steps by
+    ``clickId``, with typing/scrolling/dragging in between)."""
+    rng = random.Random(seed)
+    domain, brand, colors = _SITES[seed % len(_SITES)]
+    title = f"Shop and check out on {brand}"
+    out: List[Dict[str, Any]] = [_chapter(rng, title, f"See how to find, customize and buy an item on {brand}.")]
+    for i in range(max(0, steps - 2)):
+        out.append(_video_step(rng, i) if i % 4 == 3 else _image_step(rng, i, domain, brand, colors))
+    if steps > 1:
+        out.append(_chapter(rng, "Thank you for your interest!", ""))
+    out = out[:steps]
+
+    clicks = [s["id"] for s in out if s["type"] == "IMAGE"] or [_uuid(rng)]
+    t = 1_756_746_383_245
+    captured: List[Dict[str, Any]] = []
+    for j in range(events):
+        if j % 3 == 0:
+            captured.append({
+                "type": "click",
+                "clickId": clicks[(j // 3) % len(clicks)],
+                "frameX": rng.random() * 1700,
+                "frameY": rng.random() * 830,
+                "timeMs": t,
+                "tabId": 471877758,
+                "frameId": 0,
+            })
+        else:
+            kind = ("typing", "scrolling", "dragging")[j % 3 if j % 7 else 2]
+            dur = rng.randint(100, 6000)
+            captured.append({"type": kind, "startTimeMs": t, "endTimeMs": t + dur, "tabId": 471877758, "frameId": 0})
+            t += dur
+        t += rng.randint(200, 2500)
+
+    return {
+        "createdBy": _uuid(rng),
+        "schemaVersion": "1.0.0",
+        "name": title,
+        "description": "",
+        "useCase": "promotional",
+        "font": "Inter",
+        "created": {"_seconds": 1756746383, "_nanoseconds": 0},
+        "modified": {"_seconds": 1756746999, "_nanoseconds": 0},
+        "showCaptions": True,
+        "autoplay": False,
+        "capturedEvents": captured,
+        "steps": out,
+    }
+
+
+def write_flow(path: Path, steps: int, events: int, seed: int = 0) -> Path:
+    path.write_text(json.dumps(make_flow(steps, events, seed), indent=2))
+    return path
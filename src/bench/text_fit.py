@@ -0,0 +1,150 @@
+# Benchmark: text fitting engine vs the previous step-down/prefix-measuring layout
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont  # type: ignore
+
+from src.card.canvas import CANVAS
+from src.card.text import clear_measure_cache, fit_text, try_load_font
+from src.card.bullets import layout_bullets
+
+LONG_HEADLINE = (
+    "Open a Chase Total Checking account online in minutes with guided steps for identity, "
+    "funding, direct deposit setup and mobile banking enrollment"
+)
+FIVE_BULLETS = [
+    "Search checking to compare account options, monthly fees and minimum balance rules",
+    "Choose Total Checking and review the sign-up bonus and its qualifying activities",
+    "Enter personal details, verify your identity and accept the account agreements",
+    "Fund the new account by transfer from another bank or with a debit card payment",
+    "Set up direct deposit, enroll in Zelle and download the mobile app to finish",
+]
+
+
+# ---- Reference: the layout before the fitting engine ---------------------------
+# Same font loading (cached faces) so only the layout algorithm is compared.
+
+def _measure(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
+    bbox = draw.textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def _wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
+    words = text.split()
+    if not words:
+        return [""]
+    lines: List[str] = []
+    cur: List[str] = []
+    for w in words:
+        tw, _ = _measure(draw, " ".join(cur + [w]), font)
+        if tw <= max_width or not cur:
+            cur.append(w)
+        else:
+            lines.append(" ".join(cur))
+            cur = [w]
+    if cur:
+        lines.append(" ".join(cur))
+    return lines
+
+
+def legacy_fit_text(draw: ImageDraw.ImageDraw, text: str, max_width: int, max_lines: int,
+                    start_size: int, min_size: int, font_name: Optional[str]) -> Tuple[Any, List[str]]:
+    size = start_size
+    while size >= min_size:
+        font = try_load_font(font_name, size)
+        lines = _wrap_text(draw, text, font, max_width)
+        if len(lines) <= max_lines and all(_measure(draw, ln, font)[0] <= max_width for ln in lines):
+            return font, lines
+        size -= 2
+    font = try_load_font(font_name, min_size)
+    return font, _wrap_text(draw, text, font, max_width)[:max_lines]
+
+
+def legacy_layout_bullets(d: ImageDraw.ImageDraw, bullets: List[str], font_name: Optional[str],
+                          max_width: int, max_height: int, start_size: int = 40,
+                          min_size: int = 24) -> Tuple[Any, List[List[str]]]:
+    size = start_size
+    body_font = try_load_font(font_name, size)
+    wrapped: List[List[str]] = []
+    while size >= min_size:
+        body_font = try_load_font(font_name, size)
+        wrapped = []
+        total_h = 0
+        for e in bullets:
+            lines = _wrap_text(d, e, body_font, max_width=max_width - 36)
+            wrapped.append(lines)
+            _, lh = _measure(d, "Ag", body_font)
+            total_h += max(lh, 28) * len(lines) + 12
+        if total_h <= max_height:
+            break
+        size -= 2
+    if size < min_size:
+        new_wrapped: List[List[str]] = []
+        total_h = 0
+        for lines in wrapped:
+            _, lh = _measure(d, "Ag", body_font)
+            block_h = max(lh, 28) * len(lines) + 12
+            if total_h + block_h > max_height:
+                break
+            new_wrapped.append(lines)
+            total_h += block_h
+        wrapped = new_wrapped
+    return body_font, wrapped
+
+
+# ---- Runner -----------------------------------------------------------------
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples) * 1000.0
+
+
+def run(font: Optional[str] = "Inter", repeat: int = 20) -> Dict[str, Any]:
+    d = ImageDraw.Draw(Image.new("RGB", (CANVAS.width, CANVAS.height)))
+    width = CANVAS.width - CANVAS.pad_x * 2
+    cases = {
+        "long_headline": (
+            lambda: legacy_fit_text(d, LONG_HEADLINE, width, 2, 80, 40, font),
+            lambda: fit_text(d, LONG_HEADLINE, width, 2, 80, 40, font),
+        ),
+        "five_bullets": (
+            lambda: legacy_layout_bullets(d, FIVE_BULLETS, font, width, 300, 40, 24),
+            lambda: layout_bullets(d, FIVE_BULLETS, font, width, 300, 40, 24),
+        ),
+    }
+    results: Dict[str, Any] = {}
+    for name, (legacy, engine) in cases.items():
+        (lf, ll), (ef, el) = legacy(), engine()
+        if ll != el or lf.size != ef.size:
+            raise AssertionError(f"{name}: layout differs from reference")
+        # Cold: fresh measurement memo (new text); warm: same text laid out again
+        cold = _time(lambda: (clear_measure_cache(), engine()), repeat)
+        legacy_ms = _time(legacy, repeat)
+        results[name] = {
+            "legacy_ms": round(legacy_ms, 3),
+            "engine_cold_ms": round(cold, 3),
+            "engine_warm_ms": round(_time(engine, repeat), 3),
+            "speedup_cold": round(legacy_ms / max(cold, 1e-6), 1),
+        }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark card text fitting")
+    ap.add_argument("--font", default="Inter")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    print(json.dumps(run(args.font, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
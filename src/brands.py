@@ -0,0 +1,344 @@
+# Brand palette registry: one persistent style answer per primary domain (+ font),
+# shared across flows, with confidence/TTL metadata, manual overrides and pre-warming
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+__all__ = ["PALETTE_KEYS", "BrandEntry", "BrandRegistry", "get_brand_registry", "prewarm"]
+
+DEFAULT_REGISTRY_FILE = ".cache/brands.sqlite"
+PALETTE_KEYS = ("primary_color", "background_color", "text_color", "accent_color", "font_family")
+# As src.combined: int(x, 16) alone would also take "+12345", "-1234a" and "1_234f"
+_HEX = re.compile(r"^#[0-9a-fA-F]{6}$")
+
+# Model answers are written once (a known brand is never asked again) and kept
+# at this confidence until they expire; raise the minimum above it to serve
+# overrides only
+_LLM_CONFIDENCE = 0.6
+DEFAULT_MIN_CONFIDENCE = 0.5
+DEFAULT_TTL_DAYS = 30.0
+# Lookups count hits in memory and write them out in one batch this often
+_HIT_FLUSH_EVERY = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS brands (
+    domain     TEXT NOT NULL,
+    font       TEXT NOT NULL,
+    palette    TEXT NOT NULL,
+    source     TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    created    REAL NOT NULL,
+    expires    REAL,
+    hits       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (domain, font)
+);
+"""
+
+
+@dataclass
+class BrandEntry:
+    domain: str
+    font: str
+    palette: Dict[str, str]
+    source: str            # "llm", "prewarm" or "override"
+    confidence: float
+    created: float
+    expires: Optional[float]
+    hits: int = 0
+
+
+def _palette(obj: Any) -> Optional[Dict[str, str]]:
+    """The palette keys of a style answer, or None unless every color is #rrggbb."""
+    if not isinstance(obj, dict):
+        return None
+    out = {k: obj.get(k) for k in PALETTE_KEYS}
+    for k in PALETTE_KEYS[:4]:
+        v = out[k]
+        if not (isinstance(v, str) and _HEX.match(v.strip())):
+            return None
+        out[k] = v.strip().lower()
+    if not isinstance(out["font_family"], str):
+        out["font_family"] = ""
+    return out
+
+
+class BrandRegistry:
+    """SQLite-backed (domain, font) → palette store, safe across threads and processes.
+
+    Entries keyed with font ``""`` serve any font: the flow's own font is
+    substituted into the palette. Overrides never expire and always win;
+    model answers expire after ``ttl`` seconds and are only served while
+    their confidence is at least ``min_confidence``. Hit counts are buffered
+    in memory and flushed every ``_HIT_FLUSH_EVERY`` lookups, on ``entries``
+    and on ``close``.
+    """
+
+    def __init__(
+        self, path: str, ttl: Optional[float] = None, min_confidence: float = DEFAULT_MIN_CONFIDENCE
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+        self._local = threading.local()
+        self._hits: Dict[Tuple[str, str], int] = {}
+        self._hits_pending = 0
+        self._hits_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _entry(row: Tuple[Any, ...]) -> BrandEntry:
+        domain, font, palette, source, confidence, created, expires, hits = row
+        return BrandEntry(domain, font, json.loads(palette), source, confidence, created, expires, hits)
+
+    def lookup(self, domain: str, font: str = "") -> Optional[Dict[str, str]]:
+        """Palette for ``domain`` (and ``font``), or None when unknown, stale or unsure."""
+        if not domain:
+            return None
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT domain, font, palette, source, confidence, created, expires, hits FROM brands "
+            "WHERE domain = ? AND font IN (?, '') AND (expires IS NULL OR expires > ?) AND confidence >= ? "
+            "ORDER BY source = 'override' DESC, font = ? DESC LIMIT 1",
+            (domain.lower(), font or "", time.time(), self.min_confidence, font or ""),
+        ).fetchall()
+        if not rows:
+            return None
+        entry = self._entry(rows[0])
+        with self._hits_lock:
+            self._hits[(entry.domain, entry.font)] = self._hits.get((entry.domain, entry.font), 0) + 1
+            self._hits_pending += 1
+            due = self._hits_pending >= _HIT_FLUSH_EVERY
+        if due:
+            self.flush_hits()
+        palette = dict(entry.palette)
+        if font and not entry.font:
+            palette["font_family"] = font
+        return palette
+
+    def flush_hits(self) -> None:
+        """Write the buffered lookup counts to the database."""
+        with self._hits_lock:
+            hits, self._hits, self._hits_pending = self._hits, {}, 0
+        if hits:
+            self._conn().executemany(
+                "UPDATE brands SET hits = hits + ? WHERE domain = ? AND font = ?",
+                [(n, domain, font) for (domain, font), n in hits.items()],
+            )
+
+    def record(self, domain: str, font: str, answer: Any, source: str = "llm") -> Optional[BrandEntry]:
+        """Store a model's style answer for a brand the registry doesn't serve yet.
+
+        Callers only ask the model on a miss, so an answer replaces nothing but
+        an expired entry (or a known one under ``prewarm --force``); overrides
+        are left alone and invalid answers are ignored.
+        """
+        palette = _palette(answer)
+        if not domain or palette is None:
+            return None
+        key = (domain.lower(), font or "")
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT domain, font, palette, source, confidence, created, expires, hits FROM brands "
+                "WHERE domain = ? AND font = ?",
+                key,
+            ).fetchone()
+            old = self._entry(row) if row else None
+            if old is not None and old.source == "override":
+                conn.execute("COMMIT")
+                return old
+            expires = now + self.ttl if self.ttl is not None else None
+            conn.execute(
+                "INSERT OR REPLACE INTO brands(domain, font, palette, source, confidence, created, expires, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(palette), source, _LLM_CONFIDENCE, now, expires, old.hits if old else 0),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return BrandEntry(key[0], key[1], palette, source, _LLM_CONFIDENCE, now, expires)
+
+    def override(self, domain: str, palette: Dict[str, str], font: str = "") -> BrandEntry:
+        """Pin a palette for ``domain``: confidence 1, never expires, never replaced by the model."""
+        checked = _palette(palette)
+        if checked is None:
+            raise ValueError(f"palette needs #rrggbb values for {', '.join(PALETTE_KEYS[:4])}")
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO brands(domain, font, palette, source, confidence, created, expires, hits) "
+            "VALUES (?, ?, ?, 'override', 1.0, ?, NULL, 0)",
+            (domain.lower(), font or "", json.dumps(checked), now),
+        )
+        return BrandEntry(domain.lower(), font or "", checked, "override", 1.0, now, None)
+
+    def delete(self, domain: str, font: Optional[str] = None) -> int:
+        if font is None:
+            return self._conn().execute("DELETE FROM brands WHERE domain = ?", (domain.lower(),)).rowcount
+        return self._conn().execute(
+            "DELETE FROM brands WHERE domain = ? AND font = ?", (domain.lower(), font)
+        ).rowcount
+
+    def entries(self) -> List[BrandEntry]:
+        self.flush_hits()
+        rows = self._conn().execute(
+            "SELECT domain, font, palette, source, confidence, created, expires, hits FROM brands ORDER BY domain, font"
+        )
+        return [self._entry(r) for r in rows]
+
+    def close(self) -> None:
+        self.flush_hits()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_registry: Optional[BrandRegistry] = None
+_init_lock = threading.Lock()
+
+
+def get_brand_registry() -> BrandRegistry:
+    """Process-wide registry at ``ARCADE_BRANDS_PATH`` (TTL: ``ARCADE_BRAND_TTL_DAYS``)."""
+    global _registry
+    if _registry is None:
+        with _init_lock:
+            if _registry is None:
+                days = float(os.getenv("ARCADE_BRAND_TTL_DAYS") or DEFAULT_TTL_DAYS)
+                _registry = BrandRegistry(
+                    os.getenv("ARCADE_BRANDS_PATH", DEFAULT_REGISTRY_FILE),
+                    ttl=days * 86400 if days > 0 else None,
+                    min_confidence=float(os.getenv("ARCADE_BRAND_MIN_CONFIDENCE") or DEFAULT_MIN_CONFIDENCE),
+                )
+                atexit.register(_registry.flush_hits)
+    return _registry
+
+
+async def prewarm(brands: Iterable[Tuple[str, str]], registry: BrandRegistry, force: bool = False) -> Dict[str, str]:
+    """Ask the model once per (domain, font) not yet served by ``registry``; returns domain -> outcome."""
+    from src.ai_async import achat_cached
+    from src.analyzer_ai import strip_code_fences
+    from src.prompts import SYSTEM_STYLE, USER_STYLE
+
+    async def one(domain: str, font: str) -> Tuple[str, str]:
+        if not force and registry.lookup(domain, font) is not None:
+            return domain, "known"
+        prompt = USER_STYLE.format(
+            primary_domain=domain,
+            flow_name="",
+            urls=f"https://{domain}/",
+            titles="",
+            brand_hints=", ".join(dict.fromkeys([domain, domain.split(".")[0]])),
+            flow_font=font,
+            seen_colors="",
+        )
+        try:
+            raw = await achat_cached(SYSTEM_STYLE, prompt, kind="style")
+            entry = registry.record(domain, font, json.loads(strip_code_fences(raw)), source="prewarm")
+        except Exception as e:
+            return domain, f"failed ({type(e).__name__})"
+        return domain, "added" if entry is not None else "invalid answer"
+
+    import asyncio  # deferred: the analyzer imports this module on its startup path
+
+    results = await asyncio.gather(*(one(d, f) for d, f in dict.fromkeys(brands)))
+    return dict(results)
+
+
+# ---- CLI: python -m src.brands {list,set,delete,prewarm} ------------------------
+
+def _flow_brands(source: str) -> List[Tuple[str, str]]:
+    from src.analyzer_ai import brand_key, read_flow
+    from src.batch import discover_flows
+
+    out: List[Tuple[str, str]] = []
+    for fp in discover_flows(source):
+        try:
+            key = brand_key(read_flow(fp))
+        except Exception as e:
+            print(f"  skipped {fp}: {type(e).__name__}: {e}")
+            continue
+        if key[0]:
+            out.append(key)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect and maintain the brand palette registry")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="Show every entry")
+    sp = sub.add_parser("set", help="Pin a palette for a domain (manual override)")
+    sp.add_argument("domain")
+    sp.add_argument("--primary", required=True)
+    sp.add_argument("--background", required=True)
+    sp.add_argument("--text", required=True)
+    sp.add_argument("--accent", default=None, help="Default: the primary color")
+    sp.add_argument("--font", default="", help="Font family for the card")
+    sp.add_argument("--for-font", default="", help="Only for flows using this font (default: any)")
+    sp = sub.add_parser("delete", help="Forget a domain")
+    sp.add_argument("domain")
+    sp = sub.add_parser("prewarm", help="Ask the model once for each brand not yet known")
+    sp.add_argument("domains", nargs="*", help="Domains such as target.com")
+    sp.add_argument("--flows", default=None, help="Also every primary domain in these flows (dir/glob/manifest)")
+    sp.add_argument("--force", action="store_true", help="Ask again even for known brands")
+    args = ap.parse_args()
+
+    registry = get_brand_registry()
+    if args.cmd == "list":
+        for e in registry.entries():
+            expires = time.strftime("%Y-%m-%d", time.localtime(e.expires)) if e.expires else "never"
+            font = f" [{e.font}]" if e.font else ""
+            print(
+                f"{e.domain}{font}: {e.palette['primary_color']} on {e.palette['background_color']} "
+                f"({e.source}, confidence {e.confidence:.2f}, expires {expires}, {e.hits} hits)"
+            )
+    elif args.cmd == "set":
+        palette = {
+            "primary_color": args.primary,
+            "background_color": args.background,
+            "text_color": args.text,
+            "accent_color": args.accent or args.primary,
+            "font_family": args.font,
+        }
+        try:
+            registry.override(args.domain, palette, args.for_font)
+        except ValueError as e:
+            ap.error(str(e))
+        print(f"Pinned {args.domain.lower()}")
+    elif args.cmd == "delete":
+        print(f"Removed {registry.delete(args.domain)} entries")
+    else:
+        brands = [(d.lower(), "") for d in args.domains]
+        if args.flows:
+            brands += _flow_brands(args.flows)
+        if not brands:
+            ap.error("give domains and/or --flows")
+        import asyncio
+
+        for domain, outcome in asyncio.run(prewarm(brands, registry, args.force)).items():
+            print(f"{domain}: {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# Persistent LLM response cache: indexed, bounded and safe for concurrent writers
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+__all__ = ["CacheStats", "ResponseCache"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    value    TEXT NOT NULL,
+    model    TEXT,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Reads only bump the LRU timestamp when it is older than this, so hot keys
+# don't turn every cache hit into a write transaction.
+_TOUCH_INTERVAL = 60.0
+
+# Writes keep running totals and only rescan the table (COUNT/SUM, TTL sweep)
+# when those say a limit is crossed or after this many puts; the periodic
+# rescan also picks up rows written by other processes sharing the file.
+_EVICT_EVERY = 64
+
+# Hits/misses are also added to the file's lifetime counters (for the CLI),
+# batched in memory and written out after this many lookups
+_COUNTER_FLUSH_EVERY = 64
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """SQLite-backed key → completion store.
+
+    * lookups hit the primary-key index; nothing is loaded up front
+    * ``max_entries`` / ``max_bytes`` bound the store, evicting least recently used
+    * ``ttl`` (seconds) expires entries on read and during compaction
+    * WAL mode + ``BEGIN IMMEDIATE`` writes make it safe for many threads and
+      processes sharing one file; each thread gets its own connection
+    * ``hits``/``misses`` count this instance's lookups; ``lifetime_counts``
+      adds up every process's, flushed from memory in batches and on ``close``
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._unflushed = {"hits": 0, "misses": 0}
+        self._totals: Optional[Tuple[int, int]] = None  # (entries, bytes) as of the last scan, plus puts since
+        self._puts_since_scan = 0
+
+    # ---- connection handling -------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit: bool) -> None:
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._unflushed["hits" if hit else "misses"] += 1
+            due = sum(self._unflushed.values()) >= _COUNTER_FLUSH_EVERY
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self) -> None:
+        """Add the lookups counted since the last flush to the file's lifetime counters."""
+        with self._counter_lock:
+            pending = [(name, n) for name, n in self._unflushed.items() if n]
+            self._unflushed = {"hits": 0, "misses": 0}
+        if pending:
+            self._conn().executemany(
+                "INSERT INTO counters(name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                pending,
+            )
+
+    def lifetime_counts(self) -> Dict[str, int]:
+        """Hits and misses over every process that has used this file."""
+        self.flush_counters()
+        counts = {"hits": 0, "misses": 0}
+        counts.update(self._conn().execute("SELECT name, value FROM counters"))
+        return counts
+
+    # ---- public API ----------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, created, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            self._count(False)
+            return None
+        value, created, accessed = row
+        if self.ttl is not None and created < now - self.ttl:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count(False)
+            return None
+        if accessed < now - _TOUCH_INTERVAL:
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self._count(True)
+        return value
+
+    def put(self, key: str, value: str, model: Optional[str] = None) -> None:
+        conn = self._conn()
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, model, created, accessed, size) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, model, now, now, size),
+            )
+            if self._evict_due(size):
+                self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _within_limits(self, count: int, total: int) -> bool:
+        return (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes)
+
+    def _evict_due(self, size: int) -> bool:
+        """Account for one put of ``size`` bytes; True when a full ``_evict`` pass should run."""
+        if self.ttl is None and self.max_entries is None and self.max_bytes is None:
+            return False
+        with self._counter_lock:
+            self._puts_since_scan += 1
+            if self._totals is not None:
+                # A REPLACE over-counts here, which only makes the next scan come sooner.
+                self._totals = (self._totals[0] + 1, self._totals[1] + size)
+            due = (
+                self._totals is None
+                or self._puts_since_scan >= _EVICT_EVERY
+                or not self._within_limits(*self._totals)
+            )
+            if due:
+                self._puts_since_scan = 0
+            return due
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """Drop expired rows, then least recently used rows until within limits."""
+        removed = 0
+        if self.ttl is not None:
+            removed += conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,)).rowcount
+        if self.max_entries is None and self.max_bytes is None:
+            self._record_totals(0, 0)
+            return removed
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        doomed = []
+        if not self._within_limits(count, total):
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+                if self._within_limits(count, total):
+                    break
+                doomed.append((key,))
+                count -= 1
+                total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self._record_totals(count, total)
+        return removed + len(doomed)
+
+    def _record_totals(self, count: int, total: int) -> None:
+        with self._counter_lock:
+            self._totals = (count, total)
+
+    def compact(self) -> int:
+        """Apply TTL and size limits, then VACUUM to return space to the OS."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        return removed
+
+    def clear(self) -> None:
+        """Drop every entry and reset the lifetime counters."""
+        with self._counter_lock:
+            self._unflushed = {"hits": 0, "misses": 0}
+        self._conn().execute("DELETE FROM entries")
+        self._conn().execute("DELETE FROM counters")
+        self._record_totals(0, 0)
+
+    def stats(self) -> CacheStats:
+        count, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return CacheStats(hits=self.hits, misses=self.misses, entries=count, bytes=total)
+
+    def close(self) -> None:
+        self.flush_counters()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ---- CLI: python -m src.cache {stats,compact,clear} -----------------------------
+
+def main() -> None:
+    from src.ai import get_cache
+
+    ap = argparse.ArgumentParser(description="Inspect and maintain the LLM response cache")
+    ap.add_argument("command", choices=["stats", "compact", "clear"])
+    args = ap.parse_args()
+
+    cache = get_cache()
+    if args.command == "compact":
+        removed = cache.compact()
+        print(f"Removed {removed} entries")
+    elif args.command == "clear":
+        cache.clear()
+    st = cache.stats()
+    counts = cache.lifetime_counts()
+    looked_up = counts["hits"] + counts["misses"]
+    info: Dict[str, Any] = {
+        "path": cache.path,
+        "entries": st.entries,
+        "bytes": st.bytes,
+        "hits": counts["hits"],
+        "misses": counts["misses"],
+        "hit_ratio": round(counts["hits"] / looked_up, 3) if looked_up else 0.0,
+    }
+    print(json.dumps(info))
+
+
+if __name__ == "__main__":
+    main()
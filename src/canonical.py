@@ -0,0 +1,98 @@
+# Flow canonicalization: drop volatile fields so re-recordings of the same demo
+# produce the same cache keys and fingerprint
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+__all__ = ["canonicalize", "canonical_url", "flow_fingerprint", "fingerprint_file"]
+
+# Change on every save/re-recording without changing what the flow shows
+_VOLATILE_KEYS = frozenset({
+    "created", "modified", "lastModifiedBy", "createdBy", "editors", "uploadId", "folderId",
+    "teamId", "themeId", "processedAI", "processedAIReason", "ai", "hasUsedAI",
+    # capturedEvents: absolute times, browser tab/frame ids
+    "timeMs", "startTimeMs", "endTimeMs", "tabId", "frameId",
+    # pixel geometry jitters between recordings
+    "x", "y", "frameX", "frameY", "originalRect", "cssSelector",
+    # screenshot/video assets are re-uploaded (new ids, new pixels) each time
+    "url", "originalImageUrl", "videoThumbnailUrl", "blurhash", "assetId",
+})
+# Asset fields above are dropped, but page URLs are content: keep those, cleaned
+_PAGE_URL_PARENTS = ("pageContext",)
+_ID_KEYS = ("id", "clickId")
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I)
+# Query parameters that sign, expire or track a URL rather than address content
+_VOLATILE_PARAMS = re.compile(
+    r"^(x-amz-.*|x-goog-.*|signature|sig|expires|key-pair-id|policy|token|se|sp|sv|sr|st|skoid|sktid|"
+    r"googleaccessid|utm_.*|gclid|fbclid|msclkid|_ga|sid|session|ts|timestamp)$",
+    re.I,
+)
+
+
+def canonical_url(url: str) -> str:
+    """Drop signature/expiry/tracking parameters and fragments; sort the rest."""
+    try:
+        p = urlparse(url)
+    except ValueError:
+        return url
+    params = sorted((k, v) for k, v in parse_qsl(p.query, keep_blank_values=True) if not _VOLATILE_PARAMS.match(k))
+    return urlunparse((p.scheme.lower(), p.netloc.lower(), p.path, "", urlencode(params), ""))
+
+
+class _Canonicalizer:
+    def __init__(self) -> None:
+        # UUIDs become ordinals in first-seen order, so joins (step id <-> clickId) survive
+        self.ids: Dict[str, str] = {}
+
+    def _ordinal(self, raw: str) -> str:
+        u = raw.lower()
+        if u not in self.ids:
+            self.ids[u] = f"id{len(self.ids) + 1}"
+        return self.ids[u]
+
+    def _id(self, m: "re.Match[str]") -> str:
+        return self._ordinal(m.group(0))
+
+    def value(self, v: Any, key: Optional[str] = None, parent: Optional[str] = None) -> Any:
+        if isinstance(v, dict):
+            return {
+                k: self.value(x, k, key)
+                for k, x in v.items()
+                if k not in _VOLATILE_KEYS or (k == "url" and key in _PAGE_URL_PARENTS)
+            }
+        if isinstance(v, list):
+            return [self.value(x, None, key) for x in v]
+        if isinstance(v, str):
+            if key in _ID_KEYS:
+                return self._ordinal(v)
+            if key == "url" and parent in _PAGE_URL_PARENTS:
+                v = canonical_url(v)
+            return _UUID.sub(self._id, v)
+        return v
+
+
+def canonicalize(flow: Dict[str, Any]) -> Dict[str, Any]:
+    """A copy of ``flow`` without volatile fields.
+
+    Dropped: timestamps and editors, step/asset/upload ids' UUID spellings (kept
+    as stable ordinals), screenshot/video asset URLs and blurhashes, event
+    times, tab ids and pixel coordinates. Page URLs stay, minus signature,
+    expiry and tracking parameters. Labels, titles, steps and event order are
+    untouched, so two recordings of the same demo canonicalize identically.
+    """
+    return _Canonicalizer().value(flow)
+
+
+def flow_fingerprint(flow: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical flow; equal for semantically identical flows."""
+    text = json.dumps(canonicalize(flow), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint_file(path: Any) -> str:
+    with open(path, "r", encoding="utf-8") as fp:
+        return flow_fingerprint(json.load(fp))
@@ -0,0 +1,166 @@
+# Vectorized blurhash decoder: page colours from the hash every IMAGE step carries
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from .color import is_neutral_rgb
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__all__ = ["flow_blurhashes", "decode_batch", "blurhash_palette", "gradient_layer"]
+
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# Decoded size for palette statistics: the hash only holds a few cosine
+# components, so more pixels add no information
+_PALETTE_SIZE = 8
+# Quantization for the dominant-colour histogram: 4 bits per channel
+_BIN_BITS = 4
+_BINS = 1 << _BIN_BITS
+
+
+def flow_blurhashes(flow: Optional[Dict[str, Any]]) -> List[str]:
+    """Every IMAGE step's blurhash, in step order."""
+    if not isinstance(flow, dict):
+        return []
+    return [
+        s["blurhash"]
+        for s in flow.get("steps", []) or []
+        if s.get("type") == "IMAGE" and isinstance(s.get("blurhash"), str) and len(s["blurhash"]) >= 6
+    ]
+
+
+def _lookup() -> "np.ndarray":
+    import numpy as np
+
+    table = np.full(256, -1, dtype=np.int64)
+    table[np.frombuffer(_ALPHABET.encode("ascii"), dtype=np.uint8)] = np.arange(83)
+    return table
+
+
+def _base83(digits: "np.ndarray") -> "np.ndarray":
+    """Values of base-83 numbers, one per row of ``digits`` (most significant first)."""
+    import numpy as np
+
+    powers = 83 ** np.arange(digits.shape[-1] - 1, -1, -1, dtype=np.int64)
+    return (digits * powers).sum(axis=-1)
+
+
+def _srgb_to_linear(v: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    v = v / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(v: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    v = np.clip(v, 0.0, 1.0)
+    out = np.where(v <= 0.0031308, v * 12.92 * 255 + 0.5, (1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+    return out.astype(np.uint8)
+
+
+def _decode_group(codes: "np.ndarray", nx: int, ny: int, width: int, height: int, punch: float) -> "np.ndarray":
+    """Decode same-shaped hashes (``codes``: N x len digit matrix) to N x H x W x 3 uint8."""
+    import numpy as np
+
+    max_ac = (codes[:, 1] + 1) / 166.0 * punch
+    dc = _base83(codes[:, 2:6])
+    colors = np.empty((len(codes), ny * nx, 3))
+    colors[:, 0] = _srgb_to_linear(np.stack([dc >> 16, (dc >> 8) & 255, dc & 255], axis=-1))
+    if nx * ny > 1:
+        ac = _base83(codes[:, 6:].reshape(len(codes), nx * ny - 1, 2))
+        quant = np.stack([ac // (19 * 19), (ac // 19) % 19, ac % 19], axis=-1)
+        signed = (quant - 9) / 9.0
+        colors[:, 1:] = np.sign(signed) * signed ** 2 * max_ac[:, None, None]
+    colors = colors.reshape(len(codes), ny, nx, 3)
+    # Separable cosine basis: pixel (y, x) = sum_j sum_i C[j, i] * cos(pi*i*x/W) * cos(pi*j*y/H)
+    basis_x = np.cos(np.pi * np.outer(np.arange(width), np.arange(nx)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(height), np.arange(ny)) / height)
+    pixels = np.einsum("yj,xi,njic->nyxc", basis_y, basis_x, colors, optimize=True)
+    return _linear_to_srgb(pixels)
+
+
+def decode_batch(hashes: Sequence[str], width: int = 32, height: int = 32, punch: float = 1.0) -> "np.ndarray":
+    """Decode ``hashes`` into an N x height x width x 3 uint8 array.
+
+    Hashes are grouped by component count and each group is decoded with a
+    handful of array operations (base-83 digits through a lookup table, one
+    einsum over the cosine basis), so a flow's worth of hashes costs about
+    as much as one. Malformed hashes decode to black.
+    """
+    import numpy as np
+
+    out = np.zeros((len(hashes), height, width, 3), dtype=np.uint8)
+    table = _lookup()
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, h in enumerate(hashes):
+        if not h or not h.isascii() or h[0] not in _ALPHABET:
+            continue
+        size = _ALPHABET.index(h[0])
+        nx, ny = size % 9 + 1, size // 9 + 1
+        if len(h) == 4 + 2 * nx * ny:
+            groups.setdefault((nx, ny), []).append(i)
+    for (nx, ny), idx in groups.items():
+        raw = np.frombuffer("".join(hashes[i] for i in idx).encode("ascii"), dtype=np.uint8)
+        codes = table[raw].reshape(len(idx), 4 + 2 * nx * ny)
+        valid = (codes >= 0).all(axis=1)
+        if valid.any():
+            out[np.asarray(idx)[valid]] = _decode_group(codes[valid], nx, ny, width, height, punch)
+    return out
+
+
+def _luminance(pixels: "np.ndarray") -> "np.ndarray":
+    """WCAG relative luminance per pixel (as card.color.rel_luminance)."""
+    lin = _srgb_to_linear(pixels.astype(float))
+    return 0.2126 * lin[..., 0] + 0.7152 * lin[..., 1] + 0.0722 * lin[..., 2]
+
+
+def blurhash_palette(flow: Optional[Dict[str, Any]], top: int = 4) -> Optional[Dict[str, Any]]:
+    """Page colours of the flow's screenshots, from their blurhashes alone.
+
+    Returns ``{"dominant", "colors", "luminance"}``: the most common
+    non-neutral colour (None if the pages are all greys), up to ``top``
+    frequent colours overall, and the mean relative luminance (0 dark .. 1
+    light). None when the flow has no usable hashes.
+    """
+    hashes = flow_blurhashes(flow)
+    if not hashes:
+        return None
+    import numpy as np
+
+    images = decode_batch(hashes, _PALETTE_SIZE, _PALETTE_SIZE)
+    images = images[images.reshape(len(images), -1).any(axis=1)]  # undecodable hashes come back all black
+    if not len(images):
+        return None
+    pixels = images.reshape(-1, 3)
+    bins = (pixels >> (8 - _BIN_BITS)).astype(np.int64)
+    keys = (bins[:, 0] * _BINS + bins[:, 1]) * _BINS + bins[:, 2]
+    counts = np.bincount(keys, minlength=_BINS ** 3)
+    sums = np.stack([np.bincount(keys, weights=pixels[:, c], minlength=_BINS ** 3) for c in range(3)], axis=-1)
+    order = np.argsort(counts)[::-1]
+    order = order[counts[order] > 0]
+    means = [tuple(int(v) for v in np.round(sums[k] / counts[k])) for k in order]
+    dominant = next((c for c in means if not is_neutral_rgb(c)), None)
+    return {
+        "dominant": dominant,
+        "colors": means[:top],
+        "luminance": round(float(_luminance(pixels).mean()), 4),
+    }
+
+
+def gradient_layer(flow: Optional[Dict[str, Any]], size: Tuple[int, int]) -> Optional[Any]:
+    """A blurred page backdrop (Pillow RGB image of ``size``) from the first screenshot's hash."""
+    hashes = flow_blurhashes(flow)
+    if not hashes:
+        return None
+    from PIL import Image  # type: ignore
+
+    w, h = size
+    # Decode small at the canvas aspect ratio; bicubic upscaling keeps it smooth
+    small = decode_batch(hashes[:1], 32, max(1, round(32 * h / w)))[0]
+    if not small.any():
+        return None
+    return Image.fromarray(small, "RGB").resize((w, h), Image.BICUBIC)
@@ -1,11 +1,16 @@
 # Bullet layout and drawing helpers
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from PIL import ImageDraw, ImageFont  # type: ignore
 
-from .canvas import CANVAS
-from .text import measure, wrap_text, try_load_font
+from .canvas import CANVAS, CanvasSpec
+from .text import largest_fitting, measure, size_steps, wrap_text, try_load_font
+
+
+def _block_height(d: ImageDraw.ImageDraw, font: ImageFont.FreeTypeFont, lines: List[str], spec: CanvasSpec) -> int:
+    _, lh = measure(d, "Ag", font)
+    return max(lh, spec.line_min_height) * len(lines) + spec.bullet_block_pad
 
 
 def layout_bullets(
@@ -16,37 +21,35 @@ def layout_bullets(
     max_height: int,
     start_size: int = 40,
     min_size: int = 24,
+    spec: CanvasSpec = CANVAS,
 ) -> Tuple[ImageFont.FreeTypeFont, List[List[str]]]:
-    size = start_size
-    body_font = try_load_font(font_name, size)
-    wrapped: List[List[str]] = []
+    layouts: Dict[int, List[List[str]]] = {}
 
-    while size >= min_size:
+    def fits(size: int) -> bool:
         body_font = try_load_font(font_name, size)
-        wrapped = []
-        total_h = 0
-        for e in bullets:
-            lines = wrap_text(d, e, body_font, max_width=max_width - 36)
-            wrapped.append(lines)
-            _, lh = measure(d, "Ag", body_font)
-            total_h += max(lh, 28) * len(lines) + 12
-        if total_h <= max_height:
-            break
-        size -= 2
+        wrapped = [wrap_text(d, e, body_font, max_width=max_width - spec.bullet_text_inset) for e in bullets]
+        layouts[size] = wrapped
+        return sum(_block_height(d, body_font, lines, spec) for lines in wrapped) <= max_height
 
-    if size < min_size:
-        new_wrapped: List[List[str]] = []
-        total_h = 0
-        for lines in wrapped:
-            _, lh = measure(d, "Ag", body_font)
-            block_h = max(lh, 28) * len(lines) + 12
-            if total_h + block_h > max_height:
-                break
-            new_wrapped.append(lines)
-            total_h += block_h
-        wrapped = new_wrapped
+    size = largest_fitting(size_steps(start_size, min_size), fits)
+    if size is not None:
+        return try_load_font(font_name, size), layouts[size]
 
-    return body_font, wrapped
+    # Nothing fits: use the smallest size and drop trailing bullets that overflow
+    if min_size > start_size:
+        return try_load_font(font_name, start_size), []
+    size = size_steps(start_size, min_size)[-1]
+    body_font = try_load_font(font_name, size)
+    wrapped = layouts.get(size) or [wrap_text(d, e, body_font, max_width=max_width - spec.bullet_text_inset) for e in bullets]
+    new_wrapped: List[List[str]] = []
+    total_h = 0
+    for lines in wrapped:
+        block_h = _block_height(d, body_font, lines, spec)
+        if total_h + block_h > max_height:
+            break
+        new_wrapped.append(lines)
+        total_h += block_h
+    return body_font, new_wrapped
 
 
 def draw_bullets(
@@ -56,16 +59,17 @@ def draw_bullets(
     font: ImageFont.FreeTypeFont,
     fg: Tuple[int, int, int],
     content_x: int,
+    spec: CanvasSpec = CANVAS,
 ) -> int:
     y = start_y
-    radius = 6
+    radius = spec.bullet_radius
     for lines in wrapped:
         _, lh = measure(d, "Ag", font)
         cy = y + lh // 2
         d.ellipse((content_x, cy - radius, content_x + radius * 2, cy + radius), fill=fg)
-        tx = content_x + CANVAS.bullet_indent
+        tx = content_x + spec.bullet_indent
         for line in lines:
             d.text((tx, y), line, fill=fg, font=font)
             y += lh
-        y += CANVAS.bullet_gap
+        y += spec.bullet_gap
     return y
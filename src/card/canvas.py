@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Dict
 
 
 @dataclass(frozen=True)
@@ -13,6 +14,39 @@ class CanvasSpec:
     pad_between: int = 20
     bullet_gap: int = 14
     bullet_indent: int = 24
+    bullet_radius: int = 6
+    bullet_text_inset: int = 36
+    bullet_block_pad: int = 12
+    line_min_height: int = 28
+    title_max_size: int = 80
+    title_min_size: int = 40
+    body_max_size: int = 40
+    body_min_size: int = 24
+    name: str = "og"
 
 
 CANVAS = CanvasSpec()
+
+# Per-platform variants rendered by compose_variants()
+SQUARE = CanvasSpec(width=1080, height=1080, name="square")
+PORTRAIT = CanvasSpec(width=1080, height=1350, name="portrait")
+THUMBNAIL = CanvasSpec(
+    width=600,
+    height=315,
+    pad_x=36,
+    pad_top=36,
+    pad_between=10,
+    bullet_gap=7,
+    bullet_indent=12,
+    bullet_radius=3,
+    bullet_text_inset=18,
+    bullet_block_pad=6,
+    line_min_height=14,
+    title_max_size=40,
+    title_min_size=20,
+    body_max_size=20,
+    body_min_size=12,
+    name="thumb",
+)
+
+VARIANTS: Dict[str, CanvasSpec] = {c.name: c for c in (CANVAS, SQUARE, PORTRAIT, THUMBNAIL)}
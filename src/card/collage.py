@@ -0,0 +1,337 @@
+# Screenshot collage: hotspot steps' screenshots, decoded at reduced resolution and
+# cached as thumbnails, laid out in a grid with the hotspots marked
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from PIL import Image, ImageDraw  # type: ignore
+
+from .canvas import CanvasSpec
+from .color import mix
+
+__all__ = [
+    "Shot",
+    "pick_shots",
+    "find_screenshot",
+    "local_shots",
+    "load_thumbnail",
+    "grid_cells",
+    "collage_area",
+    "draw_collage",
+    "prewarm_thumbnails",
+    "prune_thumbnails",
+    "clear_thumbnail_cache",
+]
+
+THUMB_DIR = os.getenv("ARCADE_THUMB_DIR", ".cache/thumbs")
+# Disk thumbnails beyond this are evicted least recently used first (0: unbounded)
+THUMB_MAX_MB = float(os.getenv("ARCADE_THUMB_MAX_MB") or 64.0)
+# New disk thumbnails written between two size checks of the directory
+_PRUNE_EVERY = 16
+MIN_SHOTS, MAX_SHOTS = 2, 4
+# Title sizes above a collage, relative to the canvas spec's
+TITLE_SCALE = 0.6
+_MEMORY_THUMBS = 64
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class Shot:
+    url: str
+    # Hotspot centres as fractions of the screenshot (the flow's x/y)
+    markers: Tuple[Tuple[float, float], ...]
+
+
+def _hotspot_shots(flow: Optional[Dict[str, Any]]) -> List[Shot]:
+    if not isinstance(flow, dict):
+        return []
+    shots: List[Shot] = []
+    for step in flow.get("steps", []) or []:
+        url = step.get("url") or step.get("originalImageUrl")
+        if step.get("type") != "IMAGE" or not isinstance(url, str):
+            continue
+        markers = tuple(
+            (float(h["x"]), float(h["y"]))
+            for h in step.get("hotspots", []) or []
+            if isinstance(h.get("x"), (int, float)) and isinstance(h.get("y"), (int, float))
+        )
+        if markers:
+            shots.append(Shot(url, markers))
+    return shots
+
+
+def _spread(items: List[Any], n: int) -> List[Any]:
+    """``n`` items evenly spaced from first to last (all of them if there are fewer)."""
+    if len(items) <= n:
+        return items
+    return [items[round(i * (len(items) - 1) / (n - 1))] for i in range(n)]
+
+
+def pick_shots(flow: Optional[Dict[str, Any]], count: int = MAX_SHOTS) -> List[Shot]:
+    """Up to ``count`` (2–4) IMAGE steps with hotspots, spread evenly from first to last."""
+    return _spread(_hotspot_shots(flow), max(MIN_SHOTS, min(MAX_SHOTS, count)))
+
+
+def find_screenshot(url: str, directory: Optional[Any] = None) -> Optional[Path]:
+    """A local copy of ``url``; never downloads.
+
+    Looks in ``directory`` (mirror layout ``<host>/<path>``, or flat by file
+    name), then in the asset cache (see ``src.assets``).
+    """
+    if directory is not None:
+        from src.assets import mirror_path
+
+        try:
+            candidates = [mirror_path(url, directory)]
+        except ValueError:
+            candidates = []
+        name = Path(urlsplit(url).path).name
+        if name not in ("", ".", ".."):
+            candidates.append(Path(directory) / name)
+        for path in candidates:
+            if path.is_file():
+                return path
+    from src.assets import get_asset_store
+
+    asset = get_asset_store().lookup(url)
+    return asset.path if asset is not None else None
+
+
+def local_shots(
+    flow: Optional[Dict[str, Any]], directory: Optional[Any] = None, count: int = MAX_SHOTS
+) -> List[Tuple[Shot, Path]]:
+    """Like ``pick_shots``, but only among steps whose screenshot is available locally."""
+    found = [(s, p) for s in _hotspot_shots(flow) for p in [find_screenshot(s.url, directory)] if p is not None]
+    return _spread(found, max(MIN_SHOTS, min(MAX_SHOTS, count)))
+
+
+# ---- Thumbnails ---------------------------------------------------------------
+
+_memory: "OrderedDict[str, Any]" = OrderedDict()
+_memory_lock = threading.Lock()
+_writes_since_prune = 0
+
+
+def clear_thumbnail_cache() -> None:
+    with _memory_lock:
+        _memory.clear()
+
+
+def prune_thumbnails(cache_dir: Optional[str] = THUMB_DIR, max_mb: float = THUMB_MAX_MB) -> int:
+    """Delete least recently used disk thumbnails until ``cache_dir`` is within ``max_mb``; returns how many."""
+    if not cache_dir or max_mb <= 0 or not os.path.isdir(cache_dir):
+        return 0
+    files = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".png") and entry.is_file():
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    limit = max_mb * 1024 * 1024
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # another renderer evicted it first
+        total -= size
+        removed += 1
+    return removed
+
+
+def _decode_reduced(path: Path, size: Tuple[int, int]) -> Any:
+    """Decode ``path`` to ``size`` without a full-resolution resample.
+
+    ``draft`` lets JPEG decode straight at 1/2..1/8 scale; otherwise ``reduce``
+    box-averages by the largest integer factor that stays above ``size`` and
+    only the small remainder goes through a filtered resize.
+    """
+    with Image.open(path) as im:
+        im.draft("RGB", size)
+        factor = min(im.width // size[0], im.height // size[1])
+        # Reduce before converting so the mode conversion only touches the small image
+        small = im.reduce(factor) if factor >= 2 else im
+        small = small.convert("RGB") if small.mode != "RGB" else small
+        return small.resize(size, Image.BICUBIC) if small.size != size else small.copy()
+
+
+def load_thumbnail(
+    path: Path, size: Tuple[int, int], cache_dir: Optional[str] = THUMB_DIR, base: Optional[Any] = None
+) -> Any:
+    """``path`` scaled to ``size``, from memory, the thumbnail directory or a reduced decode.
+
+    Thumbnails are keyed by the source file's identity (path, size, mtime) and
+    the target size, so re-rendering a card never decodes a screenshot twice.
+    On a miss, ``base`` (a larger thumbnail of the same file) is scaled instead
+    of decoding the file again.
+    """
+    st = path.stat()
+    key = hashlib.sha1(f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{size[0]}x{size[1]}".encode()).hexdigest()
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    global _writes_since_prune
+    disk = Path(cache_dir) / f"{key}.png" if cache_dir else None
+    if disk is not None and disk.is_file():
+        with Image.open(disk) as cached:
+            thumb = cached.convert("RGB")
+        try:
+            os.utime(disk)  # mtime is the LRU clock for prune_thumbnails
+        except FileNotFoundError:
+            pass
+    else:
+        thumb = base.resize(size, Image.BICUBIC) if base is not None else _decode_reduced(path, size)
+        if disk is not None:
+            disk.parent.mkdir(parents=True, exist_ok=True)
+            tmp = disk.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+            thumb.save(tmp, format="PNG", compress_level=1)
+            os.replace(tmp, disk)
+            with _memory_lock:
+                _writes_since_prune += 1
+                due = _writes_since_prune >= _PRUNE_EVERY
+                if due:
+                    _writes_since_prune = 0
+            if due:
+                prune_thumbnails(cache_dir)
+    with _memory_lock:
+        _memory[key] = thumb
+        while len(_memory) > _MEMORY_THUMBS:
+            _memory.popitem(last=False)
+    return thumb
+
+
+# ---- Layout -------------------------------------------------------------------
+
+def grid_cells(n: int, area: Box, aspect: float, gap: int) -> List[Box]:
+    """``n`` boxes of ``aspect`` (w/h) in ``area``, in the rows x cols grid that makes them largest.
+
+    Rows start at the top of ``area`` and are centred horizontally.
+    """
+    x0, y0, x1, y1 = area
+    aw, ah = x1 - x0, y1 - y0
+    best: Tuple[int, int, int] = (0, 1, n)
+    for rows in range(1, n + 1):
+        cols = -(-n // rows)
+        w = min((aw - gap * (cols - 1)) / cols, (ah - gap * (rows - 1)) / rows * aspect)
+        if w > best[0]:
+            best = (int(w), rows, cols)
+    w, rows, cols = best
+    h = int(w / aspect)
+    cells: List[Box] = []
+    top = y0
+    for r in range(rows):
+        in_row = min(cols, n - r * cols)
+        left = x0 + (aw - in_row * w - gap * (in_row - 1)) // 2
+        for c in range(in_row):
+            x, y = left + c * (w + gap), top + r * (h + gap)
+            cells.append((x, y, x + w, y + h))
+    return cells
+
+
+def _draw_marker(d: ImageDraw.ImageDraw, x: float, y: float, r: int, color: Tuple[int, int, int]) -> None:
+    # Hotspot "pulse": a halo ring around a solid dot with a white rim
+    halo = r * 2
+    d.ellipse((x - halo, y - halo, x + halo, y + halo), outline=color, width=max(2, r // 3))
+    d.ellipse((x - r, y - r, x + r, y + r), fill=color, outline=(255, 255, 255), width=max(2, r // 3))
+
+
+def collage_area(spec: CanvasSpec) -> Box:
+    """Where the screenshots go: below a band for two title lines, whatever the title.
+
+    A fixed area gives fixed thumbnail sizes per canvas, so they can be
+    prepared (``prewarm_thumbnails``) before the title is known.
+    """
+    band = int(2 * spec.title_max_size * TITLE_SCALE * 1.25) + spec.pad_between
+    return (spec.pad_x, spec.pad_top + band, spec.width - spec.pad_x, spec.height - spec.pad_top // 2)
+
+
+def _fit(cell: Box, aspect: float) -> Box:
+    """The largest box of ``aspect`` centred in ``cell`` (the cell itself when the shapes match)."""
+    x0, y0, x1, y1 = cell
+    w, h = x1 - x0, y1 - y0
+    fw, fh = min(w, max(1, round(h * aspect))), min(h, max(1, round(w / aspect)))
+    if w - fw <= 1 and h - fh <= 1:
+        return cell
+    x, y = x0 + (w - fw) // 2, y0 + (h - fh) // 2
+    return (x, y, x + fw, y + fh)
+
+
+def _layout(found: List[Tuple[Shot, Path]], spec: CanvasSpec) -> List[Box]:
+    """One box per screenshot, in grid cells shaped like the first screenshot.
+
+    A screenshot of another shape is letterboxed into its cell, not stretched.
+    """
+    shapes = []
+    for _shot, path in found:
+        with Image.open(path) as im:
+            shapes.append(im.width / im.height)
+    cells = grid_cells(len(found), collage_area(spec), shapes[0], spec.pad_between)
+    return [_fit(cell, aspect) for cell, aspect in zip(cells, shapes)]
+
+
+def _thumbnails(paths: List[Path], sizes: List[Tuple[int, int]]) -> List[Any]:
+    if len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+            return list(pool.map(load_thumbnail, paths, sizes))
+    return [load_thumbnail(p, s) for p, s in zip(paths, sizes)]
+
+
+def draw_collage(
+    img: Any,
+    found: List[Tuple[Shot, Path]],
+    spec: CanvasSpec,
+    primary: Tuple[int, int, int],
+    bg: Tuple[int, int, int],
+) -> None:
+    """Paste the screenshots (see ``local_shots``) into ``collage_area`` and mark their hotspots."""
+    if not found:
+        return
+    cells = _layout(found, spec)
+    sizes = [(c[2] - c[0], c[3] - c[1]) for c in cells]
+    thumbs = _thumbnails([p for _, p in found], sizes)
+    d = ImageDraw.Draw(img)
+    frame = mix(bg, (128, 128, 128), 0.5)
+    r = max(5, sizes[0][0] // 48)
+    for (shot, _path), thumb, (x0, y0, x1, y1) in zip(found, thumbs, cells):
+        img.paste(thumb, (x0, y0))
+        d.rectangle((x0 - 1, y0 - 1, x1, y1), outline=frame, width=1)
+        for fx, fy in shot.markers:
+            _draw_marker(d, x0 + fx * (x1 - x0), y0 + fy * (y1 - y0), r, primary)
+
+
+def prewarm_thumbnails(flow: Optional[Dict[str, Any]], specs: List[CanvasSpec], directory: Optional[Any] = None) -> int:
+    """Prepare the collage thumbnails for ``specs`` ahead of rendering; returns how many.
+
+    Each screenshot is decoded once, at its largest size; the other canvases'
+    thumbnails are scaled from that one.
+    """
+    found = local_shots(flow, directory)
+    if len(found) < MIN_SHOTS:
+        return 0
+    sizes: Dict[Path, List[Tuple[int, int]]] = {path: [] for _, path in found}
+    for spec in specs:
+        for (_shot, path), c in zip(found, _layout(found, spec)):
+            sizes[path].append((c[2] - c[0], c[3] - c[1]))
+
+    def one(path: Path) -> int:
+        wanted = sorted(set(sizes[path]), key=lambda wh: wh[0] * wh[1], reverse=True)
+        largest = load_thumbnail(path, wanted[0])
+        for size in wanted[1:]:
+            load_thumbnail(path, size, base=largest)
+        return len(wanted)
+
+    with ThreadPoolExecutor(max_workers=len(sizes)) as pool:
+        return sum(pool.map(one, sizes))
@@ -0,0 +1,190 @@
+# Output encoding for cards: optimized PNG, WebP, JPEG and "fit under N KB"
+# (Pillow is only needed once something is encoded; option parsing stays cheap)
+from __future__ import annotations
+
+import io
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image  # type: ignore
+
+__all__ = ["FORMATS", "EncodeOptions", "EncodeResult", "encode", "extension_for"]
+
+# "png" is lossless (exact palette when the card has <= 256 colors), "png8" is
+# quantized to 256 colors, "auto" picks the best candidate under ``max_kb``.
+FORMATS = ("png", "png8", "webp", "jpeg", "auto")
+_EXT = {"png": "png", "png8": "png", "webp": "webp", "jpeg": "jpg"}
+_QUALITY_RANGE = (40, 95)
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    format: str = "png"
+    quality: int = 85
+    max_kb: Optional[float] = None
+    # zlib level 6: ~4x faster than 9 on cards for a few percent more bytes
+    compress_level: int = 6
+    lossless: bool = False  # webp only
+
+
+@dataclass
+class EncodeResult:
+    data: bytes
+    format: str
+    quality: Optional[int]
+    seconds: float
+    path: Optional[str] = None
+
+    @property
+    def bytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        return _EXT[self.format]
+
+    def describe(self) -> str:
+        q = f" q{self.quality}" if self.quality is not None else ""
+        return f"{self.format}{q} {self.bytes / 1024:.1f} KB in {self.seconds * 1000:.1f} ms"
+
+
+def extension_for(opts: EncodeOptions) -> Optional[str]:
+    """File extension for ``opts``; None when the format is chosen at encode time."""
+    return None if opts.format == "auto" else _EXT[opts.format]
+
+
+def _exact_palette(img: Image.Image, used: List[Tuple[int, Tuple[int, int, int]]]) -> Image.Image:
+    """``img`` as a "P" image over exactly the colors ``getcolors`` found.
+
+    Each pixel's packed RGB is looked up in the sorted palette, so no
+    quantizer runs and the result needs no round-trip check. Without numpy,
+    falls back to median cut (which keeps every color when there are <= 256).
+    """
+    from PIL import Image  # type: ignore
+
+    try:
+        import numpy as np
+    except ImportError:
+        return img.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    palette = sorted(rgb for _count, rgb in used)
+    keys = np.array([(r << 16) | (g << 8) | b for r, g, b in palette], dtype=np.uint32)
+    rgb = np.asarray(img, dtype=np.uint32)
+    index = np.searchsorted(keys, (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]).astype(np.uint8)
+    out = Image.fromarray(index, "P")
+    out.putpalette([v for color in palette for v in color])
+    return out
+
+
+def _png(img: Image.Image, compress_level: int, colors: Optional[int] = None) -> bytes:
+    """PNG; exact palette when the card has <= 256 colors, else ``colors``-color
+    quantization if requested, else truecolor."""
+    from PIL import Image  # type: ignore
+
+    out = img
+    if img.mode == "RGB":
+        used = img.getcolors(256)
+        if used is not None:
+            # Flat cards usually fit a palette exactly: lossless and ~2x smaller
+            out = _exact_palette(img, used)
+        if colors is not None and (used is None or len(used) > colors):
+            out = img.quantize(colors=colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    buf = io.BytesIO()
+    out.save(buf, "PNG", compress_level=compress_level)
+    return buf.getvalue()
+
+
+def _webp(img: Image.Image, quality: int, lossless: bool) -> bytes:
+    buf = io.BytesIO()
+    # method 4: within ~1% of method 6 on cards at a fraction of the time
+    img.save(buf, "WEBP", quality=quality, lossless=lossless, method=4)
+    return buf.getvalue()
+
+
+def _jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    # 4:4:4 chroma keeps coloured text edges crisp
+    img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True, progressive=True, subsampling=0)
+    return buf.getvalue()
+
+
+def _encode_fixed(img: Image.Image, fmt: str, quality: int, opts: EncodeOptions) -> Tuple[bytes, Optional[int]]:
+    if fmt == "png":
+        return _png(img, opts.compress_level), None
+    if fmt == "png8":
+        return _png(img, opts.compress_level, colors=256), None
+    if fmt == "webp":
+        return _webp(img, quality, opts.lossless), (None if opts.lossless else quality)
+    if fmt == "jpeg":
+        return _jpeg(img, quality), quality
+    raise ValueError(f"unknown image format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+
+def _best_quality(encode_q: Callable[[int], bytes], limit: int) -> Optional[Tuple[bytes, int]]:
+    """Highest quality in the allowed range whose output is <= limit bytes."""
+    lo, hi = _QUALITY_RANGE
+    floor = encode_q(lo)
+    if len(floor) > limit:
+        return None  # unreachable budget: skip the search
+    best: Optional[Tuple[bytes, int]] = (floor, lo)
+    lo += 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = encode_q(mid)
+        if len(data) <= limit:
+            best, lo = (data, mid), mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+def _encode_auto(img: Image.Image, opts: EncodeOptions) -> Tuple[bytes, str, Optional[int]]:
+    """Highest-fidelity candidate that fits ``max_kb``: lossless PNG, lossless
+    WebP, palette PNG with fewer colors, then WebP and JPEG at the highest
+    quality that fits. If nothing fits, the smallest attempt is returned."""
+    limit = int((opts.max_kb or 0) * 1024)
+    tried: List[Tuple[bytes, str, Optional[int]]] = []
+
+    def fits(data: bytes, fmt: str, q: Optional[int]) -> bool:
+        tried.append((data, fmt, q))
+        return limit <= 0 or len(data) <= limit
+
+    if fits(_png(img, opts.compress_level), "png", None):
+        return tried[-1]
+    if fits(_webp(img, 100, lossless=True), "webp", None):
+        return tried[-1]
+    for colors in (256, 64, 16):
+        if fits(_png(img, opts.compress_level, colors=colors), "png8", None):
+            return tried[-1]
+    for fmt, fn in (("webp", lambda q: _webp(img, q, False)), ("jpeg", lambda q: _jpeg(img, q))):
+        found = _best_quality(fn, limit)
+        if found is not None:
+            return found[0], fmt, found[1]
+    return min(tried, key=lambda t: len(t[0]))
+
+
+def _fit_format(img: Image.Image, opts: EncodeOptions) -> Tuple[bytes, str, Optional[int]]:
+    """Fixed lossy format with ``max_kb``: search quality; lossless formats as-is."""
+    limit = int((opts.max_kb or 0) * 1024)
+    if opts.format == "webp" and not opts.lossless:
+        found = _best_quality(lambda q: _webp(img, q, False), limit)
+    elif opts.format == "jpeg":
+        found = _best_quality(lambda q: _jpeg(img, q), limit)
+    else:
+        found = None
+    if found is not None:
+        return found[0], opts.format, found[1]
+    data, q = _encode_fixed(img, opts.format, _QUALITY_RANGE[0] if opts.format in ("webp", "jpeg") else opts.quality, opts)
+    return data, opts.format, q
+
+
+def encode(img: Image.Image, opts: Optional[EncodeOptions] = None) -> EncodeResult:
+    opts = opts or EncodeOptions()
+    t0 = time.perf_counter()
+    if opts.format == "auto" or opts.max_kb:
+        data, fmt, q = _encode_auto(img, opts) if opts.format == "auto" else _fit_format(img, opts)
+    else:
+        fmt = opts.format
+        data, q = _encode_fixed(img, fmt, opts.quality, opts)
+    return EncodeResult(data=data, format=fmt, quality=q, seconds=time.perf_counter() - t0)
@@ -0,0 +1,161 @@
+# Font discovery and face caching for card rendering
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from PIL import ImageFont  # type: ignore
+
+__all__ = ["FontIndex", "get_font_index", "resolve_font", "load_face", "clear_font_caches"]
+
+INDEX_FILE = os.getenv("ARCADE_FONT_INDEX", ".cache/fonts.json")
+_FONT_EXTS = (".ttf", ".otf", ".ttc")
+_REGULAR_STYLES = ("regular", "book", "normal", "roman")
+
+
+def _font_dirs() -> List[Path]:
+    home = Path.home()
+    if sys.platform == "darwin":
+        dirs = [Path("/System/Library/Fonts"), Path("/Library/Fonts"), home / "Library/Fonts"]
+    elif sys.platform == "win32":
+        windir = os.environ.get("WINDIR", "C:\\Windows")
+        dirs = [Path(windir) / "Fonts", home / "AppData/Local/Microsoft/Windows/Fonts"]
+    else:
+        data_dirs = os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":")
+        dirs = [Path(d) / "fonts" for d in data_dirs if d]
+        dirs += [home / ".fonts", home / ".local/share/fonts"]
+    return [d for d in dirs if d.is_dir()]
+
+
+def _norm(name: str) -> str:
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+class FontIndex:
+    """Maps family names, ``Family-Style`` names and file names to font paths.
+
+    Built by scanning the system font directories once and persisted to
+    ``INDEX_FILE``; it is rebuilt only when a font directory's mtime changes.
+    """
+
+    def __init__(self, entries: Dict[str, str], signature: Dict[str, float]) -> None:
+        self.entries = entries
+        self.signature = signature
+
+    @staticmethod
+    def _signature(dirs: List[Path]) -> Dict[str, float]:
+        sig: Dict[str, float] = {}
+        for d in dirs:
+            for root, _subdirs, _files in os.walk(d):
+                sig[root] = os.stat(root).st_mtime
+        return sig
+
+    @classmethod
+    def scan(cls, dirs: Optional[List[Path]] = None) -> "FontIndex":
+        dirs = _font_dirs() if dirs is None else dirs
+        entries: Dict[str, str] = {}
+        regular: Set[str] = set()
+        for d in dirs:
+            for root, _subdirs, files in os.walk(d):
+                for fn in sorted(files):
+                    if not fn.lower().endswith(_FONT_EXTS):
+                        continue
+                    path = os.path.join(root, fn)
+                    entries.setdefault(fn.lower(), path)
+                    entries.setdefault(_norm(Path(fn).stem), path)
+                    try:
+                        family, style = ImageFont.truetype(path, 12).getname()
+                    except Exception:
+                        continue
+                    family, style = family or "", style or ""
+                    entries.setdefault(_norm(f"{family}{style}"), path)
+                    fam = _norm(family)
+                    # Bare family name resolves to the regular face when there is one
+                    if style.lower() in _REGULAR_STYLES and fam not in regular:
+                        entries[fam] = path
+                        regular.add(fam)
+                    else:
+                        entries.setdefault(fam, path)
+        return cls(entries, cls._signature(dirs))
+
+    @classmethod
+    def load_or_scan(cls, path: str = INDEX_FILE) -> "FontIndex":
+        dirs = _font_dirs()
+        try:
+            data = json.loads(Path(path).read_text())
+            if data.get("signature") == cls._signature(dirs):
+                return cls(data["entries"], data["signature"])
+        except Exception:
+            pass
+        index = cls.scan(dirs)
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            Path(tmp).write_text(json.dumps({"signature": index.signature, "entries": index.entries}))
+            os.replace(tmp, path)  # atomic: concurrent renderers never see a partial file
+        except OSError:
+            pass
+        return index
+
+    def lookup(self, name: str) -> Optional[str]:
+        base = os.path.basename(name)
+        return self.entries.get(base.lower()) or self.entries.get(_norm(Path(base).stem)) or self.entries.get(_norm(base))
+
+
+_index: Optional[FontIndex] = None
+_index_lock = threading.Lock()
+_failed: Set[str] = set()  # names/paths that could not be opened (negative cache)
+
+
+def get_font_index() -> FontIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FontIndex.load_or_scan()
+    return _index
+
+
+@lru_cache(maxsize=512)
+def resolve_font(name: str) -> Optional[str]:
+    """Resolve a family name (``Inter``), ``Family-Style`` name, file name or path
+    to a loadable font file, or None. Results, including misses, are cached."""
+    if os.path.isfile(name):
+        return name
+    path = get_font_index().lookup(name)
+    if path:
+        return path
+    # Last resort: let Pillow try its own search (relative paths, font dirs)
+    if name in _failed:
+        return None
+    try:
+        ImageFont.truetype(name, 12)
+        return name
+    except Exception:
+        _failed.add(name)
+        return None
+
+
+@lru_cache(maxsize=256)
+def load_face(path: str, size: int) -> Optional[ImageFont.FreeTypeFont]:
+    """Load (and keep) the face for ``path`` at ``size``; None if it can't be opened."""
+    if path in _failed:
+        return None
+    try:
+        return ImageFont.truetype(path, size)
+    except Exception:
+        _failed.add(path)
+        return None
+
+
+def clear_font_caches() -> None:
+    global _index
+    resolve_font.cache_clear()
+    load_face.cache_clear()
+    _failed.clear()
+    _index = None
@@ -6,7 +6,15 @@ from typing import Any, Dict, List, Optional, Tuple
 from .color import hex_to_rgb, is_neutral_rgb, contrast, mix, best_fg_for_bg
 
 
+def _flow_index(flow: Dict[str, Any]) -> Any:
+    # Flows read via src.flow_stream carry views precomputed in the parse pass
+    return getattr(flow, "index", None)
+
+
 def _collect_candidate_colors(flow: Dict[str, Any]) -> List[str]:
+    idx = _flow_index(flow)
+    if idx is not None:
+        return list(idx.candidate_colors)
     colors: List[str] = []
     for step in flow.get("steps", []) or []:
         for hs in step.get("hotspots", []) or []:
@@ -40,12 +48,29 @@ def _pick_primary(colors: List[str]) -> Optional[Tuple[int, int, int]]:
     return hex_to_rgb(best_hex)
 
 
-def _detect_theme(flow: Dict[str, Any]) -> str:
+def _chapter_theme(flow: Dict[str, Any]) -> Optional[str]:
+    idx = _flow_index(flow)
+    if idx is not None:
+        return idx.theme
     theme = None
     for step in flow.get("steps", []) or []:
         if step.get("type") == "CHAPTER" and isinstance(step.get("theme"), str):
             theme = step.get("theme").lower().strip()
-    return theme or "dark"
+    return theme
+
+
+def _detect_theme(flow: Dict[str, Any]) -> str:
+    return _chapter_theme(flow) or "dark"
+
+
+def _page_palette(flow: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Screenshot colours from the IMAGE steps' blurhashes; numpy is optional
+    try:
+        from .blurhash import blurhash_palette
+
+        return blurhash_palette(flow)
+    except ImportError:
+        return None
 
 
 def _preferred_font(flow: Dict[str, Any]) -> Optional[str]:
@@ -56,16 +81,22 @@ def _preferred_font(flow: Dict[str, Any]) -> Optional[str]:
 
 
 def _preferred_align(flow: Dict[str, Any]) -> str:
-    align = None
-    for step in flow.get("steps", []) or []:
+    idx = _flow_index(flow)
+    align = idx.align if idx is not None else None
+    for step in (flow.get("steps", []) or []) if idx is None else []:
         if step.get("type") == "CHAPTER" and isinstance(step.get("textAlign"), str):
             align = step.get("textAlign").lower().strip()
     return align if align in ("left", "center", "right") else "center"
 
 
-def derive_style_from_flow(flow: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+def derive_style_from_flow(flow: Optional[Dict[str, Any]], blurhash: bool = False) -> Dict[str, Any]:
     """Infer style spec from flow.json without hardcoding brands.
 
+    Hotspot/button colours come first; with ``blurhash`` (the card's
+    blurhash background) the screenshots' blurhashes fill the gaps: their
+    dominant colour when the flow's own colours are all neutral (or absent),
+    and their luminance when no chapter sets a theme.
+
     Returns a dict with keys: primary, bg, fg, font, align
     """
     default_bg = (24, 24, 36)
@@ -75,8 +106,18 @@ def derive_style_from_flow(flow: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     if not isinstance(flow, dict):
         return {"primary": default_primary, "bg": default_bg, "fg": default_fg, "font": None, "align": "center"}
 
-    theme = _detect_theme(flow)
-    primary = _pick_primary(_collect_candidate_colors(flow)) or default_primary
+    theme = _chapter_theme(flow)
+    primary = _pick_primary(_collect_candidate_colors(flow))
+    page = None
+    if blurhash and (theme is None or primary is None or is_neutral_rgb(primary)):
+        page = _page_palette(flow)
+    if page is not None:
+        if page["dominant"] is not None and (primary is None or is_neutral_rgb(primary)):
+            primary = page["dominant"]
+        if theme is None:
+            theme = "light" if page["luminance"] > 0.5 else "dark"
+    theme = theme or "dark"
+    primary = primary or default_primary
 
     white, black = (255, 255, 255), (0, 0, 0)
     cw = contrast(primary, white)
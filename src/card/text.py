@@ -1,35 +1,134 @@
 # Text and font helpers for card rendering
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
 from PIL import ImageDraw, ImageFont  # type: ignore
 
+from .fonts import load_face, resolve_font
+
+
+# ---- Measurement cache ------------------------------------------------------
+#
+# Faces are shared (see try_load_font), so measurements are memoized per face:
+# exact ink widths per string (what textbbox returns, reused between fitting and
+# drawing) and advance widths per word for the greedy wrapper. Advance sums are
+# only an estimate of the ink width (bearings, kerning), so a line is measured
+# exactly whenever the estimate is within ``_slack`` of the limit; decisions,
+# and therefore the rendered pixels, match the exact textbbox-based wrapper.
+
+_MAX_MEMO = 8192
+
+
+class _FontMetrics:
+    __slots__ = ("widths", "advances", "slack")
+
+    def __init__(self, font: ImageFont.FreeTypeFont) -> None:
+        self.widths: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.advances: Dict[str, float] = {}
+        # Max plausible |ink width − advance sum|: both side bearings + kerning
+        self.slack = int(getattr(font, "size", 16)) // 2 + 2
+
+
+_metrics: "WeakKeyDictionary[Any, _FontMetrics]" = WeakKeyDictionary()
+
+
+def _font_metrics(font: ImageFont.FreeTypeFont) -> _FontMetrics:
+    m = _metrics.get(font)
+    if m is None:
+        m = _metrics[font] = _FontMetrics(font)
+    return m
+
+
+def clear_measure_cache() -> None:
+    _metrics.clear()
+
 
 def measure(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
-    bbox = draw.textbbox((0, 0), text, font=font)
-    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+    m = _font_metrics(font)
+    key = (draw.fontmode, text)
+    hit = m.widths.get(key)
+    if hit is None:
+        if len(m.widths) >= _MAX_MEMO:
+            m.widths.clear()
+        bbox = draw.textbbox((0, 0), text, font=font)
+        hit = m.widths[key] = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+    return hit
 
 
-def wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
+def _advance(m: _FontMetrics, font: ImageFont.FreeTypeFont, word: str) -> float:
+    adv = m.advances.get(word)
+    if adv is None:
+        if len(m.advances) >= _MAX_MEMO:
+            m.advances.clear()
+        adv = m.advances[word] = font.getlength(word)
+    return adv
+
+
+def _fits(draw: ImageDraw.ImageDraw, font: ImageFont.FreeTypeFont, m: _FontMetrics, line: str, estimate: float, max_width: int) -> bool:
+    if estimate + m.slack <= max_width:
+        return True
+    if estimate - m.slack > max_width:
+        return False
+    return measure(draw, line, font)[0] <= max_width
+
+
+def _wrap(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> Tuple[List[str], List[float]]:
+    """Greedy wrap returning lines and their advance-width estimates."""
     words = text.split()
     if not words:
-        return [""]
+        return [""], [0.0]
+    m = _font_metrics(font)
+    space = _advance(m, font, " ")
     lines: List[str] = []
+    estimates: List[float] = []
     cur: List[str] = []
+    cur_adv = 0.0
     for w in words:
-        test = (" ".join(cur + [w])).strip()
-        tw, _ = measure(draw, test, font)
-        if tw <= max_width or not cur:
+        adv = _advance(m, font, w)
+        if not cur:
+            cur, cur_adv = [w], adv
+            continue
+        est = cur_adv + space + adv
+        if _fits(draw, font, m, " ".join(cur + [w]), est, max_width):
             cur.append(w)
+            cur_adv = est
         else:
             lines.append(" ".join(cur))
-            cur = [w]
-    if cur:
-        lines.append(" ".join(cur))
-    return lines
+            estimates.append(cur_adv)
+            cur, cur_adv = [w], adv
+    lines.append(" ".join(cur))
+    estimates.append(cur_adv)
+    return lines, estimates
 
 
-def try_load_font(name_or_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+def wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
+    return _wrap(draw, text, font, max_width)[0]
+
+
+def size_steps(start_size: int, min_size: int, step: int = 2) -> List[int]:
+    """Candidate sizes, largest first: start, start-step, ... >= min."""
+    return list(range(start_size, min_size - 1, -step))
+
+
+def largest_fitting(sizes: List[int], fits: Callable[[int], bool]) -> Optional[int]:
+    """Binary search for the first size (largest) in ``sizes`` that fits.
+
+    Fitting is monotonic in size (smaller glyphs never need more lines), so
+    this returns what the step-down-by-2 loop would, in O(log n) layouts.
+    """
+    lo, hi, found = 0, len(sizes) - 1, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(sizes[mid]):
+            found, hi = sizes[mid], mid - 1
+        else:
+            lo = mid + 1
+    return found
+
+
+def _font_candidates(name_or_path: Optional[str]) -> List[str]:
     candidates: List[str] = []
     if name_or_path:
         candidates.append(name_or_path)
@@ -45,11 +144,18 @@ def try_load_font(name_or_path: Optional[str], size: int) -> ImageFont.FreeTypeF
         "Helvetica.ttf",
         "DejaVuSans.ttf",
     ])
-    for fp in candidates:
-        try:
-            return ImageFont.truetype(fp, size)
-        except Exception:
-            continue
+    return candidates
+
+
+@lru_cache(maxsize=256)
+def try_load_font(name_or_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+    """Load the first available candidate face; faces are cached per (family, size)
+    and names resolve through the persisted system font index (see ``fonts``)."""
+    for name in _font_candidates(name_or_path):
+        path = resolve_font(name)
+        face = load_face(path, size) if path else None
+        if face is not None:
+            return face
     return ImageFont.load_default()
 
 
@@ -62,12 +168,19 @@ def fit_text(
     min_size: int,
     font_name: Optional[str],
 ) -> Tuple[ImageFont.FreeTypeFont, List[str]]:
-    size = start_size
-    while size >= min_size:
+    layouts: Dict[int, List[str]] = {}
+
+    def fits(size: int) -> bool:
         font = try_load_font(font_name, size)
-        lines = wrap_text(draw, text, font, max_width)
-        if len(lines) <= max_lines and all(measure(draw, ln, font)[0] <= max_width for ln in lines):
-            return font, lines
-        size -= 2
+        lines, estimates = _wrap(draw, text, font, max_width)
+        layouts[size] = lines
+        if len(lines) > max_lines:
+            return False
+        m = _font_metrics(font)
+        return all(_fits(draw, font, m, ln, est, max_width) for ln, est in zip(lines, estimates))
+
+    size = largest_fitting(size_steps(start_size, min_size), fits)
+    if size is not None:
+        return try_load_font(font_name, size), layouts[size]
     font = try_load_font(font_name, min_size)
     return font, wrap_text(draw, text, font, max_width)[:max_lines]
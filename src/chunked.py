@@ -0,0 +1,111 @@
+# Chunked (map-reduce) analysis: describe a few steps per LLM call, each call
+# cached by its own content, then write the report header from those lines
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.compact import compact_steps, estimate_tokens
+from src.prompts import SYSTEM_REDUCE, SYSTEM_STEPS, USER_REDUCE, USER_STEPS
+
+__all__ = ["DEFAULT_CHUNK_STEPS", "step_chunks", "analyze_chunked"]
+
+# Average steps per map call; chunks are cut at content-defined points, so they
+# vary between 1 and twice this
+DEFAULT_CHUNK_STEPS = 4
+# The reduce prompt only needs the step lines; past this, middle lines are elided
+DEFAULT_REDUCE_BUDGET = 6000
+
+Chat = Callable[..., Awaitable[str]]
+
+_NUMBERED = re.compile(r"^\s*(?:\d+\s*[.):]|[-*•])\s*")
+_TITLE = re.compile(r"TITLE:\s*(.+)", re.I)
+_SUMMARY = re.compile(r"SUMMARY:\s*(.+?)(?:\n\s*\n|\nTAGS:|\Z)", re.I | re.S)
+_TAGS = re.compile(r"TAGS:\s*(.+)", re.I)
+
+
+def _serialize(steps: List[Dict[str, Any]]) -> str:
+    return json.dumps(steps, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+
+def step_chunks(flow: Dict[str, Any], chunk_steps: int = DEFAULT_CHUNK_STEPS) -> List[List[Dict[str, Any]]]:
+    """Split the flow's steps into chunks whose boundaries depend only on content.
+
+    Each step is compacted on its own (no "same page as before" elision, which
+    would tie it to its neighbour) and a chunk ends after any step whose content
+    hash is 0 mod ``chunk_steps``. Inserting or editing a step therefore changes
+    only the chunk it lands in, and every other chunk keeps its cached answer;
+    fixed-size windows would shift every chunk after the edit.
+    """
+    n = max(1, chunk_steps)
+    steps = [s for s in flow.get("steps", []) or [] if s.get("type") != "VIDEO"]
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    for step in steps:
+        compacted = compact_steps([step], "short_urls")
+        if not compacted:
+            continue
+        current.append(compacted[0])
+        digest = int(hashlib.sha256(_serialize(compacted).encode("utf-8")).hexdigest()[:8], 16)
+        if digest % n == 0 or len(current) >= 2 * n:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _lines(raw: str) -> List[str]:
+    stripped = (_NUMBERED.sub("", line).strip() for line in (raw or "").splitlines())
+    return [line for line in stripped if line]
+
+
+def _fit(lines: List[str], budget: Optional[int]) -> List[str]:
+    """Numbered lines, eliding the middle until they fit ``budget`` tokens."""
+    numbered = [f"{i}. {line}" for i, line in enumerate(lines, 1)]
+    if budget is None or estimate_tokens("\n".join(numbered)) <= budget:
+        return numbered
+    head, tail = numbered[: (len(numbered) + 1) // 2], numbered[(len(numbered) + 1) // 2:]
+    while head and tail and estimate_tokens("\n".join(head + ["..."] + tail)) > budget:
+        if len(head) > len(tail):
+            head.pop()
+        else:
+            tail.pop(0)
+    return head + [f"... ({len(numbered) - len(head) - len(tail)} steps omitted)"] + tail
+
+
+def _header(raw: str, fallback_title: str) -> Tuple[str, str, str]:
+    t, s, g = _TITLE.search(raw or ""), _SUMMARY.search(raw or ""), _TAGS.search(raw or "")
+    summary = " ".join(line.strip() for line in s.group(1).splitlines() if line.strip()) if s else ""
+    return (t.group(1).strip() if t else fallback_title), summary, (g.group(1).strip() if g else "")
+
+
+async def analyze_chunked(
+    flow: Dict[str, Any],
+    chat: Chat,
+    chunk_steps: int = DEFAULT_CHUNK_STEPS,
+    reduce_budget: Optional[int] = DEFAULT_REDUCE_BUDGET,
+) -> str:
+    """Analyst report (TITLE/SUMMARY/STEPS/TAGS) built map-reduce style.
+
+    Map: one ``chat`` call per chunk (see ``step_chunks``), all concurrent, each
+    keyed by the chunk's own content, so after an edit only changed chunks
+    reach the API. Reduce: one call writes TITLE/SUMMARY/TAGS from the step
+    lines; STEPS is assembled from the map answers as they are, which keeps
+    the reduce output short however long the flow is. ``chat`` has the
+    signature of ``src.ai_async.achat_cached``.
+    """
+    import asyncio  # deferred: keeps `import src.analyzer_ai` (and --help) fast
+
+    chunks = step_chunks(flow, chunk_steps)
+    answers = await asyncio.gather(
+        *(chat(SYSTEM_STEPS, USER_STEPS.format(count=len(c), steps_json=_serialize(c)), kind="step") for c in chunks)
+    )
+    lines = [line for raw in answers for line in _lines(raw)]
+    name = flow.get("name") or "Arcade Flow"
+    reduce_prompt = USER_REDUCE.format(name=name, steps="\n".join(_fit(lines, reduce_budget)))
+    title, summary, tags = _header(await chat(SYSTEM_REDUCE, reduce_prompt, kind="reduce"), name)
+    steps = "\n".join(f"{i}. {line}" for i, line in enumerate(lines, 1))
+    return f"TITLE: {title}\nSUMMARY: {summary}\n\nSTEPS:\n{steps}\n\nTAGS: {tags}"
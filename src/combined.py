@@ -0,0 +1,128 @@
+# Combined analysis: report, card brief and palette from one JSON-schema response,
+# validated piece by piece; only missing or invalid pieces are asked for again
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from src.prompts import SYSTEM_COMBINED, USER_COMBINED_RETRY
+
+__all__ = ["PIECES", "CombinedAnswer", "response_format", "validate", "report_text", "analyze_combined"]
+
+_STRING = {"type": "string"}
+_STRINGS = {"type": "array", "items": _STRING}
+
+# Each piece replaces one of the separate analyst/brief/style calls
+PIECES: Dict[str, Dict[str, Any]] = {
+    "report": {"title": _STRING, "summary": _STRING, "steps": _STRINGS, "tags": _STRINGS},
+    "brief": {"overlay": _STRING, "elements": _STRINGS},
+    "style": {
+        "primary_color": _STRING,
+        "background_color": _STRING,
+        "text_color": _STRING,
+        "accent_color": _STRING,
+        "font_family": _STRING,
+    },
+}
+
+_HEX = re.compile(r"^#[0-9a-fA-F]{6}$")
+
+Chat = Callable[..., Awaitable[str]]
+
+
+@dataclass
+class CombinedAnswer:
+    values: Dict[str, Any] = field(default_factory=dict)
+    # piece -> why it is unusable, after all retries
+    errors: Dict[str, str] = field(default_factory=dict)
+    calls: int = 0
+
+    def piece(self, name: str) -> Optional[Dict[str, Any]]:
+        if name in self.errors:
+            return None
+        return {k: self.values[k] for k in PIECES[name]}
+
+
+def response_format(pieces: Sequence[str]) -> Dict[str, Any]:
+    """Strict JSON-schema ``response_format`` asking for exactly ``pieces``."""
+    props = {k: v for p in pieces for k, v in PIECES[p].items()}
+    schema = {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+    name = "flow_" + "_".join(pieces)
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _text(v: Any) -> bool:
+    return isinstance(v, str) and bool(v.strip())
+
+
+def _texts(v: Any) -> bool:
+    return isinstance(v, list) and bool(v) and all(_text(x) for x in v)
+
+
+def validate(obj: Dict[str, Any]) -> Dict[str, str]:
+    """Problems per piece (``{}`` when every piece is usable)."""
+    errors: Dict[str, str] = {}
+    if not (_text(obj.get("title")) and _text(obj.get("summary"))):
+        errors["report"] = "missing title/summary"
+    elif not _texts(obj.get("steps")) or not isinstance(obj.get("tags"), list):
+        errors["report"] = "missing steps/tags"
+    if not _text(obj.get("overlay")) or not _texts(obj.get("elements")):
+        errors["brief"] = "missing overlay/elements"
+    colors = [obj.get(k) for k in ("primary_color", "background_color", "text_color", "accent_color")]
+    if not all(isinstance(c, str) and _HEX.match(c.strip()) for c in colors):
+        errors["style"] = "colors are not #rrggbb"
+    elif not isinstance(obj.get("font_family"), str):
+        errors["style"] = "missing font_family"
+    return errors
+
+
+def report_text(report: Dict[str, Any]) -> str:
+    """The report piece in the analyst's TITLE/SUMMARY/STEPS/TAGS layout."""
+    steps = "\n".join(f"{i}. {s.strip()}" for i, s in enumerate(report["steps"], 1))
+    tags = ", ".join(t.strip() for t in report["tags"] if isinstance(t, str) and t.strip())
+    return f"TITLE: {report['title'].strip()}\nSUMMARY: {report['summary'].strip()}\n\nSTEPS:\n{steps}\n\nTAGS: {tags}"
+
+
+def _loads(raw: str) -> Dict[str, Any]:
+    try:
+        obj = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+async def analyze_combined(chat: Chat, prompt: str, cache_key: str, retries: int = 1) -> CombinedAnswer:
+    """One structured call for report, brief and style.
+
+    The answer is validated per piece; a piece that is missing or malformed
+    is asked for again (up to ``retries`` times) with a schema covering only
+    the failed pieces, so a bad palette never costs a second report. Pieces
+    still unusable afterwards are listed in ``errors``. ``chat`` has the
+    signature of ``src.ai_async.achat_cached``.
+    """
+    out = CombinedAnswer()
+    wanted: List[str] = list(PIECES)
+    for attempt in range(retries + 1):
+        user = prompt if attempt == 0 else prompt + USER_COMBINED_RETRY.format(
+            keys=", ".join(k for p in wanted for k in PIECES[p])
+        )
+        raw = await chat(
+            SYSTEM_COMBINED,
+            user,
+            kind="combined",
+            cache_key=f"{cache_key}|pieces={','.join(wanted)}|attempt={attempt}",
+            response_format=response_format(wanted),
+        )
+        out.calls += 1
+        obj = _loads(raw)
+        errors = validate(obj)
+        for piece in wanted:
+            if piece not in errors:
+                out.values.update({k: obj[k] for k in PIECES[piece]})
+        wanted = [p for p in wanted if p in errors]
+        out.errors = {p: errors[p] for p in wanted}
+        if not wanted:
+            break
+    return out
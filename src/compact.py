@@ -0,0 +1,141 @@
+# Flow compaction: shrink a raw Arcade flow to what the analyst prompt needs
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, urlunparse
+
+__all__ = ["CompactResult", "estimate_tokens", "compact_steps", "compact_flow"]
+
+# Degradation levels, tried in order until the budget fits. Each level also
+# applies every reduction of the levels before it (least important first).
+_LEVELS = (
+    "full",            # step order/type, labels, chapters + buttons, page url/title, click target
+    "no_click",        # drop clicked element text/type
+    "short_urls",      # strip query/fragment, omit url/title repeated from previous step
+    "truncate_80",     # truncate labels/titles/subtitles to 80 chars
+    "no_video",        # drop VIDEO steps (they carry no labels)
+    "truncate_40",     # truncate to 40 chars and drop page titles
+)
+
+
+@dataclass
+class CompactResult:
+    text: str
+    tokens: int
+    original_tokens: int
+    level: str
+    steps_dropped: int = 0
+    # Still above the token budget with every reduction applied and only the
+    # first and last steps left
+    over_budget: bool = False
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token for English + JSON punctuation)."""
+    return (len(text) + 3) // 4
+
+
+def _truncate(s: str, n: Optional[int]) -> str:
+    if n is None or len(s) <= n:
+        return s
+    return s[: n - 1].rstrip() + "…"
+
+
+def _short_url(u: str) -> str:
+    try:
+        p = urlparse(u)
+        return urlunparse((p.scheme, p.netloc, p.path, "", "", ""))
+    except Exception:
+        return u
+
+
+def _compact_step(step: Dict[str, Any], level: int, prev_page: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    stype = step.get("type")
+    if stype == "VIDEO" and level >= _LEVELS.index("no_video"):
+        return None
+    limit = 40 if level >= _LEVELS.index("truncate_40") else 80 if level >= _LEVELS.index("truncate_80") else None
+    out: Dict[str, Any] = {"type": stype}
+
+    if stype == "CHAPTER":
+        for k in ("title", "subtitle"):
+            v = step.get(k)
+            if isinstance(v, str) and v:
+                out[k] = _truncate(v, limit)
+        buttons = [p.get("buttonText") for p in step.get("paths", []) or [] if p.get("buttonText")]
+        if buttons:
+            out["buttons"] = buttons
+
+    labels = [hs.get("label") for hs in step.get("hotspots", []) or [] if isinstance(hs.get("label"), str)]
+    if labels:
+        out["hotspots"] = [_truncate(lb, limit) for lb in labels]
+
+    cc = step.get("clickContext") or {}
+    if level < _LEVELS.index("no_click") and (cc.get("text") or cc.get("elementType")):
+        out["clicked"] = {k: cc[k] for k in ("text", "elementType") if cc.get(k)}
+
+    pc = step.get("pageContext") or {}
+    url, title = pc.get("url"), pc.get("title")
+    dedupe = level >= _LEVELS.index("short_urls")
+    if isinstance(url, str) and url:
+        url = _short_url(url) if dedupe else url
+        if not (dedupe and url == prev_page.get("url")):
+            out["url"] = url
+        prev_page["url"] = url
+    if isinstance(title, str) and title and level < _LEVELS.index("truncate_40"):
+        if not (dedupe and title == prev_page.get("title")):
+            out["page"] = _truncate(title, limit)
+        prev_page["title"] = title
+    return out
+
+
+def compact_steps(steps: List[Dict[str, Any]], level: str = "full") -> List[Dict[str, Any]]:
+    """Compact each step at one degradation level (see ``_LEVELS``); dropped steps are omitted."""
+    prev: Dict[str, str] = {}
+    return [c for c in (_compact_step(s, _LEVELS.index(level), prev) for s in steps) if c is not None]
+
+
+def _serialize(name: Any, steps: List[Dict[str, Any]]) -> str:
+    return json.dumps({"name": name, "steps": steps}, separators=(",", ":"), ensure_ascii=False)
+
+
+def compact_flow(flow: Dict[str, Any], token_budget: Optional[int] = None) -> CompactResult:
+    """Keep only step order/type, hotspot labels, chapter titles/buttons and page
+    url/title, serialized without whitespace.
+
+    With ``token_budget`` the least important fields are dropped or truncated
+    level by level; if even the smallest level does not fit, steps are removed
+    from the middle of the flow (first and last steps carry intent and outcome).
+    If that still does not fit, the result says so with ``over_budget``.
+    """
+    original_tokens = estimate_tokens(json.dumps(flow, indent=2))
+    steps = flow.get("steps", []) or []
+    name = flow.get("name", "")
+
+    text, compacted, level = "", [], 0
+    for level in range(len(_LEVELS)):
+        kept = compact_steps(steps, _LEVELS[level])
+        compacted = [{"n": i, **c} for i, c in enumerate(kept, 1)]
+        text = _serialize(name, compacted)
+        if token_budget is None or estimate_tokens(text) <= token_budget:
+            return CompactResult(text, estimate_tokens(text), original_tokens, _LEVELS[level])
+
+    # Still over budget: drop steps from the middle until it fits
+    head, tail = compacted[: (len(compacted) + 1) // 2], compacted[(len(compacted) + 1) // 2:]
+    dropped = 0
+    while head and tail and estimate_tokens(text) > token_budget:
+        if len(head) > len(tail):
+            head.pop()
+        else:
+            tail.pop(0)
+        dropped += 1
+        text = _serialize(name, head + [{"omitted_steps": dropped}] + tail)
+    tokens = estimate_tokens(text)
+    return CompactResult(
+        text, tokens, original_tokens, _LEVELS[level], steps_dropped=dropped, over_budget=tokens > token_budget
+    )
@@ -0,0 +1,207 @@
+# Streaming, single-pass flow reader: parse steps/capturedEvents incrementally
+# and fill every derived view the analyzer and card style need in the same pass.
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, TextIO
+
+__all__ = ["FlowIndex", "FlowDict", "flow_index", "stream_flow", "read_flow_indexed"]
+
+_CHUNK = 64 * 1024
+_NUMBER_CHARS = "0123456789.eE+-"
+_WS = " \t\n\r"
+_STREAMED_ARRAYS = ("steps", "capturedEvents")
+
+
+@dataclass
+class FlowIndex:
+    """Derived views over ``flow["steps"]``, built incrementally one step at a time.
+
+    Mirrors ``_collect_page_meta``/``_collect_seen_colors`` in the analyzer and
+    ``_collect_candidate_colors``/``_detect_theme``/``_preferred_align`` in
+    ``card.style`` so none of them has to walk the steps again.
+    """
+
+    urls: List[str] = field(default_factory=list)
+    titles: List[str] = field(default_factory=list)
+    candidate_colors: List[str] = field(default_factory=list)
+    seen_colors: List[str] = field(default_factory=list)
+    theme: Optional[str] = None
+    align: Optional[str] = None
+    step_count: int = 0
+    event_count: int = 0
+    _seen: Set[str] = field(default_factory=set, repr=False)
+
+    def _color(self, v: Any) -> None:
+        if isinstance(v, str):
+            self.candidate_colors.append(v)
+            if v not in self._seen:
+                self._seen.add(v)
+                self.seen_colors.append(v)
+
+    def add_step(self, step: Dict[str, Any]) -> None:
+        self.step_count += 1
+        pc = step.get("pageContext") or {}
+        u = pc.get("url"); t = pc.get("title")
+        if isinstance(u, str) and u:
+            self.urls.append(u)
+        if isinstance(t, str) and t:
+            self.titles.append(t)
+        for hs in step.get("hotspots", []) or []:
+            for k in ("bgColor", "textColor"):
+                self._color(hs.get(k))
+        for p in step.get("paths", []) or []:
+            for k in ("buttonColor", "buttonTextColor"):
+                self._color(p.get(k))
+        if step.get("type") == "CHAPTER":
+            if isinstance(step.get("theme"), str):
+                self.theme = step["theme"].lower().strip()
+            if isinstance(step.get("textAlign"), str):
+                self.align = step["textAlign"].lower().strip()
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        self.event_count += 1
+
+    @classmethod
+    def from_flow(cls, flow: Dict[str, Any]) -> "FlowIndex":
+        idx = cls()
+        for step in flow.get("steps", []) or []:
+            idx.add_step(step)
+        idx.event_count = len(flow.get("capturedEvents", []) or [])
+        return idx
+
+
+class FlowDict(dict):
+    """A flow dict that carries its precomputed ``FlowIndex`` as ``.index``.
+
+    Behaves exactly like the plain dict from ``json.loads`` (and serializes the
+    same), so existing code keeps working; index-aware helpers use the views.
+    """
+
+    index: FlowIndex
+
+
+def flow_index(flow: Dict[str, Any]) -> FlowIndex:
+    """Return the precomputed index of a streamed flow, or build one in one pass."""
+    idx = getattr(flow, "index", None)
+    return idx if idx is not None else FlowIndex.from_flow(flow)
+
+
+class _Reader:
+    """Minimal incremental JSON reader over a text stream.
+
+    Values are decoded with ``json.JSONDecoder.raw_decode`` from a rolling
+    buffer; consumed text is dropped, so memory holds one value at a time plus
+    a read-ahead chunk rather than the whole document.
+    """
+
+    def __init__(self, fp: TextIO, chunk: int = _CHUNK) -> None:
+        self.fp = fp
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # json.loads shares identical key strings within one document; decoding
+        # element by element loses that, so keys are interned across elements.
+        memo: Dict[str, str] = {}
+        self.decoder = json.JSONDecoder(
+            object_pairs_hook=lambda pairs: {memo.setdefault(k, k): v for k, v in pairs}
+        )
+
+    def _fill(self, at_least: int = 0) -> bool:
+        if self.eof:
+            return False
+        if self.pos > self.chunk:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        data = self.fp.read(max(self.chunk, at_least))
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of flow JSON")
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos} of flow JSON")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number cut by the buffer edge decodes as its prefix ("1." -> 1, "1.5e" -> 1.5):
+                # only accept it once something other than number characters follows
+                if self.eof or (
+                    end < len(self.buf)
+                    and (isinstance(obj, (str, dict, list)) or self.buf[end:].lstrip(_NUMBER_CHARS))
+                ):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow geometrically so a large value is re-scanned O(log n) times
+            self._fill(at_least=len(self.buf) - self.pos)
+
+
+def stream_flow(
+    fp: TextIO,
+    on_step: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Parse a flow from ``fp``, yielding ``steps`` and ``capturedEvents`` one
+    element at a time to the callbacks as they are decoded. Returns the flow."""
+    r = _Reader(fp)
+    flow: Dict[str, Any] = {}
+    callbacks = {"steps": on_step, "capturedEvents": on_event}
+    r.expect("{")
+    if r.peek() == "}":
+        return flow
+    while True:
+        key = r.value()
+        r.expect(":")
+        if key in _STREAMED_ARRAYS and r.peek() == "[":
+            r.pos += 1
+            items: List[Any] = []
+            cb = callbacks[key]
+            if r.peek() != "]":
+                while True:
+                    item = r.value()
+                    items.append(item)
+                    if cb is not None and isinstance(item, dict):
+                        cb(item)
+                    if r.peek() == ",":
+                        r.pos += 1
+                        continue
+                    break
+            r.expect("]")
+            flow[key] = items
+        else:
+            flow[key] = r.value()
+        if r.peek() == ",":
+            r.pos += 1
+            continue
+        r.expect("}")
+        return flow
+
+
+def read_flow_indexed(path: Path) -> FlowDict:
+    """Stream ``path`` into a ``FlowDict`` whose ``.index`` was filled in the same pass."""
+    idx = FlowIndex()
+    with open(path, "r", encoding="utf-8") as fp:
+        flow = FlowDict(stream_flow(fp, on_step=idx.add_step, on_event=idx.add_event))
+    flow.index = idx
+    return flow
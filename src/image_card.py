@@ -1,19 +1,31 @@
 # Thin wrapper around card helpers to render a share image
 from __future__ import annotations
 
-from typing import Any, Dict, Optional, List
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, List, Tuple, Union
 import json
+import os
 
-from PIL import Image, ImageDraw  # type: ignore
-
-from src.card.canvas import CANVAS
-from src.card.text import fit_text, measure
-from src.card.bullets import layout_bullets, draw_bullets
-from src.card.color import contrast, rel_luminance, is_neutral_rgb
+from src.card.canvas import CANVAS, VARIANTS, CanvasSpec
+from src.card.color import best_fg_for_bg, contrast, rel_luminance, is_neutral_rgb
 from src.card.style import derive_style_from_flow
 from src.card.types import Style
+from src.telemetry import get_telemetry
+
+if TYPE_CHECKING:
+    from src.card.encode import EncodeOptions, EncodeResult
+
+__all__ = ["BACKGROUNDS", "LAYOUTS", "compose", "compose_variants", "derive_style_from_flow", "resolve_style"]
 
-__all__ = ["compose", "derive_style_from_flow"]
+# "solid": the style's bg colour; "blurhash": the first screenshot's blurred
+# colours washed over it (needs numpy; falls back to solid without hashes)
+BACKGROUNDS = ("solid", "blurhash")
+# How much of the page shows through the card bg; low enough that the
+# style's fg keeps its contrast in practice (it is re-checked anyway)
+BACKDROP_OPACITY = 0.35
+# "text": title and bullets; "collage": title over 2-4 hotspot screenshots
+# (read locally, see card.collage; falls back to text with fewer than 2)
+LAYOUTS = ("text", "collage")
 
 
 def _as_brief_dict(brief: Any) -> Dict[str, Any]:
@@ -25,8 +37,10 @@ def _as_brief_dict(brief: Any) -> Dict[str, Any]:
     return brief
 
 
-def _style_from_dict(style: Optional[Dict[str, Any]], flow: Optional[Dict[str, Any]]) -> Style:
-    st = style or derive_style_from_flow(flow)
+def _style_from_dict(
+    style: Optional[Dict[str, Any]], flow: Optional[Dict[str, Any]], blurhash: bool = False
+) -> Style:
+    st = style or derive_style_from_flow(flow, blurhash=blurhash)
     return Style(
         primary=tuple(st.get("primary", (33, 66, 231))),
         bg=tuple(st.get("bg", (24, 24, 36))),
@@ -36,12 +50,8 @@ def _style_from_dict(style: Optional[Dict[str, Any]], flow: Optional[Dict[str, A
     )
 
 
-def compose(brief: Any, path: Any, flow: Optional[Dict[str, Any]] = None, style: Optional[Dict[str, Any]] = None) -> None:
-    # Normalize input and resolve style
-    b = _as_brief_dict(brief)
-    st = _style_from_dict(style, flow)
-
-    W, H = CANVAS.width, CANVAS.height
+def _resolve_colors(st: Style) -> Style:
+    """Final bg/fg for the card (shared by every canvas variant)."""
     bg, fg, primary = st.bg, st.fg, st.primary
 
     # Promote strong primary as bg when contrast allows
@@ -56,19 +66,91 @@ def compose(brief: Any, path: Any, flow: Optional[Dict[str, Any]] = None, style:
     # Ensure readable contrast on dark backgrounds
     if rel_luminance(bg) < 0.2:
         fg = (255, 255, 255)
+    return Style(primary=primary, bg=bg, fg=fg, font=st.font, align=st.align)
+
+
+def _bullets(b: Dict[str, Any]) -> List[str]:
+    bullets = [str(e).strip() for e in (b.get("elements") or []) if str(e).strip()][:5]
+    return bullets or ["Step 1", "Step 2", "Step 3"]
+
+
+def _backdrop(flow: Optional[Dict[str, Any]], st: Style, spec: CanvasSpec) -> Tuple[Any, Tuple[int, int, int]]:
+    """Blurhash backdrop washed over ``st.bg`` and a fg readable on it; (None, fg) without one."""
+    try:
+        from src.card.blurhash import gradient_layer
+
+        layer = gradient_layer(flow, (spec.width, spec.height))
+    except ImportError:
+        layer = None
+    if layer is None:
+        return None, st.fg
+    from PIL import Image, ImageStat  # type: ignore
+
+    img = Image.blend(Image.new("RGB", layer.size, st.bg), layer, BACKDROP_OPACITY)
+    stat = ImageStat.Stat(img)
+    # Per-channel extremes bound the backdrop's lightest and darkest areas
+    lightest = tuple(int(hi) for _, hi in stat.extrema)
+    darkest = tuple(int(lo) for lo, _ in stat.extrema)
+    fg = st.fg
+    if min(contrast(fg, lightest), contrast(fg, darkest)) < 4.5:
+        fg = best_fg_for_bg(tuple(int(v) for v in stat.mean))
+    return img, fg
+
+
+def _collage_shots(flow: Optional[Dict[str, Any]], screenshots: Optional[Any]) -> List[Any]:
+    """Screenshots for the collage layout, or [] to fall back to the text layout."""
+    from src.card.collage import MIN_SHOTS, local_shots
+
+    shots = local_shots(flow, screenshots)
+    if len(shots) < MIN_SHOTS:
+        get_telemetry().count("card_collage_fallback", found=len(shots))
+        return []
+    return shots
+
+
+def _render(
+    b: Dict[str, Any],
+    st: Style,
+    spec: CanvasSpec,
+    flow: Optional[Dict[str, Any]] = None,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[Any] = None,
+) -> Any:
+    # Pillow and the text helpers are imported here so that importing this
+    # module (e.g. for derive_style_from_flow) stays cheap.
+    from PIL import Image, ImageDraw  # type: ignore
+
+    from src.card.text import fit_text, measure
+    from src.card.bullets import layout_bullets, draw_bullets
+
+    W, H = spec.width, spec.height
+    bg, fg = st.bg, st.fg
 
     # Canvas
-    img = Image.new("RGB", (W, H), bg)
+    img = None
+    if background == "blurhash":
+        img, fg = _backdrop(flow, st, spec)
+    if img is None:
+        img = Image.new("RGB", (W, H), bg)
     d = ImageDraw.Draw(img)
 
     # Layout
-    pad_x, pad_top = CANVAS.pad_x, CANVAS.pad_top
+    pad_x, pad_top = spec.pad_x, spec.pad_top
     content_width = W - pad_x * 2
     align = (st.align or "left").lower()
+    shots = _collage_shots(flow, screenshots) if layout == "collage" else []
 
-    # Title
+    # Title (smaller above a collage, which gets the space the bullets would)
     overlay = str(b.get("overlay", "Arcade Flow")).strip()
-    title_font, title_lines = fit_text(d, overlay, content_width, 2, 80, 40, st.font)
+    scale = 1.0
+    if shots:
+        from src.card.collage import TITLE_SCALE
+
+        scale = TITLE_SCALE
+    title_font, title_lines = fit_text(
+        d, overlay, content_width, 2, int(spec.title_max_size * scale), int(spec.title_min_size * scale), st.font
+    )
 
     def aligned_x(tw: int) -> float:
         if align == "left":
@@ -83,17 +165,134 @@ def compose(brief: Any, path: Any, flow: Optional[Dict[str, Any]] = None, style:
         d.text((aligned_x(tw), y), line, fill=fg, font=title_font)
         y += th + 8
 
-    y += CANVAS.pad_between
+    y += spec.pad_between
 
-    # Bullets
-    bullets = [str(e).strip() for e in (b.get("elements") or []) if str(e).strip()][:5]
-    if not bullets:
-        bullets = ["Step 1", "Step 2", "Step 3"]
+    if shots:
+        from src.card.collage import draw_collage
 
+        draw_collage(img, shots, spec, st.primary, bg)
+        return img
+
+    # Bullets
     body_max_height = H - y - pad_top
-    body_font, wrapped = layout_bullets(d, bullets, st.font, content_width, body_max_height, 40, 24)
+    body_font, wrapped = layout_bullets(
+        d, _bullets(b), st.font, content_width, body_max_height, spec.body_max_size, spec.body_min_size, spec
+    )
+
+    draw_bullets(d, y, wrapped, body_font, fg, content_x=pad_x, spec=spec)
+    return img
+
+
+def _save(img: Any, path: Any, encoding: Optional[EncodeOptions]) -> EncodeResult:
+    """Encode and write ``img``; with format "auto" the suffix follows the chosen format."""
+    from src.card.encode import EncodeOptions, encode, extension_for
+
+    tel = get_telemetry()
+    opts = encoding or EncodeOptions()
+    res = encode(img, opts)
+    tel.observe("card_encode", res.seconds, format=res.format)
+    target = Path(path)
+    if extension_for(opts) is None:
+        target = target.with_suffix(f".{res.extension}")
+    with tel.timer("card_write"):
+        target.write_bytes(res.data)
+    res.path = str(target)
+    return res
+
+
+def resolve_style(
+    style: Union[Dict[str, Any], Style, None], flow: Optional[Dict[str, Any]] = None, background: str = "solid"
+) -> Style:
+    """Final card colors for a style answer (or the flow's own palette when None).
+
+    Only the blurhash background lets page colours into the flow's palette.
+    Pass the result as ``style`` to several ``compose``/``compose_variants``
+    calls to resolve it once; a ``Style`` is returned unchanged.
+    """
+    if isinstance(style, Style):
+        return style
+    return _resolve_colors(_style_from_dict(style, flow, blurhash=background == "blurhash"))
+
+
+def _render_and_save(
+    b: Dict[str, Any],
+    st: Style,
+    spec: CanvasSpec,
+    path: Any,
+    encoding: Optional[EncodeOptions],
+    flow: Optional[Dict[str, Any]] = None,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[Any] = None,
+) -> EncodeResult:
+    with get_telemetry().timer("card_render", variant=spec.name):
+        img = _render(b, st, spec, flow, background, layout, screenshots)
+    return _save(img, path, encoding)
+
+
+def compose(
+    brief: Any,
+    path: Any,
+    flow: Optional[Dict[str, Any]] = None,
+    style: Union[Dict[str, Any], Style, None] = None,
+    spec: CanvasSpec = CANVAS,
+    encoding: Optional[EncodeOptions] = None,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[Any] = None,
+) -> EncodeResult:
+    """Render the card and write it to ``path``; returns the encode size/time.
+
+    ``encoding`` defaults to lossless optimized PNG; the caller chooses a file
+    extension that matches (see ``card.encode.extension_for``), except with
+    format "auto" where the suffix is replaced by the chosen format's.
+    ``background`` is one of ``BACKGROUNDS`` and ``layout`` one of ``LAYOUTS``;
+    the collage reads screenshots from the ``screenshots`` directory or the
+    asset cache, never from the network.
+    """
+    # Normalize input and resolve style
+    b = _as_brief_dict(brief)
+    st = resolve_style(style, flow, background)
+    return _render_and_save(b, st, spec, path, encoding, flow, background, layout, screenshots)
+
+
+def compose_variants(
+    brief: Any,
+    outdir: Any,
+    flow: Optional[Dict[str, Any]] = None,
+    style: Union[Dict[str, Any], Style, None] = None,
+    specs: Optional[Iterable[CanvasSpec]] = None,
+    workers: Optional[int] = None,
+    parallel_threshold: int = 3,
+    encoding: Optional[EncodeOptions] = None,
+    background: str = "solid",
+    layout: str = "text",
+    screenshots: Optional[Any] = None,
+) -> Dict[str, EncodeResult]:
+    """Render one card per ``CanvasSpec`` into ``outdir/social-<name>.<ext>``.
+
+    Brief parsing and style resolution happen once; font faces and text
+    measurements are shared through the card caches, so variants only pay for
+    their own layout and encoding. With ``parallel_threshold`` or more specs the
+    renders run on a thread pool (PNG encoding releases the GIL).
+    """
+    b = _as_brief_dict(brief)
+    st = resolve_style(style, flow, background)
+    out = Path(outdir)
+    out.mkdir(parents=True, exist_ok=True)
+    todo = list(specs if specs is not None else VARIANTS.values())
+
+    from src.card.encode import EncodeOptions, extension_for
+
+    ext = extension_for(encoding or EncodeOptions()) or "png"
+
+    def one(spec: CanvasSpec) -> Tuple[str, EncodeResult]:
+        path = out / f"social-{spec.name}.{ext}"
+        return spec.name, _render_and_save(b, st, spec, path, encoding, flow, background, layout, screenshots)
 
-    draw_bullets(d, y, wrapped, body_font, fg, content_x=pad_x)
+    if len(todo) >= parallel_threshold and (workers is None or workers > 1):
+        from concurrent.futures import ThreadPoolExecutor
 
-    # Save
-    img.save(path.__fspath__() if hasattr(path, "__fspath__") else path, "PNG")
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=workers or min(len(todo), os.cpu_count() or 4)) as pool:
+            return dict(pool.map(one, todo))
+    return dict(one(spec) for spec in todo)
@@ -0,0 +1,193 @@
+# Rule-based analyzer: build the report and image brief straight from flow fields
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from src.flow_stream import flow_index
+
+__all__ = ["step_events", "describe_steps", "analyze_local", "brief_local"]
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into",
+    "is", "it", "learn", "of", "on", "or", "see", "the", "this", "to", "with", "you", "your",
+}
+_VERBS = {"button": "Click", "link": "Click", "image": "Select", "input": "Click", "other": "Click"}
+_TITLE_SEPARATORS = re.compile(r"\s+(?::|\||–|—|-)\s+")
+_DOMAIN_SUFFIX = re.compile(r"\.(?:com|org|net|io|co)\b", re.I)
+# Where a hotspot label stops being the action and starts explaining it
+_CLAUSE_BREAK = re.compile(r"\s+(?:to|if|so|and then|before|for)\s+|[.!;,]\s", re.I)
+
+
+def _clean(s: Any) -> str:
+    """Plain one-line text: no markdown emphasis, collapsed whitespace."""
+    if not isinstance(s, str):
+        return ""
+    return " ".join(s.replace("*", "").replace("_", " ").split())
+
+
+def _shorten(s: str, limit: int) -> str:
+    if len(s) <= limit:
+        return s
+    cut = s[: limit - 1].rsplit(" ", 1)[0].rstrip(",;:")
+    return cut + "…"
+
+
+def _page_name(title: str) -> str:
+    """``"Cart : Target"`` -> ``"Cart"``; the first segment of a page title."""
+    return _TITLE_SEPARATORS.split(title, 1)[0].strip('" ') if title else ""
+
+
+def _brand(urls: List[str]) -> str:
+    counts: Dict[str, int] = {}
+    for u in urls:
+        parts = [p for p in urlparse(u).netloc.lower().split(":")[0].split(".") if p and p != "www"]
+        if len(parts) >= 2:
+            counts[parts[-2]] = counts.get(parts[-2], 0) + 1
+    return max(counts.items(), key=lambda kv: kv[1])[0] if counts else ""
+
+
+def step_events(flow: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Map step id -> event types recorded for it.
+
+    Click events carry the ``clickId`` of the step they produced; typing,
+    scrolling and dragging records have none, so they are attached to the most
+    recent click in time order (the step the user was on when they happened).
+    """
+    def start(e: Dict[str, Any]) -> float:
+        t = e.get("timeMs", e.get("startTimeMs"))
+        return t if isinstance(t, (int, float)) else 0.0
+
+    out: Dict[str, List[str]] = {}
+    current: Optional[str] = None
+    for ev in sorted(flow.get("capturedEvents", []) or [], key=start):
+        kind = ev.get("type")
+        if kind == "click" and isinstance(ev.get("clickId"), str):
+            current = ev["clickId"]
+            out.setdefault(current, []).append("click")
+        elif current is not None and isinstance(kind, str):
+            out[current].append(kind)
+    return out
+
+
+def _describe(step: Dict[str, Any], events: List[str]) -> Optional[str]:
+    cc = step.get("clickContext") or {}
+    text = _clean(cc.get("text"))
+    etype = cc.get("elementType") if isinstance(cc.get("elementType"), str) else ""
+    label = next((_clean(h.get("label")) for h in step.get("hotspots", []) or [] if _clean(h.get("label"))), "")
+    if not cc and not label:
+        return None
+    if not cc:
+        return label
+    verb = "Type in" if "typing" in events else _VERBS.get(etype, "Click")
+    # Badge counts and icon glyphs ("1", "›") say nothing about the target
+    target = f'the "{text}"' if len(text) > 1 and not text.isdigit() else "the"
+    kind = {"other": "field", "input": "field"}.get(etype, etype or "element")
+    line = f"{verb} {target} {kind}"
+    if "scrolling" in events:
+        line += ", then scroll"
+    return f"{line} — {label}" if label else line
+
+
+def describe_steps(flow: Dict[str, Any]) -> List[str]:
+    """One line per interactive step: the action, its target element and the hotspot label."""
+    events = step_events(flow)
+    lines: List[str] = []
+    for step in flow.get("steps", []) or []:
+        if step.get("type") in ("CHAPTER", "VIDEO"):
+            continue
+        line = _describe(step, events.get(step.get("id"), []))
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _chapters(flow: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [
+        (_clean(s.get("title")), _clean(s.get("subtitle")))
+        for s in flow.get("steps", []) or []
+        if s.get("type") == "CHAPTER" and _clean(s.get("title"))
+    ]
+
+
+def _title(flow: Dict[str, Any]) -> str:
+    chapters = _chapters(flow)
+    return chapters[0][0] if chapters else (_clean(flow.get("name")) or "Arcade Flow")
+
+
+_SENTENCE_END = (".", "!", "?", "…")
+
+
+def _summary(flow: Dict[str, Any], steps: List[str]) -> str:
+    idx = flow_index(flow)
+    chapters = _chapters(flow)
+    sentences: List[str] = []
+    lead = (chapters[0][1] if chapters else "") or _clean(flow.get("description"))
+    if lead:
+        sentences.append(lead if lead.endswith(_SENTENCE_END) else lead + ".")
+    pages = [p for p in (_page_name(t) for t in idx.titles) if p]
+    brand = _brand(idx.urls)
+    where = f" on {brand.capitalize()}" if brand else ""
+    if pages and pages[0] != pages[-1]:
+        sentences.append(f"The walkthrough takes {len(steps)} steps{where}, from {pages[0]} to {pages[-1]}.")
+    elif steps:
+        sentences.append(f"The walkthrough takes {len(steps)} steps{where}.")
+    if len(chapters) > 1 and chapters[-1][0] != chapters[0][0]:
+        closing = chapters[-1][0]
+        # The quoted title already ends the sentence when it ends in punctuation
+        sentences.append(f"It closes with “{closing}”" + ("" if closing.endswith(_SENTENCE_END) else "."))
+    return " ".join(sentences[:3])
+
+
+def _tags(flow: Dict[str, Any], title: str) -> List[str]:
+    tags: List[str] = []
+    brand = _brand(flow_index(flow).urls)
+    use_case = _clean(flow.get("useCase")).lower()
+    for t in [brand, use_case] + re.findall(r"[A-Za-z][A-Za-z0-9'-]+", _DOMAIN_SUFFIX.sub("", title)):
+        t = t.lower().strip("'-")
+        if len(t) > 2 and t not in _STOPWORDS and t not in tags:
+            tags.append(t)
+    return tags[:6]
+
+
+def analyze_local(flow: Dict[str, Any]) -> str:
+    """The analyst report (TITLE/SUMMARY/STEPS/TAGS) without an LLM call."""
+    title = _title(flow)
+    steps = describe_steps(flow)
+    numbered = "\n".join(f"{i}. {s}" for i, s in enumerate(steps, 1)) or "1. Open the flow"
+    return (
+        f"TITLE: {title}\n"
+        f"SUMMARY: {_summary(flow, steps)}\n\n"
+        f"STEPS:\n{numbered}\n\n"
+        f"TAGS: {', '.join(_tags(flow, title))}"
+    )
+
+
+def _bullet(label: str) -> str:
+    # Skip breaks inside the action itself ("Click Add to cart to ...")
+    m = next((m for m in _CLAUSE_BREAK.finditer(label) if m.start() >= 12), None)
+    head = label[: m.start()] if m else label
+    return _shorten(head.rstrip(".!"), 60)
+
+
+def brief_local(flow: Dict[str, Any], title: str) -> Dict[str, Any]:
+    """Image brief (overlay + 3-5 bullets) from the title and hotspot labels."""
+    labels = [
+        _clean(h.get("label"))
+        for s in flow.get("steps", []) or []
+        for h in s.get("hotspots", []) or []
+        if _clean(h.get("label"))
+    ]
+    bullets: List[str] = []
+    for b in (_bullet(lbl) for lbl in labels):
+        if b and b not in bullets:
+            bullets.append(b)
+    if len(bullets) > 5:
+        # Keep the first and last actions and spread the rest evenly
+        step = (len(bullets) - 1) / 4
+        bullets = [bullets[round(i * step)] for i in range(5)]
+    if len(bullets) < 3:
+        bullets += [_shorten(_page_name(t), 60) for t in flow_index(flow).titles if _page_name(t) not in bullets]
+        bullets = list(dict.fromkeys(b for b in bullets if b))[:5]
+    return {"overlay": _shorten(title or _title(flow), 80), "elements": bullets}
@@ -0,0 +1,136 @@
+# Dependency-aware stage scheduler: run a small DAG of pipeline stages concurrently
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.telemetry import get_telemetry
+
+__all__ = ["Stage", "StageRun", "EarlyValue", "run_stages"]
+
+
+@dataclass
+class Stage:
+    """One node of the pipeline.
+
+    ``fn`` receives the outputs of ``inputs`` as keyword arguments (by stage
+    name) and may be sync or async; sync stages run in a worker thread so they
+    never block the loop. When ``artifact`` exists on disk (and the run is not
+    forced) the stage is skipped and ``load(artifact)`` supplies its output;
+    otherwise ``save(artifact, value)`` persists what it produced.
+    """
+
+    name: str
+    fn: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    artifact: Optional[Path] = None
+    load: Optional[Callable[[Path], Any]] = None
+    save: Optional[Callable[[Path, Any], None]] = None
+
+
+@dataclass
+class StageRun:
+    values: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+class EarlyValue:
+    """A value one stage publishes before it finishes, for stages that can start early.
+
+    The producer calls ``set`` (first call wins; later calls are ignored) and
+    consumers ``await get()``. A consumer stage lists the producer's *inputs*
+    rather than the producer itself, so the scheduler starts it alongside;
+    the producer must ``set`` on every path, including when resumed.
+    """
+
+    def __init__(self) -> None:
+        self._future: Optional["asyncio.Future[Any]"] = None
+
+    def _get_future(self) -> "asyncio.Future[Any]":
+        if self._future is None:
+            self._future = asyncio.get_running_loop().create_future()
+        return self._future
+
+    def set(self, value: Any) -> None:
+        future = self._get_future()
+        if not future.done():
+            future.set_result(value)
+
+    def is_set(self) -> bool:
+        return self._future is not None and self._future.done()
+
+    async def get(self) -> Any:
+        return await self._get_future()
+
+
+def _check_graph(stages: Sequence[Stage]) -> None:
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("duplicate stage names")
+    for s in stages:
+        missing = [i for i in s.inputs if i not in names]
+        if missing:
+            raise ValueError(f"stage {s.name!r} depends on unknown stage(s): {', '.join(missing)}")
+    # Kahn's algorithm; leftover nodes mean a cycle
+    deps = {s.name: set(s.inputs) for s in stages}
+    ready = [n for n, d in deps.items() if not d]
+    seen = 0
+    while ready:
+        n = ready.pop()
+        seen += 1
+        for m, d in deps.items():
+            if n in d:
+                d.discard(n)
+                if not d:
+                    ready.append(m)
+    if seen != len(stages):
+        raise ValueError("stage graph has a cycle")
+
+
+async def run_stages(stages: Sequence[Stage], resume: bool = False) -> StageRun:
+    """Run ``stages`` as soon as their inputs are ready; independent stages overlap.
+
+    With ``resume`` stages whose artifact already exists are loaded instead of
+    executed. The first failing stage cancels the rest and re-raises.
+    """
+    _check_graph(stages)
+    run = StageRun()
+    tasks: Dict[str, "asyncio.Task[Any]"] = {}
+    start = time.perf_counter()
+
+    async def execute(stage: Stage) -> Any:
+        kwargs = {name: await tasks[name] for name in stage.inputs}
+        resumed = resume and stage.artifact is not None and stage.load is not None and stage.artifact.exists()
+        with get_telemetry().timer("stage", stage=stage.name, resumed=resumed):
+            t0 = time.perf_counter()
+            if resumed:
+                value = stage.load(stage.artifact)
+                run.skipped.append(stage.name)
+            else:
+                if inspect.iscoroutinefunction(stage.fn):
+                    value = await stage.fn(**kwargs)
+                else:
+                    value = await asyncio.to_thread(stage.fn, **kwargs)
+                if stage.artifact is not None and stage.save is not None:
+                    stage.save(stage.artifact, value)
+            run.timings[stage.name] = time.perf_counter() - t0
+        run.values[stage.name] = value
+        return value
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(execute(stage))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    run.elapsed = time.perf_counter() - start
+    return run
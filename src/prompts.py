@@ -21,6 +21,64 @@ USER_ANALYST = (
     "FLOW JSON:\n{flow_json}\n"
 )
 
+# --- Chunked analysis (map: a few steps at a time; reduce: the whole flow) ----
+SYSTEM_STEPS = (
+    "You describe steps of an Arcade product demo. For each step in the given JSON, "
+    "write one line: the user's action and its target element, in plain imperative English "
+    "(e.g. \"Click the Add to cart button\"). "
+    "Output exactly one numbered line per step, in order, and nothing else."
+)
+
+USER_STEPS = (
+    "Describe each of these {count} steps.\n\n"
+    "STEPS JSON:\n{steps_json}\n"
+)
+
+SYSTEM_REDUCE = (
+    "You are an expert product analyst. Given the ordered step descriptions of an Arcade flow, "
+    "write a report header. Use these sections strictly:\n\n"
+    "TITLE: <short, human-friendly title>\n"
+    "SUMMARY: <2-3 sentences describing the user goal and outcome>\n\n"
+    "TAGS: <comma-separated keywords>\n\n"
+    "Only output text in this exact structure."
+)
+
+USER_REDUCE = (
+    "Write the report header for this Arcade flow.\n\n"
+    "FLOW NAME: {name}\n"
+    "STEPS:\n{steps}\n"
+)
+
+# --- Combined (report + brief + style in one structured response) ------------
+SYSTEM_COMBINED = (
+    "You are an expert product analyst and brand designer. Given an Arcade flow and brand hints, "
+    "return ONE JSON object with:\n"
+    "- title: short, human-friendly title\n"
+    "- summary: 2-3 sentences describing the user goal and outcome\n"
+    "- steps: one string per step, the action and its target element\n"
+    "- tags: a few keywords\n"
+    "- overlay: a concise, compelling social card headline (<= 80 chars)\n"
+    "- elements: 3-5 short card bullets (<= 60 chars each)\n"
+    "- primary_color, background_color, text_color, accent_color: 7-char lowercase hex like #2142e7\n"
+    "- font_family\n"
+    "Palette rules: prefer the canonical brand primary of the primary domain over incidental UI colors; "
+    "use it as background_color when contrast with #ffffff or #000000 is >= 4.5 and set text_color to the "
+    "better of the two; if the brand is unknown, use the most frequent non-neutral seen color. "
+    "accent_color is a tint/shade of primary_color. Use the flow font if given, else Inter."
+)
+
+USER_COMBINED = (
+    "Analyze this Arcade flow and produce the JSON object.\n\n"
+    "PRIMARY DOMAIN: {primary_domain}\n"
+    "DOMAINS / BRAND HINTS: {brand_hints}\n"
+    "FLOW FONT (if any): {flow_font}\n"
+    "SEEN COLORS (from hotspots/buttons): {seen_colors}\n\n"
+    "FLOW JSON:\n{flow_json}\n"
+)
+
+# Appended to USER_COMBINED when re-asking for pieces that were missing or invalid
+USER_COMBINED_RETRY = "\nReturn only these keys: {keys}.\n"
+
 # --- Image brief (for social card) -------------------------------------------
 SYSTEM_IMAGE = (
     "You create compact JSON briefs for a social share image. "
@@ -0,0 +1,527 @@
+# Long-running analyzer service: one warm process (LLM client, response cache, fonts)
+# answering flows over HTTP through a bounded job queue
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from src.analyzer_ai import ANALYST_MODES, ANALYZERS, analyze_flow_async
+from src.card.encode import FORMATS, EncodeOptions
+from src.image_card import BACKGROUNDS, LAYOUTS
+from src.telemetry import get_telemetry
+
+__all__ = ["ServerConfig", "ServiceBusy", "AnalyzerService", "request_options", "warm_up", "serve"]
+
+DEFAULT_PORT = 8780
+DEFAULT_WORK_DIR = ".cache/server"
+# Trace spans and timer samples kept for /metrics quantiles (see Telemetry.window)
+_TELEMETRY_WINDOW = 4096
+
+# Request counts are labelled with these paths; anything else is "other"
+_ROUTES = ("/analyze", "/health", "/metrics")
+# Per-request options: name -> allowed values (tuple) or converter
+_OPTIONS: Dict[str, Any] = {
+    "analyzer": ANALYZERS,
+    "analyst_mode": ANALYST_MODES,
+    "background": BACKGROUNDS,
+    "layout": LAYOUTS,
+    "format": FORMATS,
+    "quality": int,
+    "max_kb": float,
+    "token_budget": int,
+    "compact": bool,
+    "brands": bool,
+    "variants": list,
+}
+
+
+class ServiceBusy(RuntimeError):
+    """The job queue is full; the client should retry later."""
+
+
+@dataclass
+class ServerConfig:
+    host: str = "127.0.0.1"
+    port: int = DEFAULT_PORT
+    # Flows analyzed at once, and flows allowed to wait behind them
+    workers: int = 4
+    queue: int = 16
+    # Seconds a request waits for its result before getting 504 (the job still finishes)
+    job_timeout: float = 300.0
+    retry_after: int = 5
+    work_dir: str = DEFAULT_WORK_DIR
+    keep: bool = False
+    # Larger request bodies are refused with 413 before they are read
+    max_body: int = 64 * 1024 * 1024
+    # Requests may name flow files (``{"path": ...}``) only below this directory
+    flow_root: Optional[str] = None
+    # analyze_flow_async defaults; requests override the keys in ``_OPTIONS``
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def request_options(raw: Dict[str, Any], defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """``analyze_flow_async`` options: ``defaults`` overridden by ``raw`` (JSON or query values).
+
+    Raises ValueError for unknown names or values out of range.
+    """
+    unknown = sorted(set(raw) - set(_OPTIONS))
+    if unknown:
+        raise ValueError(f"unknown option(s): {', '.join(unknown)}; choose from {', '.join(_OPTIONS)}")
+    options = dict(defaults)
+    encoding: EncodeOptions = options.pop("encoding", None) or EncodeOptions()
+    enc = {"format": encoding.format, "quality": encoding.quality, "max_kb": encoding.max_kb}
+    for name, value in raw.items():
+        kind = _OPTIONS[name]
+        if isinstance(kind, tuple):
+            if value not in kind:
+                raise ValueError(f"{name}={value!r}; choose from {', '.join(kind)}")
+        elif kind is bool:
+            value = _flag(value)
+        elif kind is list:
+            if isinstance(value, str):
+                value = [v.strip() for v in value.split(",") if v.strip()]
+            elif not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f"{name} must be a list of names or a comma-separated string")
+        elif value is not None:
+            # JSON hands us any type; int({}) and float([]) raise TypeError, not ValueError
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError(f"{name}={value!r}; expected a number")
+            value = kind(value)
+        if name in enc:
+            enc[name] = value
+        else:
+            options[name] = value
+    from src.card.canvas import VARIANTS
+
+    bad = [v for v in options.get("variants", ()) if v not in VARIANTS]
+    if bad:
+        raise ValueError(f"unknown variant(s): {', '.join(bad)}; choose from {', '.join(VARIANTS)}")
+    options["encoding"] = EncodeOptions(format=enc["format"], quality=enc["quality"], max_kb=enc["max_kb"])
+    return options
+
+
+# ---- Warm-up -------------------------------------------------------------------
+
+def warm_up(llm: bool = True) -> Dict[str, float]:
+    """Open the shared caches and load what the first request would otherwise pay for.
+
+    Returns milliseconds per item: the response cache and brand registry
+    (SQLite), the font index, a throwaway card render (Pillow, numpy, font
+    faces at card sizes) and, with ``llm``, the async LLM client.
+    """
+    from src.ai import get_cache
+    from src.brands import get_brand_registry
+    from src.card.fonts import get_font_index
+    from src.image_card import compose
+
+    timings: Dict[str, float] = {}
+
+    def step(name: str, fn: Any) -> None:
+        t = time.perf_counter()
+        fn()
+        timings[name] = round((time.perf_counter() - t) * 1000, 1)
+
+    step("cache", get_cache)
+    step("brands", get_brand_registry)
+    step("fonts", get_font_index)
+    with tempfile.TemporaryDirectory() as td:
+        brief = {"overlay": "Warm up the card renderer", "elements": ["One", "Two", "Three"]}
+        step("card", lambda: compose(brief, Path(td) / "warm.png", background="blurhash"))
+    if llm:
+        from src.ai_async import get_async_llm
+
+        step("llm", get_async_llm)
+    return timings
+
+
+# ---- Jobs ----------------------------------------------------------------------
+
+@dataclass
+class _Job:
+    flow: bytes
+    options: Dict[str, Any]
+    future: "asyncio.Future[Dict[str, Any]]"
+    queued: float = field(default_factory=time.perf_counter)
+
+
+class AnalyzerService:
+    """A fixed pool of workers analyzing flows from a bounded queue.
+
+    Everything expensive to set up lives for the whole process: the async LLM
+    client and its connection pool (``src.ai_async.get_async_llm``), the
+    response cache and brand registry, font faces and collage thumbnails. A
+    full queue rejects new flows (``ServiceBusy``) instead of letting latency
+    grow without bound.
+    """
+
+    def __init__(self, config: ServerConfig) -> None:
+        self.config = config
+        self.started = time.time()
+        self.busy = 0
+        # Admitted jobs not yet finished (queued or running), bounded by workers + queue
+        self.pending = 0
+        self.stats = {"done": 0, "failed": 0, "rejected": 0}
+        self.warm: Dict[str, float] = {}
+        self._queue: Optional["asyncio.Queue[_Job]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+
+    async def start(self) -> None:
+        # Unbounded: admission is decided by ``pending`` in submit()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.config.workers)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.busy
+
+    def submit(self, flow: bytes, options: Dict[str, Any]) -> "asyncio.Future[Dict[str, Any]]":
+        """Queue ``flow`` (JSON bytes); raises ServiceBusy when the queue is full.
+
+        Admission counts jobs, not queue entries: a job handed to an idle
+        worker that has not picked it up yet still takes a worker slot, so a
+        burst fills the workers before the queue.
+        """
+        assert self._queue is not None, "start() the service first"
+        if self.pending >= self.config.workers + self.config.queue:
+            self.stats["rejected"] += 1
+            get_telemetry().count("server_rejected")
+            raise ServiceBusy(f"{self.queued} flows queued")
+        job = _Job(flow, options, asyncio.get_running_loop().create_future())
+        self.pending += 1
+        self._queue.put_nowait(job)
+        return job.future
+
+    async def analyze(self, flow: bytes, options: Dict[str, Any]) -> Dict[str, Any]:
+        future = self.submit(flow, options)
+        # shield: a timed-out request leaves the job running, so its LLM answers still get cached
+        return await asyncio.wait_for(asyncio.shield(future), self.config.job_timeout)
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            self.busy += 1
+            telemetry = get_telemetry()
+            telemetry.observe("server_queue_wait", time.perf_counter() - job.queued)
+            try:
+                with telemetry.timer("server_job"):
+                    result = await self._run(job)
+            except Exception as exc:
+                self.stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            else:
+                self.stats["done"] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self.busy -= 1
+                self.pending -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: _Job) -> Dict[str, Any]:
+        work = Path(self.config.work_dir) / uuid.uuid4().hex
+        work.mkdir(parents=True)
+        try:
+            flow_path = work / "flow.json"
+            await asyncio.to_thread(flow_path.write_bytes, job.flow)
+            info = await analyze_flow_async(flow_path, work / "out", **job.options)
+            return await asyncio.to_thread(_collect, info, time.perf_counter() - job.queued)
+        finally:
+            if not self.config.keep:
+                await asyncio.to_thread(shutil.rmtree, work, True)
+
+    def health(self) -> Dict[str, Any]:
+        from src.ai import get_cache
+
+        cache = get_cache()
+        return {
+            "ok": True,
+            "uptime": round(time.time() - self.started, 1),
+            "workers": self.config.workers,
+            "busy": self.busy,
+            "queued": self.queued,
+            "capacity": self.config.queue,
+            **self.stats,
+            "cache": {"hits": cache.hits, "misses": cache.misses},
+            "warm_ms": self.warm,
+        }
+
+    def metrics(self) -> str:
+        gauges = (
+            ("server_busy_workers", self.busy),
+            ("server_queued_flows", self.queued),
+            ("server_queue_capacity", self.config.queue),
+        )
+        lines = [f"# TYPE arcade_{name} gauge\narcade_{name} {value}" for name, value in gauges]
+        return get_telemetry().prometheus() + "\n".join(lines) + "\n"
+
+
+def _collect(info: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    """The HTTP answer for one analyzed flow: report text and base64 card bytes."""
+    cards = []
+    for im in info["images"]:
+        path = Path(im["path"])
+        cards.append(
+            {
+                "name": path.stem,
+                "format": im.get("format", path.suffix.lstrip(".")),
+                "bytes": path.stat().st_size,
+                "data": base64.b64encode(path.read_bytes()).decode("ascii"),
+            }
+        )
+    return {
+        "title": info["title"],
+        "fingerprint": info["fingerprint"],
+        "report": Path(info["report"]).read_text(encoding="utf-8"),
+        "timing": info["timing"],
+        "card": cards[0],
+        "variants": cards[1:],
+        "fallbacks": info["fallbacks"],
+        "stages": info["timings"],
+        "seconds": round(seconds, 4),
+    }
+
+
+# ---- HTTP ----------------------------------------------------------------------
+
+def _reply(status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+    from src.transport import _REASONS
+
+    head = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+    ]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+def _flow_bytes(body: bytes, config: ServerConfig) -> Tuple[bytes, Dict[str, Any]]:
+    """(flow JSON bytes, request options) from an ``/analyze`` body.
+
+    The body is the flow itself, ``{"flow": {...}, "options": {...}}`` or
+    ``{"path": "...", "options": {...}}`` with a path below ``flow_root``.
+    """
+    payload = json.loads(body or b"null")
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object: a flow, {\"flow\": ...} or {\"path\": ...}")
+    if "steps" in payload:
+        return body, {}
+    options = payload.get("options") or {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    if isinstance(payload.get("flow"), dict):
+        return json.dumps(payload["flow"]).encode(), options
+    if isinstance(payload.get("path"), str):
+        if not config.flow_root:
+            raise ValueError("flow paths are disabled; start the server with --flow-root")
+        root = Path(config.flow_root).resolve()
+        path = (root / payload["path"]).resolve()
+        if root not in path.parents or not path.is_file():
+            raise ValueError(f"no flow file {payload['path']!r} under the flow root")
+        return path.read_bytes(), options
+    raise ValueError("expected a flow (with \"steps\"), {\"flow\": ...} or {\"path\": ...}")
+
+
+async def _route(service: AnalyzerService, method: str, target: str, body: bytes) -> bytes:
+    path, _, query = target.partition("?")
+    path = path.rstrip("/") or "/"
+    if method == "GET" and path == "/health":
+        return _reply(200, json.dumps(service.health()).encode(), "application/json")
+    if method == "GET" and path == "/metrics":
+        return _reply(200, service.metrics().encode(), "text/plain; version=0.0.4")
+    if path != "/analyze":
+        return _error(404, f"no route for {method} {path}")
+    if method != "POST":
+        return _error(404, "POST a flow to /analyze")
+    try:
+        flow, raw = await asyncio.to_thread(_flow_bytes, body, service.config)
+        options = request_options({**dict(parse_qsl(query)), **raw}, service.config.options)
+    except ValueError as exc:
+        return _error(400, str(exc))
+    try:
+        result = await service.analyze(flow, options)
+    except ServiceBusy as exc:
+        return _error(503, f"busy: {exc}", {"Retry-After": str(service.config.retry_after)})
+    except asyncio.TimeoutError:
+        return _error(504, f"no result within {service.config.job_timeout:g}s")
+    except Exception as exc:
+        return _error(500, f"{type(exc).__name__}: {exc}")
+    return _reply(200, json.dumps(result).encode(), "application/json")
+
+
+def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+    return _reply(status, json.dumps({"error": message}).encode(), "application/json", headers)
+
+
+async def serve(
+    config: ServerConfig, ready: Optional[asyncio.Event] = None, warm: bool = True, llm: bool = True
+) -> None:
+    """Serve ``POST /analyze``, ``GET /health`` and ``GET /metrics`` until cancelled.
+
+    ``warm`` loads the shared caches (see ``warm_up``) before accepting
+    connections, so the first request costs what every later one does.
+    """
+    from src.transport import _BodyTooLarge, _read_request
+
+    telemetry = get_telemetry()
+    telemetry.enabled = True
+    telemetry.window = _TELEMETRY_WINDOW
+    service = AnalyzerService(config)
+    if warm:
+        service.warm = await asyncio.to_thread(warm_up, llm)
+    await service.start()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader, config.max_body)
+                except _BodyTooLarge as exc:
+                    # The unread body is still on the connection, so answer and close
+                    telemetry.count("server_requests", route="other", status="413")
+                    writer.write(_error(413, str(exc), {"Connection": "close"}))
+                    await writer.drain()
+                    break
+                if req is None:
+                    break
+                method, target, headers, body = req
+                response = await _route(service, method, target, body)
+                route = urlsplit(target).path.rstrip("/")
+                route = route if route in _ROUTES else "other"
+                telemetry.count("server_requests", route=route, status=response[9:12].decode())
+                writer.write(response)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, config.host, config.port)
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        from src import ai_async
+
+        if ai_async._default is not None:
+            await ai_async._default.aclose()
+
+
+# ---- CLI: python -m src.server ---------------------------------------------------
+
+@contextlib.contextmanager
+def _maybe_stub(latency: Optional[float]) -> Iterator[None]:
+    if latency is None:
+        yield
+        return
+    from src.bench.suite import stub_llm
+
+    with stub_llm(latency):
+        yield
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve the analyzer over HTTP from one warm process")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--workers", type=int, default=4, help="Flows analyzed concurrently")
+    ap.add_argument("--queue", type=int, default=16, help="Flows allowed to wait; beyond that requests get 503")
+    ap.add_argument("--job-timeout", type=float, default=300.0, help="Seconds a request waits for its result")
+    ap.add_argument("--work-dir", default=os.getenv("ARCADE_SERVER_DIR", DEFAULT_WORK_DIR))
+    ap.add_argument("--max-body-mb", type=float, default=64.0, help="Largest accepted request body")
+    ap.add_argument("--keep", action="store_true", help="Keep each job's flow and outputs under --work-dir")
+    ap.add_argument("--flow-root", default=None, help="Allow {\"path\": ...} requests for flow files below this directory")
+    ap.add_argument("--offline", action="store_true", help="Serve LLM answers from cache only; never call the API")
+    ap.add_argument(
+        "--stub-llm",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Answer every LLM call with canned text after SECONDS (local testing; no API key needed)",
+    )
+    ap.add_argument("--analyzer", default="llm", choices=ANALYZERS)
+    ap.add_argument("--analyst-mode", default="single", choices=ANALYST_MODES)
+    ap.add_argument("--background", default="solid", choices=BACKGROUNDS)
+    ap.add_argument("--layout", default="text", choices=LAYOUTS)
+    ap.add_argument("--screenshots", default=None, help="Directory of step screenshots for --layout collage")
+    ap.add_argument("--format", default="png", choices=FORMATS)
+    ap.add_argument("--quality", type=int, default=85)
+    ap.add_argument("--max-kb", type=float, default=None)
+    args = ap.parse_args()
+    if args.offline:
+        from src.ai import set_offline
+
+        set_offline(True)
+
+    config = ServerConfig(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        queue=args.queue,
+        job_timeout=args.job_timeout,
+        work_dir=args.work_dir,
+        keep=args.keep,
+        max_body=int(args.max_body_mb * 1024 * 1024),
+        flow_root=args.flow_root,
+        options={
+            "analyzer": args.analyzer,
+            "analyst_mode": args.analyst_mode,
+            "background": args.background,
+            "layout": args.layout,
+            "screenshots": args.screenshots,
+            "encoding": EncodeOptions(format=args.format, quality=args.quality, max_kb=args.max_kb),
+        },
+    )
+    llm = args.stub_llm is None and args.analyzer != "local"
+
+    async def run() -> None:
+        ready = asyncio.Event()
+        task = asyncio.create_task(serve(config, ready, llm=llm))
+        await asyncio.wait([task, asyncio.create_task(ready.wait())], return_when=asyncio.FIRST_COMPLETED)
+        if ready.is_set():
+            print(
+                f"Analyzer serving on http://{config.host}:{config.port} "
+                f"({config.workers} workers, queue {config.queue}); POST /analyze, GET /health, GET /metrics"
+            )
+        await task
+
+    with _maybe_stub(args.stub_llm):
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
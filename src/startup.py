@@ -0,0 +1,81 @@
+# Startup-time budget check: how long does importing our entrypoints take?
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+__all__ = ["measure_import", "main"]
+
+DEFAULT_MODULES = ["src.analyzer_ai", "src.ai", "src.image_card"]
+# Modules that must not be imported just by importing an entrypoint
+HEAVY_MODULES = ["openai", "PIL", "dotenv", "numpy"]
+DEFAULT_BUDGET_MS = 150.0
+
+_PROBE = (
+    "import json, sys, time; t = time.perf_counter(); import {module}; "
+    "dt = time.perf_counter() - t; "
+    "print(json.dumps([dt, [m for m in {heavy!r} if m in sys.modules]]))"
+)
+
+
+def measure_import(module: str, runs: int = 5) -> Dict[str, object]:
+    """Import ``module`` in fresh interpreters and report the median import time
+    (interpreter startup excluded) and any heavy dependency it dragged in."""
+    samples: List[float] = []
+    heavy: List[str] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        dt, heavy = json.loads(out)
+        samples.append(dt * 1000.0)
+    return {"module": module, "median_ms": round(statistics.median(samples), 2), "heavy_imports": heavy}
+
+
+def _cli_help_ms(runs: int) -> float:
+    samples: List[float] = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.analyzer_ai", "--help"], capture_output=True, check=True)
+        samples.append((time.perf_counter() - t) * 1000.0)
+    return round(statistics.median(samples), 2)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Check import-time budget of the analyzer entrypoints")
+    ap.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    ap.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Max median import time per module")
+    ap.add_argument(
+        "--cli-budget-ms",
+        type=float,
+        default=None,
+        help="Max median wall time of `python -m src.analyzer_ai --help` (default: --budget-ms)",
+    )
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    cli_budget = args.budget_ms if args.cli_budget_ms is None else args.cli_budget_ms
+    results = [measure_import(m, args.runs) for m in args.modules]
+    cli_ms = _cli_help_ms(args.runs)
+    report = {"budget_ms": args.budget_ms, "imports": results, "cli_help_ms": cli_ms, "cli_budget_ms": cli_budget}
+    print(json.dumps(report, indent=2))
+
+    over = [str(r["module"]) for r in results if r["median_ms"] > args.budget_ms or r["heavy_imports"]]
+    if cli_ms > cli_budget:
+        over.append("--help")
+    if over:
+        names = ", ".join(over)
+        print(f"Startup budget exceeded (or heavy imports at module load): {names}", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
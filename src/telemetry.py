@@ -0,0 +1,204 @@
+# Run telemetry: stage/LLM timers, token and cache counters, JSON trace + Prometheus text
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+__all__ = ["Telemetry", "get_telemetry"]
+
+_PREFIX = "arcade_"
+_QUANTILES = (0.5, 0.9, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v).lower() if isinstance(v, bool) else str(v)) for k, v in labels.items()))
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    i = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NOOP = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ("telemetry", "name", "labels", "t0")
+
+    def __init__(self, telemetry: "Telemetry", name: str, labels: Dict[str, Any]) -> None:
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is not None:
+            self.labels["error"] = exc_type.__name__
+        self.telemetry.observe(self.name, time.perf_counter() - self.t0, _start=self.t0, **self.labels)
+
+
+class Telemetry:
+    """Timers and counters for one run (or one long-lived process).
+
+    Timers (``timer``/``observe``) record seconds per (name, labels) series
+    and a span per observation for the trace; counters (``count``) add up
+    values such as tokens or cache hits. While ``enabled`` is False every
+    call returns immediately, so instrumentation can stay in hot paths.
+    With ``window`` (long-lived processes) only the latest ``window`` spans
+    and samples per series are kept for the trace and quantiles; counts and
+    sums stay exact.
+    """
+
+    def __init__(self, enabled: bool = False, window: Optional[int] = None) -> None:
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._t0 = time.perf_counter()
+            self.spans: List[Dict[str, Any]] = []
+            self.timers: Dict[Tuple[str, Labels], List[float]] = {}
+            # (count, sum) per timer series, unaffected by ``window``
+            self.totals: Dict[Tuple[str, Labels], Tuple[int, float]] = {}
+            self.counters: Dict[Tuple[str, Labels], float] = {}
+
+    # ---- recording -----------------------------------------------------------
+
+    def timer(self, name: str, **labels: Any) -> Any:
+        """``with telemetry.timer("llm", kind="analyst"): ...``"""
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, name, labels)
+
+    def observe(self, name: str, seconds: float, _start: Optional[float] = None, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        start = (_start if _start is not None else time.perf_counter() - seconds) - self._t0
+        with self._lock:
+            samples = self.timers.setdefault(key, [])
+            samples.append(seconds)
+            n, total = self.totals.get(key, (0, 0.0))
+            self.totals[key] = (n + 1, total + seconds)
+            self.spans.append(
+                {"name": name, "labels": dict(key[1]), "start": round(start, 6), "seconds": round(seconds, 6)}
+            )
+            if self.window is not None:
+                # Trim in batches so the list shifts are amortized
+                if len(samples) > 2 * self.window:
+                    del samples[: -self.window]
+                if len(self.spans) > 2 * self.window:
+                    del self.spans[: -self.window]
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # ---- reporting -----------------------------------------------------------
+
+    def _total(self, name: str, **match: str) -> float:
+        return sum(
+            v for (n, labels), v in self.counters.items()
+            if n == name and all(dict(labels).get(k) == want for k, want in match.items())
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._total("llm_cache", result="hit")
+            misses = self._total("llm_cache", result="miss")
+            stages: Dict[str, float] = {}
+            for (name, labels), (_n, total) in self.totals.items():
+                if name == "stage":
+                    stage = dict(labels).get("stage", "")
+                    stages[stage] = round(stages.get(stage, 0.0) + total, 6)
+            return {
+                "prompt_tokens": int(self._total("llm_prompt_tokens")),
+                "completion_tokens": int(self._total("llm_completion_tokens")),
+                "cache_hits": int(hits),
+                "cache_misses": int(misses),
+                "cache_hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+                "stage_seconds": stages,
+            }
+
+    def trace(self) -> Dict[str, Any]:
+        """Per-run trace: every span in start order, counters and a summary."""
+        summary = self.summary()
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed": round(time.perf_counter() - self._t0, 6),
+                "summary": summary,
+                "counters": [{"name": n, "labels": dict(lb), "value": v} for (n, lb), v in self.counters.items()],
+                "spans": sorted(self.spans, key=lambda s: s["start"]),
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format: counters as ``*_total``, timers as summaries."""
+
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            by_name: Dict[str, List[Tuple[Any, ...]]] = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name.setdefault(f"{_PREFIX}{name}_total", []).append((labels, value))
+            for metric, series in by_name.items():
+                lines.append(f"# TYPE {metric} counter")
+                lines += [f"{metric}{fmt(labels)} {value:g}" for labels, value in series]
+            by_name = {}
+            for (name, labels), samples in sorted(self.timers.items()):
+                series_totals = self.totals[(name, labels)]
+                by_name.setdefault(f"{_PREFIX}{name}_seconds", []).append((labels, sorted(samples), series_totals))
+            for metric, series in by_name.items():
+                lines.append(f"# TYPE {metric} summary")
+                for labels, samples, (n, total) in series:
+                    for q in _QUANTILES:
+                        lines.append(f"{metric}{fmt(labels, (('quantile', str(q)),))} {_quantile(samples, q):.6f}")
+                    lines.append(f"{metric}_sum{fmt(labels)} {total:.6f}")
+                    lines.append(f"{metric}_count{fmt(labels)} {n}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, trace_path: Optional[Path] = None, metrics_path: Optional[Path] = None) -> None:
+        for path, text in ((trace_path, lambda: json.dumps(self.trace(), indent=2)), (metrics_path, self.prometheus)):
+            if path is not None:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                Path(path).write_text(text())
+
+
+_default: Optional[Telemetry] = None
+
+
+def get_telemetry() -> Telemetry:
+    """Process-wide telemetry; enabled by ``ARCADE_TELEMETRY=1`` or ``.enabled = True``."""
+    global _default
+    if _default is None:
+        _default = Telemetry(os.getenv("ARCADE_TELEMETRY", "").lower() in ("1", "true", "yes"))
+    return _default
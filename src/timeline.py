@@ -0,0 +1,222 @@
+# Captured-events timeline: NumPy columns, clickId -> step join and interaction metrics
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__all__ = ["EVENT_KINDS", "Timeline", "StepTiming", "TimingMetrics", "timing_metrics", "format_timing"]
+
+# Column codes for ``Timeline.kind``; anything else is "other"
+EVENT_KINDS = ("click", "typing", "scrolling", "dragging", "other")
+_CODES = {k: i for i, k in enumerate(EVENT_KINDS)}
+CLICK, TYPING, SCROLLING, DRAGGING = 0, 1, 2, 3
+# A pause longer than this with no event in progress counts as idle
+DEFAULT_IDLE_MS = 2000.0
+# Reports list every step up to this many, else only the longest dwells
+_REPORT_STEPS = 12
+
+
+@dataclass
+class Timeline:
+    """``capturedEvents`` as parallel NumPy columns, sorted by start time.
+
+    Times are milliseconds since the first event. Clicks are instants
+    (``start == end``). ``step`` holds each event's position in
+    ``flow["steps"]``: a click's own step (joined through ``clickId``), and for
+    typing/scrolling/dragging the step of the latest click at or before it
+    (-1 before the first click or for unknown ids).
+    """
+
+    kind: "np.ndarray"
+    start: "np.ndarray"
+    end: "np.ndarray"
+    step: "np.ndarray"
+    frame_x: "np.ndarray"
+    frame_y: "np.ndarray"
+    step_ids: List[str]
+    # clickId -> step id, for clicks that joined a step
+    click_index: Dict[str, str] = field(default_factory=dict)
+    origin_ms: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def step_for(self, click_id: str) -> Optional[str]:
+        return self.click_index.get(click_id)
+
+    @classmethod
+    def from_flow(cls, flow: Dict[str, Any]) -> "Timeline":
+        import numpy as np
+
+        events = [e for e in flow.get("capturedEvents", []) or [] if isinstance(e, dict)]
+        steps = flow.get("steps", []) or []
+        step_ids = [s.get("id") if isinstance(s.get("id"), str) else "" for s in steps]
+        position = {sid: i for i, sid in enumerate(step_ids) if sid}
+
+        # One pass in Python to pull the fields out; everything after is array work
+        kind = np.fromiter((_CODES.get(e.get("type"), 4) for e in events), dtype=np.int8, count=len(events))
+        start = np.array([_num(e.get("timeMs", e.get("startTimeMs"))) for e in events], dtype=np.float64)
+        end = np.array([_num(e.get("endTimeMs", e.get("timeMs"))) for e in events], dtype=np.float64)
+        frame_x = np.array([_num(e.get("frameX")) for e in events], dtype=np.float64)
+        frame_y = np.array([_num(e.get("frameY")) for e in events], dtype=np.float64)
+        click_ids = [e.get("clickId") if k == CLICK else None for e, k in zip(events, kind.tolist())]
+        clicked = np.array([position.get(c, -1) if isinstance(c, str) else -1 for c in click_ids], dtype=np.int32)
+
+        # Events without a usable time cannot be placed on the timeline
+        keep = ~np.isnan(start)
+        end = np.where(np.isnan(end), start, np.maximum(end, start))
+        order = np.argsort(start[keep], kind="stable")
+        idx = np.flatnonzero(keep)[order]
+        kind, start, end, frame_x, frame_y, clicked = (a[idx] for a in (kind, start, end, frame_x, frame_y, clicked))
+
+        # Each event belongs to the step of the latest joined click at or before it
+        n = len(kind)
+        joined = (kind == CLICK) & (clicked >= 0)
+        latest = np.maximum.accumulate(np.where(joined, np.arange(n), -1)) if n else np.zeros(0, dtype=np.int64)
+        step = np.where(latest >= 0, clicked[np.maximum(latest, 0)], -1).astype(np.int32)
+
+        origin = float(start[0]) if n else 0.0
+        click_index = {c: step_ids[position[c]] for c in dict.fromkeys(click_ids) if isinstance(c, str) and c in position}
+        return cls(kind, start - origin, end - origin, step, frame_x, frame_y, step_ids, click_index, origin)
+
+
+def _num(v: Any) -> float:
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else float("nan")
+
+
+@dataclass
+class StepTiming:
+    index: int        # position in flow["steps"]
+    step_id: str
+    dwell_ms: float   # from the step's click to the next click (or the end of the recording)
+    typing_ms: float
+    scrolling_ms: float
+    clicks: int
+
+
+@dataclass
+class TimingMetrics:
+    duration_ms: float
+    active_ms: float
+    idle_ms: float
+    idle_gaps: int
+    longest_idle_ms: float
+    typing_ms: float
+    scrolling_ms: float
+    dragging_ms: float
+    events: int
+    clicks: int
+    steps: List[StepTiming]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TimingMetrics":
+        return cls(**{**d, "steps": [StepTiming(**s) for s in d.get("steps", [])]})
+
+
+def timing_metrics(flow_or_timeline: Any, idle_ms: float = DEFAULT_IDLE_MS) -> Optional[TimingMetrics]:
+    """Dwell, typing, scrolling and idle times of a recording; None without timed events.
+
+    All sums are vectorized (``np.bincount`` per step, a running maximum of
+    end times for gaps), so 100k events take tens of milliseconds.
+    """
+    import numpy as np
+
+    tl = flow_or_timeline if isinstance(flow_or_timeline, Timeline) else Timeline.from_flow(flow_or_timeline)
+    if not len(tl):
+        return None
+    nsteps = len(tl.step_ids)
+    span = tl.end - tl.start
+    finish = float(tl.end.max())
+
+    # Idle: time between an event's start and the latest end of everything before it
+    covered = np.maximum.accumulate(tl.end)
+    gaps = tl.start[1:] - covered[:-1]
+    idle = gaps[gaps > idle_ms]
+
+    # Dwell: click to next joined click, the last one running to the end of the recording
+    clicks = np.flatnonzero((tl.kind == CLICK) & (tl.step >= 0))
+    click_times = tl.start[clicks]
+    dwell = np.diff(np.append(click_times, finish))
+    dwell_steps = np.bincount(tl.step[clicks], weights=dwell, minlength=nsteps)
+    click_counts = np.bincount(tl.step[clicks], minlength=nsteps)
+
+    def per_step(code: int) -> "np.ndarray":
+        mask = (tl.kind == code) & (tl.step >= 0)
+        return np.bincount(tl.step[mask], weights=span[mask], minlength=nsteps)
+
+    typing, scrolling = per_step(TYPING), per_step(SCROLLING)
+    visited = np.flatnonzero(click_counts > 0)
+    steps = [
+        StepTiming(
+            int(i), tl.step_ids[i], round(float(dwell_steps[i]), 1), round(float(typing[i]), 1),
+            round(float(scrolling[i]), 1), int(click_counts[i]),
+        )
+        for i in visited
+    ]
+
+    def total(code: int) -> float:
+        return round(float(span[tl.kind == code].sum()), 1)
+
+    return TimingMetrics(
+        duration_ms=round(finish, 1),
+        active_ms=round(finish - float(idle.sum()), 1),
+        idle_ms=round(float(idle.sum()), 1),
+        idle_gaps=int(len(idle)),
+        longest_idle_ms=round(float(idle.max()) if len(idle) else 0.0, 1),
+        typing_ms=total(TYPING),
+        scrolling_ms=total(SCROLLING),
+        dragging_ms=total(DRAGGING),
+        events=len(tl),
+        clicks=int((tl.kind == CLICK).sum()),
+        steps=steps,
+    )
+
+
+# ---- report.md section --------------------------------------------------------
+
+def _s(ms: float) -> str:
+    return f"{ms / 1000:.1f}s"
+
+
+def _step_name(step: Dict[str, Any], fallback: str) -> str:
+    title = (step.get("pageContext") or {}).get("title")
+    label = next((h.get("label") for h in step.get("hotspots", []) or [] if isinstance(h.get("label"), str)), None)
+    name = " ".join(str(label or title or fallback).replace("*", "").split())
+    return name if len(name) <= 60 else name[:59].rstrip() + "…"
+
+
+def format_timing(metrics: TimingMetrics, flow: Optional[Dict[str, Any]] = None) -> str:
+    """The TIMING section appended to report.md."""
+    m = metrics
+    idle = f"{m.idle_gaps} idle gap{'s' if m.idle_gaps != 1 else ''}"
+    if m.idle_gaps:
+        idle += f" totalling {_s(m.idle_ms)}, longest {_s(m.longest_idle_ms)}"
+    lines = [
+        "TIMING:",
+        f"- Duration: {_s(m.duration_ms)} ({_s(m.active_ms)} active; {idle})",
+        f"- Typing {_s(m.typing_ms)}, scrolling {_s(m.scrolling_ms)}, dragging {_s(m.dragging_ms)}",
+        f"- Events: {m.events} ({m.clicks} clicks)",
+    ]
+    steps = m.steps
+    heading = "- Dwell per step:"
+    if len(steps) > _REPORT_STEPS:
+        steps = sorted(sorted(steps, key=lambda s: -s.dwell_ms)[:_REPORT_STEPS], key=lambda s: s.index)
+        heading = f"- Longest dwell ({len(steps)} of {len(m.steps)} steps):"
+    if steps:
+        lines.append(heading)
+    flow_steps = (flow or {}).get("steps", []) or []
+    for s in steps:
+        step = flow_steps[s.index] if s.index < len(flow_steps) else {}
+        detail = ", ".join(
+            f"{what} {_s(ms)}" for what, ms in (("typing", s.typing_ms), ("scrolling", s.scrolling_ms)) if ms
+        )
+        # Named, not numbered: positions in flow["steps"] count chapters and videos,
+        # so they would not line up with the STEPS section's numbering
+        lines.append(f"  - {_step_name(step, s.step_id)}: {_s(s.dwell_ms)}" + (f" ({detail})" if detail else ""))
+    return "\n".join(lines)
@@ -0,0 +1,603 @@
+# Pluggable LLM transport: record real responses, replay them in-process or from a
+# local OpenAI-compatible server, with latency distributions and fault injection
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+__all__ = [
+    "TRANSPORTS",
+    "Recording",
+    "ReplayConfig",
+    "ReplayEngine",
+    "parse_latency",
+    "sse_events",
+    "completion_from_sse",
+    "transport_mode",
+    "client_kwargs",
+    "replay_stats",
+    "sync_http_client",
+    "async_http_client",
+    "serve",
+]
+
+# "openai": talk to the API (or whatever OPENAI_BASE_URL points at, e.g. `serve`)
+# "record": same, and append every completion to the recording
+# "replay": answer from the recording in-process; nothing leaves the machine
+TRANSPORTS = ("openai", "record", "replay")
+DEFAULT_RECORDING = ".cache/llm-recording.jsonl"
+_COMPLETIONS_PATH = "/chat/completions"
+# Hop-by-hop/encoding headers no longer true once a body has been read and decoded
+_STALE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def transport_mode() -> str:
+    mode = os.getenv("ARCADE_LLM_TRANSPORT", "openai").lower()
+    if mode not in TRANSPORTS:
+        raise ValueError(f"ARCADE_LLM_TRANSPORT={mode!r}; choose from {', '.join(TRANSPORTS)}")
+    return mode
+
+
+def _request_key(body: Dict[str, Any]) -> Tuple[str, str]:
+    """(prompt key, system-prompt key) for a chat completion request body.
+
+    The prompt key hashes the request as sent (system and user messages,
+    model, temperature, response format) with ``src.ai._hash_prompt``. It is
+    not the response-cache key: calls that pass a ``cache_key`` (the flow
+    fingerprint) are cached under that instead of the user message, which
+    the transport never sees. Recordings are looked up by prompt only.
+    """
+    from src.ai import _hash_prompt
+
+    messages = body.get("messages") or []
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    params = {"temperature": body.get("temperature")}
+    if body.get("response_format"):
+        params["response_format"] = body["response_format"]
+    key = _hash_prompt(system, user, body.get("model"), params)
+    return key, hashlib.sha256(system.encode()).hexdigest()
+
+
+# ---- Recording ----------------------------------------------------------------
+
+class Recording:
+    """Append-only JSONL of ``{key, system, model, latency, response}`` records.
+
+    Lookups are exact by prompt key; with ``miss="system"`` an unknown prompt
+    is answered with a recorded response to the same system prompt (round
+    robin), so a recording of a few flows can drive load tests on many.
+    """
+
+    def __init__(self, path: str = DEFAULT_RECORDING, miss: str = "system") -> None:
+        if miss not in ("system", "exact"):
+            raise ValueError("miss must be 'system' or 'exact'")
+        self.path = path
+        self.miss = miss
+        self.by_key: Dict[str, Dict[str, Any]] = {}
+        self.by_system: Dict[str, List[Dict[str, Any]]] = {}
+        self._next: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fp:
+                for line in fp:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self.by_key)
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        self.by_key[entry["key"]] = entry
+        self.by_system.setdefault(entry["system"], []).append(entry)
+
+    def append(self, body: Dict[str, Any], response: Dict[str, Any], latency: float) -> None:
+        key, system = _request_key(body)
+        entry = {
+            "key": key,
+            "system": system,
+            "model": body.get("model"),
+            "latency": round(latency, 4),
+            "response": response,
+        }
+        with self._lock:
+            self._index(entry)
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fp:
+                fp.write(json.dumps(entry) + "\n")
+
+    def lookup(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key, system = _request_key(body)
+        with self._lock:
+            hit = self.by_key.get(key)
+            if hit is not None or self.miss == "exact":
+                return hit
+            same = self.by_system.get(system)
+            if not same:
+                return None
+            i = self._next.get(system, 0)
+            self._next[system] = i + 1
+            return same[i % len(same)]
+
+
+# ---- Latency and faults ---------------------------------------------------------
+
+LatencyModel = Callable[[random.Random, Optional[float]], float]
+
+
+def parse_latency(spec: str) -> LatencyModel:
+    """Latency in seconds from a spec string; the second argument is the
+    recorded latency of the response being replayed (None if unknown).
+
+    ``recorded[:scale]``, ``fixed:S``, ``uniform:LO,HI``, ``normal:MEAN,SD``,
+    ``lognormal:MEDIAN,SIGMA`` (long right tail, like real API latency).
+    """
+    name, _, raw = spec.partition(":")
+    args = [float(a) for a in raw.split(",") if a.strip()]
+
+    def need(n: int) -> None:
+        if len(args) != n:
+            raise ValueError(f"latency {name!r} takes {n} argument(s): {spec!r}")
+
+    if name == "recorded":
+        scale = args[0] if args else 1.0
+        return lambda rng, rec: (rec or 0.0) * scale
+    if name == "fixed":
+        need(1)
+        return lambda rng, rec: args[0]
+    if name == "uniform":
+        need(2)
+        return lambda rng, rec: rng.uniform(args[0], args[1])
+    if name == "normal":
+        need(2)
+        return lambda rng, rec: max(0.0, rng.gauss(args[0], args[1]))
+    if name == "lognormal":
+        need(2)
+        mu = math.log(args[0]) if args[0] > 0 else 0.0
+        return lambda rng, rec: rng.lognormvariate(mu, args[1]) if args[0] > 0 else 0.0
+    raise ValueError(f"unknown latency model {spec!r}")
+
+
+@dataclass
+class ReplayConfig:
+    recording: str = DEFAULT_RECORDING
+    latency: str = "recorded"
+    error_429: float = 0.0        # fraction of requests answered 429
+    error_timeout: float = 0.0    # fraction of requests that never answer in time
+    hang: float = 120.0           # server: how long a "timed out" request stalls
+    miss: str = "system"
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ReplayConfig":
+        seed = os.getenv("ARCADE_LLM_SEED")
+        return cls(
+            recording=os.getenv("ARCADE_LLM_RECORDING", DEFAULT_RECORDING),
+            latency=os.getenv("ARCADE_LLM_LATENCY", "recorded"),
+            error_429=float(os.getenv("ARCADE_LLM_ERROR_429") or 0),
+            error_timeout=float(os.getenv("ARCADE_LLM_ERROR_TIMEOUT") or 0),
+            miss=os.getenv("ARCADE_LLM_REPLAY_MISS", "system"),
+            seed=int(seed) if seed else None,
+        )
+
+
+@dataclass
+class Reply:
+    status: int
+    payload: Dict[str, Any]
+    delay: float
+    fault: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def _error(message: str, kind: str, code: str) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": kind, "code": code, "param": None}}
+
+
+class ReplayEngine:
+    """Decides the answer, delay and injected fault for each request.
+
+    Shared by the in-process transports and the HTTP server so both behave
+    identically; a fixed ``seed`` makes the fault/latency sequence reproducible.
+    """
+
+    def __init__(self, config: ReplayConfig, recording: Optional[Recording] = None) -> None:
+        self.config = config
+        self.recording = recording or Recording(config.recording, config.miss)
+        self.latency = parse_latency(config.latency)
+        self.rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.stats = {"served": 0, "missing": 0, "429": 0, "timeout": 0}
+
+    def respond(self, body: Dict[str, Any]) -> Reply:
+        entry = self.recording.lookup(body)
+        with self._lock:
+            roll = self.rng.random()
+            delay = self.latency(self.rng, entry.get("latency") if entry else None)
+            if roll < self.config.error_429:
+                self.stats["429"] += 1
+                return Reply(
+                    429,
+                    _error("Rate limit reached (injected)", "rate_limit_error", "rate_limit_exceeded"),
+                    min(delay, 0.05),
+                    "429",
+                    {"retry-after-ms": "200"},
+                )
+            if roll < self.config.error_429 + self.config.error_timeout:
+                self.stats["timeout"] += 1
+                return Reply(504, _error("Injected timeout", "timeout", "timeout"), delay, "timeout")
+            if entry is None:
+                self.stats["missing"] += 1
+                return Reply(
+                    400,
+                    _error("No recorded response for this prompt", "invalid_request_error", "replay_miss"),
+                    0.0,
+                )
+            self.stats["served"] += 1
+        payload = dict(entry["response"])
+        payload["created"] = int(time.time())
+        return Reply(200, payload, delay)
+
+
+# ---- Streaming (stream=True requests are answered with server-sent events) --------
+
+_WORD = re.compile(r"\S+\s*|\s+")
+
+
+def sse_events(payload: Dict[str, Any]) -> List[bytes]:
+    """A completion as the ``data:`` events the API sends for ``stream=True``, one per word."""
+    base = {k: payload.get(k) for k in ("id", "created", "model")}
+    base["object"] = "chat.completion.chunk"
+    content = ((payload.get("choices") or [{}])[0].get("message") or {}).get("content") or ""
+    deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+    deltas += [{"content": w} for w in _WORD.findall(content)]
+    chunks = [{**base, "choices": [{"index": 0, "delta": d, "finish_reason": None}]} for d in deltas]
+    chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    if payload.get("usage"):
+        chunks.append({**base, "choices": [], "usage": payload["usage"]})
+    return [b"data: " + json.dumps(c).encode() + b"\n\n" for c in chunks] + [b"data: [DONE]\n\n"]
+
+
+def completion_from_sse(body: bytes) -> Dict[str, Any]:
+    """Reassemble a streamed answer into the non-streamed completion shape (for recordings)."""
+    parts: List[str] = []
+    out: Dict[str, Any] = {"object": "chat.completion"}
+    for line in body.decode("utf-8").splitlines():
+        data = line[len("data:"):].strip() if line.startswith("data:") else ""
+        if not data or data == "[DONE]":
+            continue
+        chunk = json.loads(data)
+        out.update({k: chunk[k] for k in ("id", "created", "model") if chunk.get(k) is not None})
+        if chunk.get("usage"):
+            out["usage"] = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            parts.append((choice.get("delta") or {}).get("content") or "")
+    message = {"role": "assistant", "content": "".join(parts)}
+    out["choices"] = [{"index": 0, "message": message, "finish_reason": "stop"}]
+    return out
+
+
+def _recorded(body: Dict[str, Any], content: bytes) -> Dict[str, Any]:
+    return completion_from_sse(content) if body.get("stream") else json.loads(content)
+
+
+# ---- httpx transports (built lazily: httpx is only needed once a client exists) --
+
+@lru_cache(maxsize=None)
+def _transport_classes() -> Dict[str, type]:
+    import httpx
+
+    def strip(headers: Any) -> Dict[str, str]:
+        return {k: v for k, v in headers.items() if k.lower() not in _STALE_HEADERS}
+
+    def reply_response(reply: Reply, request: Any, stream: Any = None) -> Any:
+        if reply.fault == "timeout":
+            raise httpx.ReadTimeout("injected timeout", request=request)
+        if stream is not None and reply.status == 200:
+            headers = {**reply.headers, "content-type": "text/event-stream"}
+            return httpx.Response(reply.status, headers=headers, stream=stream, request=request)
+        return httpx.Response(reply.status, json=reply.payload, headers=reply.headers, request=request)
+
+    class PacedEvents(httpx.AsyncByteStream):
+        """SSE events with the reply's latency spread across them, like a live stream."""
+
+        def __init__(self, events: List[bytes], delay: float) -> None:
+            self.events, self.gap = events, delay / max(1, len(events))
+
+        async def __aiter__(self) -> Any:
+            for event in self.events:
+                await asyncio.sleep(self.gap)
+                yield event
+
+    class ReplayTransport(httpx.BaseTransport):
+        def __init__(self, engine: ReplayEngine) -> None:
+            self.engine = engine
+
+        def handle_request(self, request: Any) -> Any:
+            body = json.loads(request.read() or b"{}")
+            reply = self.engine.respond(body)
+            time.sleep(reply.delay)
+            stream = httpx.ByteStream(b"".join(sse_events(reply.payload))) if body.get("stream") else None
+            return reply_response(reply, request, stream)
+
+    class AsyncReplayTransport(httpx.AsyncBaseTransport):
+        def __init__(self, engine: ReplayEngine) -> None:
+            self.engine = engine
+
+        async def handle_async_request(self, request: Any) -> Any:
+            body = json.loads(await request.aread() or b"{}")
+            reply = self.engine.respond(body)
+            if body.get("stream") and reply.status == 200:
+                return reply_response(reply, request, PacedEvents(sse_events(reply.payload), reply.delay))
+            await asyncio.sleep(reply.delay)
+            return reply_response(reply, request)
+
+    class RecordingTransport(httpx.BaseTransport):
+        def __init__(self, inner: Any, recording: Recording) -> None:
+            self.inner, self.recording = inner, recording
+
+        def handle_request(self, request: Any) -> Any:
+            t0 = time.perf_counter()
+            response = self.inner.handle_request(request)
+            content = response.read()
+            if response.status_code == 200 and request.url.path.endswith(_COMPLETIONS_PATH):
+                body = json.loads(request.read())
+                self.recording.append(body, _recorded(body, content), time.perf_counter() - t0)
+            return httpx.Response(
+                response.status_code, headers=strip(response.headers), content=content, request=request
+            )
+
+        def close(self) -> None:
+            self.inner.close()
+
+    class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+        def __init__(self, inner: Any, recording: Recording) -> None:
+            self.inner, self.recording = inner, recording
+
+        async def handle_async_request(self, request: Any) -> Any:
+            t0 = time.perf_counter()
+            response = await self.inner.handle_async_request(request)
+            content = await response.aread()
+            if response.status_code == 200 and request.url.path.endswith(_COMPLETIONS_PATH):
+                body = json.loads(await request.aread())
+                self.recording.append(body, _recorded(body, content), time.perf_counter() - t0)
+            return httpx.Response(
+                response.status_code, headers=strip(response.headers), content=content, request=request
+            )
+
+        async def aclose(self) -> None:
+            await self.inner.aclose()
+
+    return {
+        "replay": ReplayTransport,
+        "async_replay": AsyncReplayTransport,
+        "record": RecordingTransport,
+        "async_record": AsyncRecordingTransport,
+    }
+
+
+_engine: Optional[ReplayEngine] = None
+_recording: Optional[Recording] = None
+_state_lock = threading.Lock()
+
+
+def _shared_engine() -> ReplayEngine:
+    global _engine
+    with _state_lock:
+        if _engine is None:
+            _engine = ReplayEngine(ReplayConfig.from_env())
+        return _engine
+
+
+def _shared_recording() -> Recording:
+    global _recording
+    with _state_lock:
+        if _recording is None:
+            _recording = Recording(os.getenv("ARCADE_LLM_RECORDING", DEFAULT_RECORDING))
+        return _recording
+
+
+def replay_stats() -> Optional[Dict[str, int]]:
+    """Served/missing/injected-fault counts of the in-process replay, if one ran."""
+    return dict(_engine.stats) if _engine is not None else None
+
+
+def client_kwargs() -> Dict[str, Any]:
+    """Extra OpenAI client arguments for the active transport."""
+    if transport_mode() == "replay":
+        # Replay never reaches the API; the SDK still insists on a key
+        return {"api_key": os.getenv("OPENAI_API_KEY") or "replay"}
+    return {}
+
+
+def sync_http_client(timeout: Optional[float] = None) -> Any:
+    """httpx.Client for ``openai.OpenAI``, or None to keep the SDK default."""
+    mode = transport_mode()
+    if mode == "openai":
+        return None
+    import httpx
+
+    classes = _transport_classes()
+    if mode == "replay":
+        transport = classes["replay"](_shared_engine())
+    else:
+        transport = classes["record"](httpx.HTTPTransport(), _shared_recording())
+    return httpx.Client(transport=transport, timeout=timeout)
+
+
+def async_http_client(limits: Any = None, timeout: Optional[float] = None) -> Any:
+    """httpx.AsyncClient for ``openai.AsyncOpenAI``, or None to keep the default."""
+    mode = transport_mode()
+    if mode == "openai":
+        return None
+    import httpx
+
+    classes = _transport_classes()
+    if mode == "replay":
+        transport = classes["async_replay"](_shared_engine())
+    else:
+        inner = httpx.AsyncHTTPTransport(limits=limits) if limits is not None else httpx.AsyncHTTPTransport()
+        transport = classes["async_record"](inner, _shared_recording())
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+# ---- Local OpenAI-compatible server ----------------------------------------------
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class _BodyTooLarge(ValueError):
+    """The request's Content-Length exceeds the caller's ``max_body``; the body was not read."""
+
+
+async def _read_request(
+    reader: asyncio.StreamReader, max_body: Optional[int] = None
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _version = line.decode("latin-1").split(" ", 2)
+    headers: Dict[str, str] = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    if max_body is not None and length > max_body:
+        raise _BodyTooLarge(f"request body of {length} bytes exceeds {max_body}")
+    body = await reader.readexactly(length)
+    return method, path, headers, body
+
+
+def _http_response(status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> bytes:
+    body = json.dumps(payload).encode()
+    head = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+    ]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+async def _write_sse(writer: asyncio.StreamWriter, events: List[bytes], delay: float) -> None:
+    """Send SSE events as a chunked response, pacing them over ``delay`` seconds."""
+    head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Transfer-Encoding: chunked"]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+    gap = delay / max(1, len(events))
+    for event in events:
+        await asyncio.sleep(gap)
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+
+
+async def serve(
+    engine: ReplayEngine, host: str = "127.0.0.1", port: int = 8765, ready: Optional[asyncio.Event] = None
+) -> None:
+    """Serve ``POST .../chat/completions`` (and ``GET /health``) from ``engine``.
+
+    Point the analyzer at it with ``OPENAI_BASE_URL=http://HOST:PORT/v1`` to
+    exercise the real client stack (pooling, retries, timeouts) offline.
+    Connections are kept alive; an injected timeout stalls for ``hang`` seconds.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                req = await _read_request(reader)
+                if req is None:
+                    break
+                method, path, headers, body = req
+                if method == "GET" and path.rstrip("/").endswith("/health"):
+                    writer.write(_http_response(200, {"ok": True, "recorded": len(engine.recording), **engine.stats}))
+                elif method == "POST" and path.split("?")[0].endswith(_COMPLETIONS_PATH):
+                    request = json.loads(body or b"{}")
+                    reply = engine.respond(request)
+                    if reply.fault == "timeout":
+                        await asyncio.sleep(engine.config.hang)
+                        break
+                    if request.get("stream") and reply.status == 200:
+                        await _write_sse(writer, sse_events(reply.payload), reply.delay)
+                    else:
+                        await asyncio.sleep(reply.delay)
+                        writer.write(_http_response(reply.status, reply.payload, reply.headers))
+                else:
+                    missing = _error(f"no route for {method} {path}", "not_found", "not_found")
+                    writer.write(_http_response(404, missing))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve recorded LLM responses as an OpenAI-compatible API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="Run the local stand-in server")
+    sp.add_argument("--recording", default=os.getenv("ARCADE_LLM_RECORDING", DEFAULT_RECORDING))
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8765)
+    sp.add_argument(
+        "--latency",
+        default="recorded",
+        help="recorded[:scale], fixed:S, uniform:LO,HI, normal:M,SD or lognormal:MEDIAN,SIGMA",
+    )
+    sp.add_argument("--error-429", type=float, default=0.0, help="Fraction of requests answered 429")
+    sp.add_argument("--error-timeout", type=float, default=0.0, help="Fraction of requests that stall")
+    sp.add_argument("--hang", type=float, default=120.0, help="Seconds a stalled request waits before closing")
+    sp.add_argument("--miss", choices=("system", "exact"), default="system")
+    sp.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    config = ReplayConfig(
+        recording=args.recording,
+        latency=args.latency,
+        error_429=args.error_429,
+        error_timeout=args.error_timeout,
+        hang=args.hang,
+        miss=args.miss,
+        seed=args.seed,
+    )
+    engine = ReplayEngine(config)
+    print(f"Serving {len(engine.recording)} recorded responses on http://{args.host}:{args.port}/v1")
+    try:
+        asyncio.run(serve(engine, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()